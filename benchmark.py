@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能测试脚本 - 用模拟的大型报名导出文件测量导入、搜索和内存占用
+用法: python benchmark.py [行数]
+"""
+
+import csv
+import http.server
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from xml.sax.saxutils import escape
+
+import catalog_snapshot
+from catalog_snapshot import load_snapshot, save_snapshot
+from catalog_store import CatalogStore, MappedCatalog
+from csv_loader import CSVStream, MappedCSV, iter_import_batches
+from file_download import download_to_file
+from http_pool import HTTPConnectionPool
+from media_catalog import MediaCatalog
+from media_sniff import MediaSniffer, NotMediaError
+from xlsx_reader import XLSXStream
+
+# 与报名系统导出文件一致的表头
+HEADERS = ['套餐', '预订人', '联系电话', '身份证名字', '资料链接', '参赛者组别', '作品名称',
+           '指导老师', '指导老师电话', '推送单位学校', '展演号码', '姓名', '备注']
+
+GROUPS = ['幼儿组', '小学组', '初中组', '高中组', '大学生组', '社会组']
+SCHOOLS = [f'推送单位学校-第{i}中学' for i in range(300)]
+TEACHERS = [f'指导老师-老师{i}' for i in range(2000)]
+
+
+def make_sample_csv(path, rows, encoding='utf-8'):
+    """生成模拟的报名导出文件"""
+    rng = random.Random(42)
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        for i in range(rows):
+            name = f'参赛者{i}'
+            writer.writerow([
+                '集体参赛', name, f'139{i:08d}', name,
+                f'https://file1.example.cn/photo/2025/06/30/{i}/{rng.getrandbits(64):016x}.mp4',
+                rng.choice(GROUPS), f'作品名称-《春天的故事{i}》', rng.choice(TEACHERS),
+                f'指导老师电话-137{i:08d}', rng.choice(SCHOOLS), f'{i + 1:05d}', name, '',
+            ])
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="报名表" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>'
+        '</Relationships>'),
+}
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def make_sample_xlsx(csv_path, path):
+    """把模拟的CSV转为xlsx（文本用共享字符串，电话号码存为数值，与Excel保存的格式一致）"""
+    strings = {}
+    letters = [_column_letter(i) for i in range(len(HEADERS))]
+
+    def cell(ref, value):
+        if value.isdigit() and not value.startswith('0'):
+            return f'<c r="{ref}"><v>{value}</v></c>'
+        if not value:
+            return ''
+        index = strings.setdefault(value, len(strings))
+        return f'<c r="{ref}" t="s"><v>{index}</v></c>'
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet, \
+                open(csv_path, encoding='utf-8', newline='') as f:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            for number, values in enumerate(csv.reader(f), 1):
+                cells = ''.join(cell(f'{letter}{number}', value)
+                                for letter, value in zip(letters, values))
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+
+        items = ''.join(f'<si><t>{escape(value)}</t></si>' for value in strings)
+        archive.writestr('xl/sharedStrings.xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            f'count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>'))
+
+
+def measure(func):
+    """返回(结果, 新分配的字节数, 耗时秒)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def bench_row_memory(path, rows):
+    """比较字典列表与紧凑目录的每行内存"""
+    print("\n每行内存占用")
+    print("-" * 40)
+
+    data, dict_bytes, dict_time = measure(lambda: list(CSVStream(path)))
+    del data
+    store, store_bytes, store_time = measure(
+        lambda: _fill_store(CatalogStore(), CSVStream(path)))
+
+    print(f"DictReader字典列表: {dict_bytes / rows:8.0f} 字节/行  ({dict_time:.2f} s)")
+    print(f"CatalogStore:       {store_bytes / rows:8.0f} 字节/行  ({store_time:.2f} s)")
+    print(f"缩减: {dict_bytes / max(store_bytes, 1):.1f} 倍")
+    return store
+
+
+def bench_mapped(path, rows):
+    """内存映射模式：常驻内存与随机访问单行的耗时"""
+    print("\n内存映射模式")
+    print("-" * 40)
+
+    def load():
+        source = MappedCSV(path)
+        return _fill_store(MappedCatalog(source), source)
+
+    catalog, mapped_bytes, mapped_time = measure(load)
+    print(f"MappedCatalog:      {mapped_bytes / rows:8.0f} 字节/行  ({mapped_time:.2f} s)")
+
+    rng = random.Random(0)
+    samples = [rng.randrange(len(catalog)) for _ in range(10000)]
+    start = time.perf_counter()
+    for row_id in samples:
+        catalog.value(row_id, '作品名称')
+    elapsed = time.perf_counter() - start
+    print(f"随机读取一行:       {elapsed / len(samples) * 1e6:8.1f} us")
+
+
+def bench_xlsx(csv_path, tmp, rows):
+    """xlsx流式读取：耗时与峰值内存（不保留行时应与行数无关）"""
+    print("\nExcel(.xlsx)流式读取")
+    print("-" * 40)
+    path = os.path.join(tmp, 'sample.xlsx')
+    make_sample_xlsx(csv_path, path)
+    print(f"测试文件: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    start = time.perf_counter()
+    count = sum(1 for _ in XLSXStream(path))
+    elapsed = time.perf_counter() - start
+    assert count == rows
+
+    # 峰值内存单独测量（tracemalloc会显著拖慢解析）
+    tracemalloc.start()
+    sum(1 for _ in XLSXStream(path))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"逐行读取:   {elapsed:8.2f} s  ({rows / elapsed:.0f} 行/秒)")
+    print(f"峰值内存:   {peak / 1024 / 1024:8.1f} MB（含共享字符串表）")
+
+
+def _fill_store(store, rows):
+    store.extend(rows)
+    return store
+
+
+def bench_snapshot(path, tmp):
+    """比较冷导入（解析+建索引）与载入目录快照"""
+    print("\n目录快照")
+    print("-" * 40)
+    catalog_snapshot.SNAPSHOT_DIR = os.path.join(tmp, 'snapshots')
+    fields = ['作品名称', '身份证名字', '参赛者组别', '指导老师', '推送单位学校']
+
+    start = time.perf_counter()
+    store = CatalogStore(fields + ['资料链接', '联系电话'])
+    for batch in iter_import_batches(CSVStream(path), index_fields=fields):
+        store.extend(batch.items)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snap_path = save_snapshot(path, 'bench', store, batch.index, fields,
+                              batch.columns, batch.row_count, batch.csv_format)
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = load_snapshot(path, 'bench', store.fields, fields)
+    warm = time.perf_counter() - start
+    assert snapshot is not None and len(snapshot.store) == len(store)
+
+    print(f"冷导入:   {cold:8.2f} s")
+    print(f"保存快照: {save_time:8.2f} s  ({os.path.getsize(snap_path) / 1024 / 1024:.1f} MB)")
+    print(f"载入快照: {warm * 1000:8.1f} ms")
+
+
+# 下载记录条数
+CATALOG_ENTRIES = 5000
+
+
+def bench_media_catalog(tmp):
+    """比较每次下载后整体重写JSON记录与SQLite逐行更新"""
+    print("\n下载记录")
+    print("-" * 40)
+    urls = [f'https://example.com/media/{i}.mp4' for i in range(CATALOG_ENTRIES)]
+
+    json_path = os.path.join(tmp, 'download_history.json')
+    history = {}
+    start = time.perf_counter()
+    for url in urls:
+        history[url] = os.path.join(tmp, os.path.basename(url))
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+    json_time = time.perf_counter() - start
+
+    catalog = MediaCatalog(os.path.join(tmp, 'media.db'))
+    start = time.perf_counter()
+    for url in urls:
+        catalog.record(url, os.path.join(tmp, os.path.basename(url)), 1024 * 1024)
+    sqlite_time = time.perf_counter() - start
+
+    print(f"JSON整体重写: {json_time:8.2f} s  ({CATALOG_ENTRIES} 次下载)")
+    print(f"SQLite逐行:   {sqlite_time:8.2f} s")
+    print(f"加速: {json_time / max(sqlite_time, 1e-9):.1f} 倍")
+
+
+# 模拟按连接限速的对象存储
+DOWNLOAD_SIZE = 48 * 1024 * 1024
+THROTTLE_RATE = 8 * 1024 * 1024
+# 测量下载CPU开销用的文件大小（不限速）
+CPU_DOWNLOAD_SIZE = 128 * 1024 * 1024
+
+
+class _ThrottledHandler(http.server.BaseHTTPRequestHandler):
+    """支持Range的限速文件服务（每个连接rate字节/秒，为None时不限速）"""
+
+    protocol_version = 'HTTP/1.1'
+    data = b''
+    rate = THROTTLE_RATE
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        size = len(self.data)
+        start, end, status = 0, size - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"bench"')
+        self.send_header('Content-Length', str(end + 1 - start))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        block = 64 * 1024
+        try:
+            for offset in range(start, end + 1, block):
+                self.wfile.write(self.data[offset:min(offset + block, end + 1)])
+                if self.rate:
+                    time.sleep(block / self.rate)
+        except OSError:
+            pass
+
+
+def _start_server(size, rate, data=None):
+    _ThrottledHandler.data = os.urandom(size) if data is None else data
+    _ThrottledHandler.rate = rate
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _ThrottledHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/video.mp4'
+
+
+def _legacy_download(url, dest, progress):
+    """原来的下载循环：每次读8 KB新建bytes对象，每块都报告进度"""
+    with HTTPConnectionPool().open(url) as response:
+        total_size = int(response.headers.get('Content-Length', 0))
+        downloaded = 0
+        with open(dest, 'wb') as f:
+            while True:
+                chunk = response.read(8192)
+                if not chunk:
+                    break
+                f.write(chunk)
+                downloaded += len(chunk)
+                progress(downloaded, total_size)
+
+
+def bench_download_cpu(tmp):
+    """下载循环本身的CPU开销（每GB的CPU秒数，只统计下载线程）"""
+    print("\n下载CPU开销（本地不限速服务器）")
+    print("-" * 40)
+    server, url = _start_server(CPU_DOWNLOAD_SIZE, None)
+    calls = []
+
+    def progress(downloaded, total_size):
+        calls.append((downloaded / total_size) * 100)
+
+    try:
+        for label, run in (
+                ('8 KB循环', lambda dest: _legacy_download(url, dest, progress)),
+                ('复用缓冲区', lambda dest: download_to_file(
+                    HTTPConnectionPool(), url, dest, progress=progress, max_segments=1))):
+            dest = os.path.join(tmp, 'cpu.mp4')
+            calls.clear()
+            start = time.thread_time()
+            run(dest)
+            cpu = time.thread_time() - start
+            assert os.path.getsize(dest) == CPU_DOWNLOAD_SIZE
+            os.remove(dest)
+            print(f"{label}: {cpu / CPU_DOWNLOAD_SIZE * 1024 ** 3:6.2f} CPU秒/GB  "
+                  f"(进度回调 {len(calls)} 次)")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_download(tmp):
+    """大文件下载耗时：单连接与分段下载"""
+    print("\n大文件下载（本地限速服务器）")
+    print("-" * 40)
+    server, url = _start_server(DOWNLOAD_SIZE, THROTTLE_RATE)
+
+    try:
+        for label, segments in (('单连接', 1), ('分段下载', 6)):
+            dest = os.path.join(tmp, f'video-{segments}.mp4')
+            start = time.perf_counter()
+            download_to_file(HTTPConnectionPool(), url, dest, max_segments=segments)
+            elapsed = time.perf_counter() - start
+            assert os.path.getsize(dest) == DOWNLOAD_SIZE
+            print(f"{label}: {elapsed:6.2f} s  ({DOWNLOAD_SIZE / elapsed / 1024 / 1024:.1f} MB/s)")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# 标成视频的网页（例如分享页、登录页）
+PAGE_SIZE = 2 * 1024 * 1024
+PAGE_COUNT = 20
+
+
+def bench_media_sniff(tmp):
+    """一批标成video/mp4的网页：检查文件开头前后浪费的下载字节数"""
+    print("\n非媒体文件检测（标成视频的网页）")
+    print("-" * 40)
+    page = b'<!DOCTYPE html><html><body>' + b'<p>share</p>' * (PAGE_SIZE // 12)
+    server, url = _start_server(len(page), None, page)
+    server.handle_error = lambda request, client_address: None  # 提前断开连接是预期的
+
+    try:
+        for label, sniffer in (('按Content-Type', None), ('检查文件开头', MediaSniffer())):
+            wasted = 0
+            start = time.perf_counter()
+            for index in range(PAGE_COUNT):
+                dest = os.path.join(tmp, f'page-{index}.mp4')
+                try:
+                    download_to_file(HTTPConnectionPool(), url, dest, max_segments=1, sniff=sniffer)
+                    wasted += os.path.getsize(dest)
+                    os.remove(dest)
+                except NotMediaError:
+                    pass
+            if sniffer is not None:
+                wasted = sniffer.take_stats().wasted_bytes
+            elapsed = time.perf_counter() - start
+            print(f"{label}: 浪费 {wasted / 1024 / 1024:8.2f} MB  ({PAGE_COUNT} 个网页，{elapsed:.2f} s)")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"CSV作品播放器 - 性能测试 ({rows} 行)")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sample.csv')
+        make_sample_csv(path, rows)
+        print(f"测试文件: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+        bench_row_memory(path, rows)
+        bench_mapped(path, rows)
+        bench_xlsx(path, tmp, rows)
+        bench_snapshot(path, tmp)
+        bench_media_catalog(tmp)
+        bench_download(tmp)
+        bench_download_cpu(tmp)
+        bench_media_sniff(tmp)
+
+
+if __name__ == '__main__':
+    main()
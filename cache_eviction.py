@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体缓存的容量限制与淘汰
+缓存总大小超过预算时，后台线程按淘汰策略删除文件，直到降到预算的LOW_WATER：
+    LRU       最久未使用的先删
+    LFU       使用次数最少的先删（次数相同时最久未使用的先删）
+    即将播放  接下来要播放的几个作品最后删，越晚播放的越先删；其余按LRU
+正在播放或下载的链接在MediaStore中被钉住，任何策略都不会删除。
+从旧版记录导入、没有摘要的文件同样计入总大小并参与淘汰。
+"""
+
+import threading
+
+from url_canon import canonical_url
+
+
+DEFAULT_BUDGET = 20 * 1024 ** 3
+# 超出预算后删到预算的这一比例，避免每下载一个文件就触发一次淘汰
+LOW_WATER = 0.9
+# 没有新文件入库时的定期检查间隔（秒）
+CHECK_INTERVAL = 60
+
+
+class LRUPolicy:
+    """最近最少使用"""
+
+    name = 'LRU'
+
+    def order(self, entries):
+        return sorted(entries, key=lambda entry: entry['atime'])
+
+
+class LFUPolicy:
+    """最不经常使用"""
+
+    name = 'LFU'
+
+    def order(self, entries):
+        return sorted(entries, key=lambda entry: (entry['hits'], entry['atime']))
+
+
+class UpcomingPolicy:
+    """保留即将播放的作品
+
+    upcoming()返回接下来要播放的作品链接（按播放顺序）
+    """
+
+    name = '即将播放优先保留'
+
+    def __init__(self, upcoming):
+        self.upcoming = upcoming
+
+    def order(self, entries):
+        rank = {}
+        for i, url in enumerate(self.upcoming()):
+            rank.setdefault(canonical_url(url), i)  # 目录中的链接是规范化的形式
+
+        def key(entry):
+            ranks = [rank[url] for url in entry['urls'] if url in rank]
+            if not ranks:
+                return (0, entry['atime'])
+            # 即将播放的排在最后，越早播放的越靠后
+            return (1, -min(ranks))
+
+        return sorted(entries, key=key)
+
+
+class EvictionStats:
+    """缓存统计"""
+
+    def __init__(self, store, budget, evicted_files, evicted_bytes):
+        self.hits = store.hits
+        self.misses = store.misses
+        self.hit_rate = store.hit_rate
+        self.used = store.total_size()
+        self.budget = budget
+        self.evicted_files = evicted_files
+        self.evicted_bytes = evicted_bytes
+
+    def summary(self):
+        return (f"缓存命中率 {self.hit_rate * 100:.0f}%（命中 {self.hits}，未命中 {self.misses}），"
+                f"已用 {self.used / 1024 ** 3:.2f}/{self.budget / 1024 ** 3:.0f} GB，"
+                f"已淘汰 {self.evicted_files} 个文件共 {self.evicted_bytes / 1024 / 1024:.1f} MB")
+
+
+class CacheEvictor:
+    """后台淘汰线程"""
+
+    def __init__(self, store, budget=DEFAULT_BUDGET, policy=None, log=None):
+        self.store = store
+        self.budget = budget
+        self.policy = policy or LRUPolicy()
+        self.log = log
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def request(self):
+        """有新文件入库或设置改变时调用，尽快检查一次"""
+        self._wakeup.set()
+
+    def set_budget(self, budget):
+        self.budget = max(0, int(budget))
+        self.request()
+
+    def set_policy(self, policy):
+        self.policy = policy
+        self.request()
+
+    def stats(self):
+        return EvictionStats(self.store, self.budget, self.evicted_files, self.evicted_bytes)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(CHECK_INTERVAL)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            try:
+                self.evict()
+            except Exception as e:
+                if self.log:
+                    self.log(f"清理缓存失败: {e}")
+
+    def evict(self):
+        """超出预算时按策略删除文件，返回释放的字节数"""
+        used = self.store.total_size()
+        if used <= self.budget:
+            return 0
+
+        target = self.budget * LOW_WATER
+        freed = files = 0
+        for entry in self.policy.order(self.store.entries()):
+            if used - freed <= target:
+                break
+            if entry['pinned']:
+                continue
+            if entry['digest'] is None:
+                size = self.store.remove_legacy(entry['path'])  # 旧版导入、没有摘要的文件
+            else:
+                size = self.store.remove_object(entry['digest'])
+            if size:
+                freed += size
+                files += 1
+
+        self.evicted_files += files
+        self.evicted_bytes += freed
+        if files and self.log:
+            self.log(f"缓存超出上限，按{self.policy.name}策略删除了 {files} 个文件"
+                     f"（{freed / 1024 / 1024:.1f} MB）")
+        return freed
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缓存文件的条件重新验证
+对已缓存的链接发送带If-None-Match/If-Modified-Since的请求（同时用Range只要
+第一个字节）：服务器返回304说明文件未变化，保留缓存；返回了内容时再比较
+ETag/Last-Modified（有的服务器不支持条件请求），确实变化了才重新下载。
+没有记录校验值的旧缓存按文件大小比较，并记下这次返回的校验值，下次即可
+使用条件请求。
+后台批量验证整个缓存目录时限制总并发数和每个站点的并发数；链接失效时
+保留缓存文件（演出时仍然可以播放）。
+"""
+
+import http.client
+import threading
+import time
+import urllib.error
+
+from http_pool import for_each_per_host
+
+
+REVALIDATE_WORKERS = 4
+REVALIDATE_PER_HOST = 2
+REVALIDATE_TIMEOUT = 15
+
+# 验证结果
+FRESH = '未变化'
+CHANGED = '已更新'
+GONE = '已失效'         # 404/410，缓存文件保留
+UNKNOWN = '无法判断'     # 服务器没有返回可比较的信息
+FAILED = '检查失败'      # 网络错误等
+
+STATES = (FRESH, CHANGED, GONE, UNKNOWN, FAILED)
+
+
+def _strong(etag):
+    """比较ETag时忽略弱校验前缀W/"""
+    return etag[2:] if etag and etag.startswith('W/') else etag
+
+
+def _total_size(response):
+    content_range = response.headers.get('Content-Range', '')
+    if response.status == 206 and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    return int(length) if response.status == 200 and length and length.isdigit() else None
+
+
+def revalidate(pool, row, timeout=REVALIDATE_TIMEOUT):
+    """验证一个已缓存的链接，返回(结果, ETag, Last-Modified)
+
+    row为目录数据库中的链接记录（url、etag、last_modified、size）
+    """
+    headers = {'Range': 'bytes=0-0'}
+    if row['etag']:
+        headers['If-None-Match'] = row['etag']
+    if row['last_modified']:
+        headers['If-Modified-Since'] = row['last_modified']
+    try:
+        response = pool.open(row['url'], headers=headers, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        return (GONE if e.code in (404, 410) else FAILED), None, None
+    except (OSError, http.client.HTTPException, ValueError):
+        return FAILED, None, None
+
+    with response:
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status == 304:
+            return FRESH, etag, last_modified
+        size = _total_size(response)
+        if response.status == 206:
+            response.read()  # 只有一个字节，读完后连接可以复用
+
+    if row['etag'] and etag:
+        changed = _strong(etag) != _strong(row['etag'])
+    elif row['last_modified'] and last_modified:
+        changed = last_modified != row['last_modified']
+    elif size is not None and row['size']:
+        changed = size != row['size']
+    else:
+        return UNKNOWN, etag, last_modified
+    return (CHANGED if changed else FRESH), etag, last_modified
+
+
+class RevalidationStats:
+    """一次批量验证的统计"""
+
+    def __init__(self, counts, elapsed, cancelled):
+        self.counts = counts
+        self.elapsed = elapsed
+        self.cancelled = cancelled
+
+    @property
+    def checked(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        parts = '，'.join(f"{state} {self.counts[state]}" for state in STATES if self.counts[state])
+        return (f"验证缓存 {self.checked} 个（{parts or '无'}），耗时 {self.elapsed:.1f} 秒"
+                + ("（已取消）" if self.cancelled else ""))
+
+
+class CacheRevalidator:
+    """缓存验证器：单个链接同步验证，整个目录在后台批量验证"""
+
+    def __init__(self, pool, store, log=None, workers=REVALIDATE_WORKERS,
+                 per_host=REVALIDATE_PER_HOST):
+        self.pool = pool
+        self.store = store
+        self.log = log
+        self.workers = workers
+        self.per_host = per_host
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _check_row(self, row):
+        state, etag, last_modified = revalidate(self.pool, row)
+        if state == FRESH:
+            self.store.catalog.mark_validated(row['url'], etag, last_modified)
+        return state
+
+    def check(self, url):
+        """验证一个链接（阻塞），没有缓存记录时返回UNKNOWN"""
+        row = self.store.info(url)
+        return self._check_row(row) if row is not None else UNKNOWN
+
+    def start(self, on_changed=None, on_done=None, max_age=0):
+        """后台验证整个缓存目录，已在运行时返回False
+
+        只验证max_age秒内未确认过的链接；on_changed(url, 名称)在发现文件已更新时
+        调用（由调用方重新下载），on_done(RevalidationStats)在结束时调用
+        """
+        if self.running:
+            return False
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_changed, on_done, max_age),
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self, on_changed, on_done, max_age):
+        start = time.perf_counter()
+        rows = self.store.catalog.media_rows(time.time() - max_age if max_age else None)
+        counts = dict.fromkeys(STATES, 0)
+        lock = threading.Lock()
+
+        def check(row):
+            state = self._check_row(row)
+            with lock:
+                counts[state] += 1
+            if state == CHANGED and on_changed:
+                on_changed(row['url'], row['name'] or row['url'])
+            elif state == GONE and self.log:
+                self.log(f"链接已失效，保留缓存文件: {row['name'] or row['url']}")
+
+        for_each_per_host(rows, lambda row: row['url'], check, self.workers, self.per_host,
+                          self._cancel)
+        if on_done:
+            on_done(RevalidationStats(counts, time.perf_counter() - start, self._cancel.is_set()))
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+作品目录快照
+把解析好的目录（投影列和搜索索引）保存为二进制快照文件，下次导入同一文件时
+直接内存映射快照，不再解码和解析CSV。源文件的路径、大小、修改时间或内容
+指纹变化，或快照格式版本变化时，快照自动失效。快照中同时保存检测到的编码
+和完整的CSV方言（分隔符、引号、转义方式），与重新导入时的解析方式一致。
+
+文件布局：
+    MAGIC | 各数据段（8字节对齐） | 头部JSON | 头部偏移(u64) | 头部长度(u64) | MAGIC
+"""
+
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+
+from catalog_store import CatalogStore, InternedColumn, TextColumn
+from csv_loader import CSVFormat, dialect_from_params, dialect_params
+from search_index import NGramIndex
+
+
+MAGIC = b'CSVCAT\x00\x01'
+SNAPSHOT_VERSION = 2
+FOOTER = struct.Struct('<QQ8s')
+
+SNAPSHOT_DIR = os.path.join(tempfile.gettempdir(), "csv_player_cache", "catalog")
+
+# 内容指纹取文件头、中、尾各一段，校验耗时与文件大小无关
+FINGERPRINT_BLOCK = 256 * 1024
+
+
+def file_fingerprint(file_path):
+    """源文件指纹：路径、大小、修改时间和抽样内容哈希
+
+    有意只抽样三段内容而不哈希整个文件，载入快照的耗时才与文件大小无关。
+    大小和修改时间（纳秒）同时计入哈希；只有大小不变、修改时间也被还原、
+    且改动不在抽样段内的编辑才检测不到，这种情况重新导入一次即可。
+    """
+    stat = os.stat(file_path)
+    size = stat.st_size
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{size}:{stat.st_mtime_ns}".encode('ascii'))
+
+    with open(file_path, 'rb') as f:
+        for offset in (0, size // 2, size - FINGERPRINT_BLOCK):
+            f.seek(max(0, offset))
+            digest.update(f.read(FINGERPRINT_BLOCK))
+
+    return {
+        'path': os.path.abspath(file_path),
+        'size': size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': digest.hexdigest(),
+    }
+
+
+def snapshot_path(file_path, profile):
+    """快照文件位置（每个源文件、每种界面各一个）"""
+    key = f"{profile}:{os.path.abspath(file_path)}".encode('utf-8')
+    name = hashlib.sha1(key).hexdigest()[:20] + '.snap'
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+class FrozenPostings:
+    """映射自快照的倒排表：n-gram按序存放，查找时二分"""
+
+    def __init__(self, grams, postings, offsets):
+        self._grams = grams          # TextColumn，已排序
+        self._postings = postings    # 全部倒排表首尾相接（'I'）
+        self._offsets = offsets      # 每个n-gram的倒排表起点（'I'）
+
+    def __len__(self):
+        return len(self._grams)
+
+    def get(self, gram, default=None):
+        k = bisect.bisect_left(self._grams, gram)
+        if k < len(self._grams) and self._grams[k] == gram:
+            return self._postings[self._offsets[k]:self._offsets[k + 1]]
+        return default
+
+
+class CatalogSnapshot:
+    """从快照载入的目录"""
+
+    def __init__(self, store, index, columns, row_count, csv_format, path):
+        self.store = store
+        self.index = index
+        self.columns = columns
+        self.row_count = row_count
+        self.csv_format = csv_format
+        self.path = path
+
+
+class _SectionWriter:
+    """按8字节对齐写入数据段并记录位置"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sections = {}
+
+    def _align(self):
+        pad = -self.f.tell() % 8
+        if pad:
+            self.f.write(b'\0' * pad)
+
+    def write(self, name, data, typecode='B'):
+        self._align()
+        offset = self.f.tell()
+        self.f.write(data)
+        self.sections[name] = [offset, self.f.tell() - offset, typecode]
+
+    def write_many(self, name, chunks, typecode):
+        self._align()
+        offset = self.f.tell()
+        for chunk in chunks:
+            self.f.write(chunk)
+        self.sections[name] = [offset, self.f.tell() - offset, typecode]
+
+
+def save_snapshot(file_path, profile, store, index=None, index_fields=None,
+                  columns=None, row_count=0, csv_format=None, fingerprint=None):
+    """保存目录快照（先写临时文件再替换，写入失败不影响已有快照）"""
+    fingerprint = fingerprint or file_fingerprint(file_path)
+    path = snapshot_path(file_path, profile)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    header = {
+        'version': SNAPSHOT_VERSION,
+        'byteorder': sys.byteorder,
+        'fingerprint': fingerprint,
+        'fields': store.fields,
+        'count': len(store),
+        'interned': {},
+        'index_fields': list(index_fields) if index is not None else None,
+        'columns': list(columns or []),
+        'row_count': row_count,
+        'encoding': csv_format.encoding if csv_format else None,
+        'dialect': dialect_params(csv_format.dialect) if csv_format else None,
+    }
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            writer = _SectionWriter(f)
+
+            for field in store.fields:
+                column = store.column(field)
+                if isinstance(column, InternedColumn):
+                    ids, values = column.buffers()
+                    writer.write(f'col:{field}:ids', ids, 'I')
+                    header['interned'][field] = values
+                else:
+                    buffer, offsets = column.buffers()
+                    writer.write(f'col:{field}:buf', buffer)
+                    writer.write(f'col:{field}:off', offsets, 'I')
+
+            if index is not None:
+                texts, postings = index.parts()
+                text_column = TextColumn()
+                for text in texts:
+                    text_column.append(text)
+                buffer, offsets = text_column.buffers()
+                writer.write('idx:texts:buf', buffer)
+                writer.write('idx:texts:off', offsets, 'I')
+
+                grams = sorted(postings)
+                gram_column = TextColumn()
+                posting_offsets = array('I', [0])
+                for gram in grams:
+                    gram_column.append(gram)
+                    posting_offsets.append(posting_offsets[-1] + len(postings[gram]))
+                buffer, offsets = gram_column.buffers()
+                writer.write('idx:grams:buf', buffer)
+                writer.write('idx:grams:off', offsets, 'I')
+                writer.write_many('idx:post', (postings[gram] for gram in grams), 'I')
+                writer.write('idx:post:off', posting_offsets, 'I')
+
+            header['sections'] = writer.sections
+            header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            header_offset = f.tell()
+            f.write(header_bytes)
+            f.write(FOOTER.pack(header_offset, len(header_bytes), MAGIC))
+
+        os.replace(tmp_path, path)
+        return path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_snapshot_in_background(*args, log=None, **kwargs):
+    """在后台线程中保存快照，失败只记录日志"""
+    def run():
+        try:
+            path = save_snapshot(*args, **kwargs)
+            if log:
+                log(f"目录快照已保存: {os.path.basename(path)}")
+        except Exception as e:
+            if log:
+                log(f"保存目录快照失败: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def load_snapshot(file_path, profile, fields=None, index_fields=None):
+    """载入有效的目录快照；不存在、已过期或格式不符时返回None
+
+    fields/index_fields不为None时要求快照中的列与之一致
+    """
+    path = snapshot_path(file_path, profile)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        view = memoryview(mm)
+        if len(mm) < len(MAGIC) + FOOTER.size or view[:len(MAGIC)] != MAGIC:
+            raise ValueError("快照格式错误")
+        header_offset, header_len, magic = FOOTER.unpack(view[-FOOTER.size:])
+        if magic != MAGIC:
+            raise ValueError("快照格式错误")
+        header = json.loads(str(view[header_offset:header_offset + header_len], 'utf-8'))
+
+        if header.get('version') != SNAPSHOT_VERSION or header.get('byteorder') != sys.byteorder:
+            raise ValueError("快照版本不符")
+        if fields is not None and header['fields'] != list(fields):
+            raise ValueError("快照列不符")
+        if index_fields is not None and header['index_fields'] != list(index_fields):
+            raise ValueError("快照索引列不符")
+        if header['fingerprint'] != file_fingerprint(file_path):
+            raise ValueError("源文件已变化")
+
+        sections = header['sections']
+
+        def section(name):
+            offset, length, typecode = sections[name]
+            data = view[offset:offset + length]
+            return data if typecode == 'B' else data.cast(typecode)
+
+        columns = {}
+        for field in header['fields']:
+            if field in header['interned']:
+                columns[field] = InternedColumn.from_buffers(
+                    section(f'col:{field}:ids'), header['interned'][field])
+            else:
+                columns[field] = TextColumn.from_buffers(
+                    section(f'col:{field}:buf'), section(f'col:{field}:off'))
+        store = CatalogStore.from_columns(columns, header['count'])
+
+        index = None
+        if header['index_fields'] is not None:
+            texts = TextColumn.from_buffers(section('idx:texts:buf'), section('idx:texts:off'))
+            grams = TextColumn.from_buffers(section('idx:grams:buf'), section('idx:grams:off'))
+            postings = FrozenPostings(grams, section('idx:post'), section('idx:post:off'))
+            index = NGramIndex.from_parts(texts, postings)
+
+        csv_format = None
+        if header['encoding']:
+            csv_format = CSVFormat(header['encoding'], dialect_from_params(header['dialect']), 0.0)
+
+        # 数据段引用着映射，mmap随快照对象一起释放
+        return CatalogSnapshot(store, index, header['columns'], header['row_count'],
+                               csv_format, path)
+    except (ValueError, KeyError, TypeError, struct.error, OSError):
+        view = None
+        try:
+            mm.close()
+        except BufferError:
+            pass
+        return None
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的作品目录存储
+只保留界面用到的列，按列存放在数组中；组别、学校等重复度高的值只存一份，
+行记录按需生成（__slots__对象），不再为每一行保留包含全部表头的字典
+"""
+
+from array import array
+
+
+# 界面用到的列
+PROJECTED_FIELDS = ['作品名称', '身份证名字', '参赛者组别', '指导老师',
+                    '推送单位学校', '资料链接', '展演号码', '姓名']
+
+# 取值重复度高、适合字典编码的列
+INTERNED_FIELDS = {'参赛者组别', '推送单位学校', '指导老师'}
+
+# 判断链接列的关键字
+LINK_KEYWORDS = ['链接', 'url', 'link', '地址']
+
+
+class TextColumn:
+    """文本列：UTF-8编码后连续存放，用偏移数组定位每个值
+
+    缓冲区也可以是只读的memoryview（例如映射自目录快照文件）
+    """
+
+    __slots__ = ('_buffer', '_offsets')
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offsets = array('I', [0])  # 单列文本不会超过4GB
+
+    @classmethod
+    def from_buffers(cls, buffer, offsets):
+        column = cls.__new__(cls)
+        column._buffer = buffer
+        column._offsets = offsets
+        return column
+
+    def buffers(self):
+        return self._buffer, self._offsets
+
+    def append(self, value):
+        self._buffer += value.encode('utf-8')
+        self._offsets.append(len(self._buffer))
+
+    def get(self, row_id):
+        offsets = self._offsets
+        return str(self._buffer[offsets[row_id]:offsets[row_id + 1]], 'utf-8')
+
+    __getitem__ = get
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for row_id in range(len(self)):
+            yield self.get(row_id)
+
+    def nbytes(self):
+        return len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+
+
+class InternedColumn:
+    """字典编码列：每行只存值的编号，相同的值只保存一次"""
+
+    __slots__ = ('_ids', '_values', '_lookup')
+
+    def __init__(self):
+        self._ids = array('I')
+        self._values = []
+        self._lookup = {}
+
+    @classmethod
+    def from_buffers(cls, ids, values):
+        column = cls.__new__(cls)
+        column._ids = ids
+        column._values = list(values)
+        column._lookup = {value: value_id for value_id, value in enumerate(column._values)}
+        return column
+
+    def buffers(self):
+        return self._ids, self._values
+
+    def append(self, value):
+        value_id = self._lookup.get(value)
+        if value_id is None:
+            value_id = self._lookup[value] = len(self._values)
+            self._values.append(value)
+        self._ids.append(value_id)
+
+    def get(self, row_id):
+        return self._values[self._ids[row_id]]
+
+    def nbytes(self):
+        return (self._ids.itemsize * len(self._ids)
+                + sum(len(value.encode('utf-8')) for value in self._values))
+
+
+class CatalogRow:
+    """目录中的一行（只读，接口与DictReader产生的字典一致）"""
+
+    __slots__ = ('_store', '_row_id')
+
+    def __init__(self, store, row_id):
+        self._store = store
+        self._row_id = row_id
+
+    def get(self, key, default=None):
+        column = self._store._columns.get(key)
+        if column is None:
+            return default
+        return column.get(self._row_id)
+
+    def __getitem__(self, key):
+        column = self._store._columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        return column.get(self._row_id)
+
+    def __contains__(self, key):
+        return key in self._store._columns
+
+    def keys(self):
+        return list(self._store.fields)
+
+    def to_dict(self):
+        return {field: self[field] for field in self._store.fields}
+
+
+class CatalogStore:
+    """列式作品目录
+
+    可以像列表一样使用：len()、下标访问和迭代得到CatalogRow
+    """
+
+    def __init__(self, fields=PROJECTED_FIELDS, interned=INTERNED_FIELDS):
+        self.fields = list(fields)
+        self._columns = {
+            field: InternedColumn() if field in interned else TextColumn()
+            for field in self.fields
+        }
+        self._appenders = [(field, column.append) for field, column in self._columns.items()]
+        self._count = 0
+
+    @classmethod
+    def from_columns(cls, columns, count):
+        """由已有的列对象组装（columns为字段到列对象的有序字典）"""
+        store = cls.__new__(cls)
+        store.fields = list(columns)
+        store._columns = dict(columns)
+        store._appenders = [(field, column.append) for field, column in store._columns.items()]
+        store._count = count
+        return store
+
+    @classmethod
+    def for_columns(cls, columns, extra_fields=()):
+        """按文件表头选择要保留的列：界面用到的列、extra_fields和所有链接列
+
+        只保留文件中实际存在的列，缺少的列读取时返回默认值，与字典的行为一致
+        """
+        columns = columns or []
+        fields = [field for field in PROJECTED_FIELDS if field in columns]
+        for column in columns:
+            if column in fields:
+                continue
+            if column in extra_fields or \
+                    any(keyword in column.lower() for keyword in LINK_KEYWORDS):
+                fields.append(column)
+        return cls(fields)
+
+    @classmethod
+    def from_stream(cls, stream, extra_fields=()):
+        """读取流式读取器（CSVStream等）中的全部行"""
+        rows = iter(stream)
+        first = next(rows, None)  # 读到第一行后表头才确定
+        store = cls.for_columns(stream.columns, extra_fields)
+        if first is not None:
+            store.append(first)
+            store.extend(rows)
+        return store
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __getitem__(self, row_id):
+        if row_id < 0:
+            row_id += self._count
+        if not 0 <= row_id < self._count:
+            raise IndexError(row_id)
+        return CatalogRow(self, row_id)
+
+    def __iter__(self):
+        for row_id in range(self._count):
+            yield CatalogRow(self, row_id)
+
+    def append(self, row):
+        """追加一行（row为字典或CatalogRow，只保留投影列）"""
+        get = row.get
+        for field, append in self._appenders:
+            value = get(field)
+            append('' if value is None else str(value))
+        self._count += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def column(self, field):
+        """取得某一列的列对象"""
+        return self._columns[field]
+
+    def value(self, row_id, field, default=''):
+        """直接读取某一格的值（不创建行对象）"""
+        column = self._columns.get(field)
+        if column is None:
+            return default
+        return column.get(row_id)
+
+    def nbytes(self):
+        """数据占用的字节数（不含Python对象头）"""
+        return sum(column.nbytes() for column in self._columns.values())
+
+
+class MappedCatalog:
+    """内存映射模式的作品目录
+
+    只保存记录在源文件中的行号，行内容由MappedCSV按需解码；
+    接口与CatalogStore一致，可直接作为表格模型的数据
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.fields = list(source.columns or [])
+        self._row_ids = array('I')
+
+    def __len__(self):
+        return len(self._row_ids)
+
+    def __bool__(self):
+        return len(self._row_ids) > 0
+
+    def __getitem__(self, row_id):
+        return self.source.row(self._row_ids[row_id])
+
+    def __iter__(self):
+        for source_id in self._row_ids:
+            yield self.source.row(source_id)
+
+    def append(self, row):
+        """追加一行（row为MappedCSV产出的行）"""
+        self._row_ids.append(row.row_id)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def value(self, row_id, field, default=''):
+        """直接读取某一格的值"""
+        value = self.source.row(self._row_ids[row_id]).get(field)
+        return default if value is None else value
+
+    def nbytes(self):
+        """常驻内存的字节数（行号表和源文件的行偏移表）"""
+        return self._row_ids.itemsize * len(self._row_ids) + self.source.nbytes()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试共用的本地文件服务（http.server）
+任意路径都返回同一个文件，支持Range/If-Range、If-None-Match/If-Modified-Since
+和HEAD；可以模拟连接中断、慢速响应、不支持HEAD、重定向和失效的链接。
+"""
+
+import http.server
+import os
+import re
+import threading
+import time
+
+import pytest
+
+CONTENT = os.urandom(300 * 1024)
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    """文件服务；server上的属性控制响应：
+
+    cut_after不为None时，下一个响应只发送这么多字节就断开连接；delay为每个响应
+    前的等待秒数；framing为'chunked'时分块传输、为'close'时不发送长度（以关闭
+    连接结束）；unknown_total为True时Content-Range不给出总长度；conditional为
+    False时忽略条件请求；head_status不为None时HEAD请求返回这个状态码；
+    redirects为{路径: 地址}；missing中的路径返回404
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(dict(self.headers))
+            server.paths.append((self.command, self.path))
+            data, etag = server.content, server.etag
+            cut_after, server.cut_after = server.cut_after, None
+        time.sleep(server.delay)
+
+        if self.path in server.redirects:
+            self.send_response(302)
+            self.send_header('Location', server.redirects[self.path])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path in server.missing:
+            self.send_error(404)
+            return
+        if self.command == 'HEAD' and server.head_status is not None:
+            self.send_error(server.head_status)
+            return
+        # 有If-None-Match时忽略If-Modified-Since（RFC 9110）
+        if_none_match = self.headers.get('If-None-Match')
+        not_modified = (if_none_match == etag if if_none_match is not None
+                        else self.headers.get('If-Modified-Since') == LAST_MODIFIED)
+        if server.conditional and not_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        size = len(data)
+        start, end, status = 0, size - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if match and (if_range is None or if_range == etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            status = 206
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        self.send_response(status)
+        self.send_header('Content-Type', server.content_type)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        if server.framing == 'chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+        elif server.framing == 'close':
+            self.close_connection = True
+        else:
+            self.send_header('Content-Length', str(end + 1 - start))
+        if status == 206:
+            total = '*' if server.unknown_total else size
+            self.send_header('Content-Range', f'bytes {start}-{end}/{total}')
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        body = data[start:end + 1]
+        if server.framing == 'chunked':
+            body = b''.join(b'%x\r\n%s\r\n' % (len(piece), piece)
+                            for piece in (body[i:i + 16 * 1024]
+                                          for i in range(0, len(body), 16 * 1024)))
+            body += b'0\r\n\r\n'
+        if cut_after is not None:
+            body = body[:cut_after]
+            self.close_connection = True
+        with server.lock:
+            server.bytes_sent += len(body)
+        try:
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+
+class FileServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FileHandler)
+        self.lock = threading.Lock()
+        self.requests = []      # 各请求的请求头
+        self.paths = []         # [(方法, 路径)]
+        self.bytes_sent = 0
+        self.cut_after = None
+        self.delay = 0
+        self.framing = None
+        self.unknown_total = False
+        self.conditional = True
+        self.head_status = None
+        self.redirects = {}
+        self.missing = set()
+        self.content_type = 'video/mp4'
+        self.set_content(CONTENT, '"v1"')
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def set_content(self, content, etag):
+        with self.lock:
+            self.content, self.etag = content, etag
+
+    def handle_error(self, request, client_address):
+        pass  # 客户端中途断开等
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr('urllib.request.getproxies', lambda: {})
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def url(server):
+    return f'{server.base_url}/video.mp4'
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSV文件加载
+一次读取样本即可确定文件编码和分隔符，然后以确定的编码流式解析；
+导入在后台线程中进行，数据分批交给界面，先显示的行无需等待整个文件解析完。
+大文件使用内存映射模式：只记录每行的起始偏移，行内容在显示时才解码
+"""
+
+import codecs
+import csv
+import io
+import mmap
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from search_index import NGramIndex
+
+
+# 编码/分隔符检测读取的样本大小
+SAMPLE_SIZE = 64 * 1024
+
+# 无BOM时依次尝试的编码（gb18030兼容gbk/gb2312）
+CANDIDATE_ENCODINGS = ['utf-8', 'gbk', 'gb18030']
+
+# 允许的分隔符
+DELIMITERS = ',;\t|'
+
+# 流式导入：第一批尽快显示，之后按时间间隔合并成批
+FIRST_BATCH_SIZE = 200
+BATCH_INTERVAL = 0.1
+
+# 每读取多少行检查一次是否已取消
+CANCEL_CHECK_ROWS = 256
+
+# 超过此大小的文件使用内存映射模式
+MAPPED_MIN_SIZE = 64 * 1024 * 1024
+
+# 内存映射模式：每次划分/解码的行数，以及缓存的已解码行数
+MAPPED_CHUNK_ROWS = 1024
+ROW_CACHE_SIZE = 512
+
+# 单字节字符与ASCII一致的编码（多字节字符中不会出现引号和换行的字节），可按字节划分行
+MAPPED_ENCODINGS = {'utf-8', 'utf-8-sig', 'gbk', 'gb18030'}
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+class excel_semicolon(csv.excel):
+    """分号分隔的CSV（部分地区Excel导出的格式）"""
+    delimiter = ';'
+
+
+# 保存格式时记录的方言参数（见dialect_params）
+DIALECT_ATTRS = ('delimiter', 'quotechar', 'doublequote', 'escapechar', 'skipinitialspace')
+
+
+def dialect_params(dialect):
+    """方言的全部格式参数（可保存为JSON）"""
+    return {name: getattr(dialect, name) for name in DIALECT_ATTRS}
+
+
+def dialect_from_params(params):
+    """按dialect_params保存的参数重建方言"""
+    return type('excel_saved', (csv.excel,), {name: params[name] for name in DIALECT_ATTRS})
+
+
+class CSVFormat:
+    """CSV文件格式检测结果"""
+
+    def __init__(self, encoding, dialect, detect_time):
+        self.encoding = encoding
+        self.dialect = dialect
+        self.detect_time = detect_time  # 检测耗时（秒）
+
+    @property
+    def delimiter(self):
+        return self.dialect.delimiter
+
+
+def _decode_sample(sample, encoding, final):
+    """用增量解码器解码样本，样本末尾被截断的多字节字符不视为错误"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='strict')
+    return decoder.decode(sample, final=final)
+
+
+def _sniff_dialect(text):
+    """检测分隔符等格式，失败时按分隔符出现次数判断"""
+    # 只使用完整的行，避免样本末尾的半行干扰检测
+    if '\n' in text:
+        text = text[:text.rfind('\n') + 1]
+
+    try:
+        return csv.Sniffer().sniff(text, delimiters=DELIMITERS)
+    except csv.Error:
+        pass
+
+    dialect = csv.excel
+    first_line = text.split('\n', 1)[0]
+    if first_line.count(';') > first_line.count(','):
+        dialect = excel_semicolon
+    elif first_line.count('\t') > first_line.count(','):
+        dialect = csv.excel_tab
+    return dialect
+
+
+def detect_csv_format(file_path, sample_size=SAMPLE_SIZE):
+    """读取一次文件样本，检测编码和分隔符"""
+    start = time.perf_counter()
+
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+        final = len(sample) < sample_size
+
+    encoding = None
+    text = None
+    for bom, bom_encoding in BOMS:
+        if sample.startswith(bom):
+            encoding = bom_encoding
+            text = _decode_sample(sample, encoding, final)
+            break
+
+    if encoding is None:
+        for candidate in CANDIDATE_ENCODINGS:
+            try:
+                text = _decode_sample(sample, candidate, final)
+                encoding = candidate
+                break
+            except UnicodeDecodeError:
+                continue
+
+    if encoding is None:
+        raise Exception("无法识别文件编码")
+
+    dialect = _sniff_dialect(text)
+    return CSVFormat(encoding, dialect, time.perf_counter() - start)
+
+
+def open_csv(file_path, csv_format):
+    """按检测结果打开文件，返回DictReader（逐行解析，不一次性读入）"""
+    f = open(file_path, 'r', encoding=csv_format.encoding, newline='')
+    return f, csv.DictReader(f, dialect=csv_format.dialect)
+
+
+class CSVStream:
+    """流式CSV读取器
+
+    逐行产出字典；columns在读取第一行前即可用，bytes_read/total_bytes用于显示进度
+    """
+
+    def __init__(self, file_path, csv_format=None):
+        self.file_path = file_path
+        self.csv_format = csv_format or detect_csv_format(file_path)
+        self.total_bytes = os.path.getsize(file_path)
+        self.columns = None
+        self._raw = None
+
+    @property
+    def bytes_read(self):
+        raw = self._raw
+        if raw is None or raw.closed:
+            return self.total_bytes
+        return raw.tell()
+
+    def __iter__(self):
+        yielded = 0
+        while True:
+            self._raw = open(self.file_path, 'rb')
+            f = io.TextIOWrapper(self._raw, encoding=self.csv_format.encoding, newline='')
+            with f:
+                reader = csv.DictReader(f, dialect=self.csv_format.dialect)
+                try:
+                    self.columns = reader.fieldnames
+                    skip = yielded
+                    for row in reader:
+                        if skip:
+                            skip -= 1
+                            continue
+                        yielded += 1
+                        yield row
+                    return
+                except UnicodeDecodeError:
+                    # 样本之后出现了不符合检测结果的字节：换用兼容性最好的编码，
+                    # 跳过已经产出的行后继续（解码是严格的，已产出的行不受影响）
+                    if self.csv_format.encoding == 'gb18030':
+                        raise Exception("无法识别文件编码")
+                    self.csv_format.encoding = 'gb18030'
+
+
+class MappedRow(dict):
+    """内存映射模式产出的行（字典，另带源文件中的行号）"""
+    __slots__ = ('row_id',)
+
+
+class MappedCSV:
+    """内存映射的CSV文件
+
+    迭代时一次扫描划分出全部行（引号内的换行不算行结束），只把每行的起始偏移
+    记录在array('Q')中；row()按需解码单行，最近用到的行保存在一个小的LRU缓存里。
+    行的划分按引号配对判断，字段中间出现不成对的引号时与csv模块的解析结果可能不同。
+    迭代接口与CSVStream相同，可直接用于iter_import_batches。
+    迭代（导入线程）的同时界面线程可以调用row()：行偏移表和编码的读写都在锁内进行。
+    """
+
+    def __init__(self, file_path, csv_format=None, cache_size=ROW_CACHE_SIZE):
+        self.file_path = file_path
+        self.csv_format = csv_format or detect_csv_format(file_path)
+        if self.csv_format.encoding not in MAPPED_ENCODINGS:
+            raise ValueError(f"内存映射模式不支持{self.csv_format.encoding}编码")
+
+        quotechar = self.csv_format.dialect.quotechar
+        self._quote = quotechar.encode('ascii') if quotechar else None
+        self._file = open(file_path, 'rb')
+        self.total_bytes = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self.total_bytes else b''
+
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()   # 保护行偏移表、编码和行缓存
+
+        # 第一条记录是表头；_offsets[i]到_offsets[i + 1]是第i行（含其前面的空行）
+        header_end, _ = self._scan_record(0)
+        header = self._decode_rows(0, header_end)
+        self.columns = header[0] if header else None
+        self._offsets = array('Q', [header_end])
+        self._pos = header_end
+        self._complete = header_end >= self.total_bytes
+
+    @property
+    def bytes_read(self):
+        return self._pos
+
+    def __len__(self):
+        with self._lock:
+            return len(self._offsets) - 1
+
+    def _scan_record(self, pos):
+        """从pos开始找到下一条记录的结束位置，返回(结束位置, 是否找到记录)（跳过空行）"""
+        mm, size, quote = self._mm, self.total_bytes, self._quote
+        in_record = False
+        quotes = 0
+        while pos < size:
+            newline = mm.find(b'\n', pos)
+            end = size if newline < 0 else newline + 1
+            if not in_record and end - pos <= 2 and mm[pos:end] in (b'\n', b'\r\n'):
+                pos = end
+                continue
+            in_record = True
+            if quote and mm.find(quote, pos, end) >= 0:
+                quotes += mm[pos:end].count(quote)
+            pos = end
+            if quotes % 2 == 0:
+                break
+        return pos, in_record
+
+    def _scan(self, limit):
+        """继续划分最多limit行（只在迭代的线程中调用，划分完一批后再加入偏移表）"""
+        ends = array('Q')
+        pos = self._pos
+        complete = False
+        for _ in range(limit):
+            end, found = self._scan_record(pos)
+            if not found:
+                pos = self.total_bytes
+                break
+            ends.append(end)
+            pos = end
+        if pos >= self.total_bytes:
+            complete = True
+        with self._lock:
+            self._offsets.extend(ends)
+            self._pos = pos
+            self._complete = complete
+
+    def _decode_rows(self, start, end, encoding=None):
+        """解码一段字节，返回其中的非空行"""
+        text = str(self._mm[start:end], encoding or self.csv_format.encoding)
+        return [values for values in
+                csv.reader(io.StringIO(text, newline=''), self.csv_format.dialect)
+                if values]
+
+    def _make_row(self, row_id, values):
+        """按DictReader的规则把字段列表转为字典"""
+        columns = self.columns or []
+        row = MappedRow(zip(columns, values))
+        row.row_id = row_id
+        if len(values) > len(columns):
+            row[None] = values[len(columns):]
+        elif len(values) < len(columns):
+            for key in columns[len(values):]:
+                row[key] = None
+        return row
+
+    def _decode_range(self, first, last):
+        """解码第first到last-1行"""
+        with self._lock:
+            offsets = self._offsets[first:last + 1]
+        while True:
+            with self._lock:
+                encoding = self.csv_format.encoding
+            try:
+                rows = self._decode_rows(offsets[0], offsets[-1], encoding)
+                if len(rows) != last - first:
+                    # 引号不规范导致划分与解析不一致：逐行解码，保证行号对应
+                    rows = [(self._decode_rows(offsets[i], offsets[i + 1], encoding) or [[]])[0]
+                            for i in range(last - first)]
+                break
+            except UnicodeDecodeError:
+                # 与CSVStream相同：换用兼容性最好的编码（已解码的行不受影响）
+                if encoding == 'gb18030':
+                    raise Exception("无法识别文件编码")
+                with self._lock:
+                    self.csv_format.encoding = 'gb18030'
+        return [self._make_row(row_id, values)
+                for row_id, values in zip(range(first, last), rows)]
+
+    def __iter__(self):
+        row_id = 0
+        while True:
+            if not self._complete and row_id + MAPPED_CHUNK_ROWS > len(self):
+                self._scan(MAPPED_CHUNK_ROWS)
+            last = min(row_id + MAPPED_CHUNK_ROWS, len(self))
+            if last == row_id:
+                return
+            yield from self._decode_range(row_id, last)
+            row_id = last
+
+    def row(self, row_id):
+        """按行号取一行（经过LRU缓存；返回的字典不要修改）"""
+        with self._lock:
+            row = self._cache.get(row_id)
+            if row is not None:
+                self._cache.move_to_end(row_id)
+                return row
+
+        if not 0 <= row_id < len(self):
+            raise IndexError(row_id)
+        row = self._decode_range(row_id, row_id + 1)[0]
+
+        with self._lock:
+            self._cache[row_id] = row
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return row
+
+    __getitem__ = row
+
+    def nbytes(self):
+        """常驻内存的字节数（行偏移表，不含映射的文件内容和缓存）"""
+        with self._lock:
+            return self._offsets.itemsize * len(self._offsets)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+
+def open_stream(file_path, mapped_min_size=MAPPED_MIN_SIZE):
+    """按文件大小选择读取方式：大文件使用内存映射，否则逐行流式读取"""
+    csv_format = detect_csv_format(file_path)
+    if os.path.getsize(file_path) >= mapped_min_size and \
+            csv_format.encoding in MAPPED_ENCODINGS:
+        return MappedCSV(file_path, csv_format)
+    return CSVStream(file_path, csv_format)
+
+
+class ImportBatch:
+    """流式导入中的一批数据"""
+
+    def __init__(self, items, columns, bytes_read, total_bytes, row_count):
+        self.items = items
+        self.columns = columns
+        self.bytes_read = bytes_read
+        self.total_bytes = total_bytes
+        self.row_count = row_count      # 已读取的源数据行数（含被过滤的行）
+        self.done = False
+        self.cancelled = False
+        self.index = None
+        self.item_count = 0
+        self.csv_format = None
+
+    @property
+    def progress(self):
+        if not self.total_bytes:
+            return 100.0
+        return min(100.0, self.bytes_read * 100.0 / self.total_bytes)
+
+
+def iter_import_batches(stream, transform=None, index_fields=None, cancel_event=None,
+                        first_batch_size=FIRST_BATCH_SIZE, interval=BATCH_INTERVAL):
+    """把行流合并成批（生成器，在后台线程中消费）
+
+    transform(row_number, row, columns)把源数据行转换为界面使用的记录，返回None则跳过；
+    指定index_fields时同时为记录建立搜索索引。
+    最后一批的done为True，并带有记录总数和建好的索引（取消时是已导入部分的索引）。
+    """
+    index = NGramIndex() if index_fields else None
+    items = []
+    item_count = 0
+    row_count = 0
+    first = True
+    last_flush = time.perf_counter()
+
+    def make_batch():
+        return ImportBatch(items, stream.columns, stream.bytes_read,
+                           stream.total_bytes, row_count)
+
+    for row_count, row in enumerate(stream, 1):
+        if cancel_event is not None and row_count % CANCEL_CHECK_ROWS == 0 \
+                and cancel_event.is_set():
+            if index is not None and items:
+                index.add(items, index_fields)
+            batch = make_batch()
+            batch.done = batch.cancelled = True
+            batch.index = index
+            batch.item_count = item_count
+            yield batch
+            return
+
+        item = transform(row_count - 1, row, stream.columns) if transform else row
+        if item is None:
+            continue
+        items.append(item)
+        item_count += 1
+
+        if (first and len(items) >= first_batch_size) or \
+                (not first and time.perf_counter() - last_flush >= interval):
+            if index is not None:
+                index.add(items, index_fields)
+            yield make_batch()
+            items = []
+            first = False
+            last_flush = time.perf_counter()
+
+    if index is not None and items:
+        index.add(items, index_fields)
+    batch = make_batch()
+    batch.done = True
+    batch.index = index
+    batch.item_count = item_count
+    batch.csv_format = getattr(stream, 'csv_format', None)
+    yield batch
+
+
+class CSVImportWorker(threading.Thread):
+    """后台导入线程（供Tk界面使用）
+
+    每一批ImportBatch放入events队列，出错时放入异常对象；界面用定时器取出处理
+    """
+
+    def __init__(self, stream_factory, events, **batch_options):
+        super().__init__(daemon=True)
+        self.stream_factory = stream_factory
+        self.events = events
+        self.batch_options = batch_options
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """取消导入"""
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            stream = self.stream_factory()
+            for batch in iter_import_batches(stream, cancel_event=self.cancel_event,
+                                             **self.batch_options):
+                self.events.put(batch)
+        except Exception as e:
+            self.events.put(e)
@@ -10,61 +10,54 @@ CSV作品播放器 - 高级版
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import urllib.request
 import urllib.parse
 import webbrowser
 import os
-import threading
 import time
-import json
+import hashlib
 import subprocess
 import sys
-import csv
 import re
 from pathlib import Path
-import ssl
 import tempfile
-import shutil
+import queue
 
-# 禁用SSL验证（处理某些下载链接的SSL问题）
-ssl._create_default_https_context = ssl._create_unverified_context
+from cache_eviction import CacheEvictor, LFUPolicy, LRUPolicy, UpcomingPolicy
+from cache_revalidation import CHANGED, CacheRevalidator
+from catalog_snapshot import file_fingerprint, load_snapshot, save_snapshot_in_background
+from catalog_store import CatalogStore
+from csv_loader import CSVStream, CSVImportWorker
+from download_pool import (CANCELLED, DownloadCancelled, DownloadPool, DEFAULT_PER_HOST,
+                           DEFAULT_WORKERS, INTERACTIVE, SingleFlight)
+from file_download import MAX_SEGMENTS, RejectedResponse, download_to_file
+from http_pool import shared_pool
+from media_sniff import MediaSniffer, NotMediaError
+from media_store import MediaStore, media_extension
+from prefetch import Prefetcher
+from search_index import NGramIndex, SearchWorker
+from url_canon import canonical_url
+from ui_events import FRAME_INTERVAL, UIEventQueue
 
-class CSVReader:
-    """CSV文件读取器（支持多种编码）"""
-    
-    @staticmethod
-    def read_csv(file_path):
-        """智能读取CSV文件"""
-        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
-        
-        for encoding in encodings:
-            try:
-                data = []
-                with open(file_path, 'r', encoding=encoding) as f:
-                    # 检测分隔符
-                    sample = f.read(1024)
-                    f.seek(0)
-                    
-                    delimiter = ','
-                    if sample.count(';') > sample.count(','):
-                        delimiter = ';'
-                    elif sample.count('\t') > sample.count(','):
-                        delimiter = '\t'
-                    
-                    reader = csv.DictReader(f, delimiter=delimiter)
-                    data = list(reader)
-                    columns = reader.fieldnames
-                    
-                return data, columns, encoding
-                
-            except (UnicodeDecodeError, UnicodeError):
-                continue
-            except Exception as e:
-                if encoding == encodings[-1]:  # 最后一个编码也失败
-                    raise Exception(f"无法读取CSV文件: {e}")
-                continue
-                
-        raise Exception("无法识别文件编码")
+# 后台搜索结果的轮询间隔（毫秒）
+SEARCH_POLL_INTERVAL = 50
+
+# 流式导入：轮询间隔（毫秒）和每次最多插入列表的行数，保证界面能及时刷新
+IMPORT_POLL_INTERVAL = 50
+IMPORT_ROWS_PER_TICK = 2000
+
+# 作品记录中参与搜索的字段
+SEARCH_FIELDS = ['name', 'participant', 'organization']
+
+# 目录快照：保存作品记录中由CSV决定的字段（状态和缓存文件在界面中另行维护）
+SNAPSHOT_PROFILE = 'advanced'
+WORK_FIELDS = ['id', 'name', 'participant', 'category', 'teacher', 'organization', 'url']
+
+# 缓存默认上限（GB），以及"即将播放优先保留"策略保留的作品数
+CACHE_BUDGET_GB = 20
+UPCOMING_COUNT = 10
+
+# 选择或滚动位置变化后更新预取计划的延迟（毫秒，连续滚动时只更新一次）
+PREFETCH_UPDATE_DELAY = 150
 
 class MediaManager:
     """媒体文件管理器"""
@@ -73,29 +66,24 @@ class MediaManager:
         self.progress_callback = progress_callback
         self.log_callback = log_callback
         self.cache_dir = os.path.join(tempfile.gettempdir(), "csv_player_cache")
-        self.cached_files = {}
-        self.load_cache_info()
+        self.http = shared_pool()  # keep-alive连接池（证书无法校验的站点单独处理）
+        self.http.log = self.log
+        # 按内容摘要保存文件，作品名称相近或多行引用同一视频时不会互相覆盖；
+        # 缓存记录保存在SQLite数据库中，旧版的cache_info.json在第一次启动时导入
+        self.store = MediaStore(self.cache_dir, log=self.log)
+        self.store.import_history(os.path.join(self.cache_dir, "cache_info.json"))
+        # 检查每个下载的开头几KB，网页或文本立即中止（统计浪费的字节数）
+        self.sniffer = MediaSniffer()
+        # 用ETag/Last-Modified确认缓存文件在服务器上没有变化；revalidate_on_use为True时
+        # 每次使用缓存前都确认一次
+        self.revalidator = CacheRevalidator(self.http, self.store, log=self.log)
+        self.revalidate_on_use = False
+        # 同一链接（规范化后相同）同时只下载一次，下载池和预取都经过这里
+        self.flights = SingleFlight()
+        # 缓存超出上限时在后台淘汰
+        self.evictor = CacheEvictor(self.store, CACHE_BUDGET_GB * 1024 ** 3, log=self.log)
+        self.evictor.start()
         
-    def load_cache_info(self):
-        """加载缓存信息"""
-        cache_file = os.path.join(self.cache_dir, "cache_info.json")
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    self.cached_files = json.load(f)
-            except Exception as e:
-                self.log(f"加载缓存信息失败: {e}")
-                
-    def save_cache_info(self):
-        """保存缓存信息"""
-        os.makedirs(self.cache_dir, exist_ok=True)
-        cache_file = os.path.join(self.cache_dir, "cache_info.json")
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cached_files, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            self.log(f"保存缓存信息失败: {e}")
-            
     def log(self, message):
         """记录日志"""
         print(f"[{time.strftime('%H:%M:%S')}] {message}")
@@ -122,7 +110,7 @@ class MediaManager:
                         safe_name += ext
                         break
             else:
-                safe_name += '.mp4'  # 默认扩展名
+                safe_name += '.mp4'  # 默认扩展名（入库时按文件开头的字节改为实际格式）
                 
         return safe_name
         
@@ -137,69 +125,113 @@ class MediaManager:
         ]
         return any(platform in url.lower() for platform in platforms)
         
-    def try_download_video(self, url, work_name):
-        """尝试下载视频文件"""
+    def try_download_video(self, url, work_name, progress=None, refresh=False):
+        """尝试下载视频文件
+
+        progress(已下载字节数, 总字节数)为本次下载的进度回调（下载池用于统计和取消）；
+        refresh为True时不使用缓存（服务器上的文件已更新）
+        """
         try:
-            # 检查是否已缓存
-            if url in self.cached_files:
-                cached_path = self.cached_files[url]
-                if os.path.exists(cached_path):
+            # 同一链接已经下载过（可能来自其他作品，或是旧版本按作品名称保存的
+            # 缓存文件），计入缓存命中率
+            cache_path = None if refresh else self.store.lookup(url)
+            if cache_path is not None:
+                if not self.revalidate_on_use or self.revalidator.check(url) != CHANGED:
                     self.log(f"使用缓存文件: {work_name}")
-                    return cached_path
-                    
-            filename = self.get_safe_filename(url, work_name)
-            cache_path = os.path.join(self.cache_dir, filename)
-            
-            os.makedirs(self.cache_dir, exist_ok=True)
-            
+                    return cache_path
+                self.log(f"服务器上的文件已更新，重新下载: {work_name}")
+                refresh = True  # 不要再用旧的缓存文件
+                
             self.log(f"尝试下载: {work_name}")
             
-            # 创建请求
-            req = urllib.request.Request(url)
-            req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-            req.add_header('Referer', url)
-            
-            # 下载文件
-            with urllib.request.urlopen(req, timeout=30) as response:
-                # 检查内容类型
-                content_type = response.headers.get('Content-Type', '').lower()
-                if 'text/html' in content_type:
-                    # 这可能是一个网页，不是直接的视频文件
-                    self.log(f"检测到网页内容，建议在浏览器中打开: {work_name}")
-                    return None
+            def report(downloaded, total_size):
+                if progress:
+                    progress(downloaded, total_size)
+                if self.progress_callback and total_size > 0:
+                    self.progress_callback((downloaded / total_size) * 100)
                     
-                total_size = int(response.headers.get('Content-Length', 0))
-                downloaded = 0
-                
-                with open(cache_path, 'wb') as f:
-                    while True:
-                        chunk = response.read(8192)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        if self.progress_callback and total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            self.progress_callback(progress)
-                            
-            # 验证下载的文件
-            if os.path.getsize(cache_path) < 1024:  # 文件太小，可能不是视频
-                os.remove(cache_path)
-                self.log(f"下载的文件太小，可能不是视频文件: {work_name}")
+            # 下载期间钉住，淘汰时不删除同一链接的文件
+            self.store.pin(url)
+            try:
+                cache_path = self._download_to_store(url, work_name, report, refresh=refresh)
+            finally:
+                self.store.unpin(url)
+            if cache_path is None:
                 return None
-                
-            # 记录缓存
-            self.cached_files[url] = cache_path
-            self.save_cache_info()
+            self.evictor.request()
             
             self.log(f"下载完成: {work_name}")
             return cache_path
             
+        except DownloadCancelled:
+            raise  # 取消或暂停，由下载池处理
         except Exception as e:
             self.log(f"下载失败 {work_name}: {e}")
             return None
 
+    def prefetch_video(self, url, work_name, progress):
+        """低优先级预取（单个连接，不更新进度条）；progress抛出异常时中止下载并保留.part文件"""
+        self.store.pin(url)
+        try:
+            cache_path = self._download_to_store(url, work_name, progress, max_segments=1)
+        finally:
+            self.store.unpin(url)
+        if cache_path is not None:
+            self.evictor.request()
+        return cache_path
+        
+    def _download_to_store(self, url, work_name, progress, max_segments=MAX_SEGMENTS,
+                           refresh=False):
+        """下载到内容寻址存储，返回存储路径；不是视频文件时返回None
+
+        同一链接正在下载时等待它结束并使用它的结果。progress(已下载字节数, 总字节数)
+        抛出异常时中止下载（等待期间也定期调用），.part文件保留
+        """
+        def fetch():
+            # 等待期间前一次下载可能已经完成
+            cache_path = None if refresh else self.store.path_of(url)
+            return cache_path or self._fetch_to_store(url, work_name, progress, max_segments)
+
+        return self.flights.do(canonical_url(url), fetch, poll=lambda: progress(0, 0))
+
+    def _fetch_to_store(self, url, work_name, progress, max_segments):
+        """实际下载（_download_to_store中同一链接同时只有一个）"""
+        ext = media_extension(self.get_safe_filename(url, work_name))
+        staging_path = self.store.staging_path(url, ext)
+        
+        def check(response):
+            # 检查内容类型
+            content_type = response.headers.get('Content-Type', '').lower()
+            if 'text/html' in content_type:
+                # 这可能是一个网页，不是直接的视频文件
+                self.log(f"检测到网页内容，建议在浏览器中打开: {work_name}")
+                raise RejectedResponse(content_type)
+
+        # 下载文件（中断后再次下载时从.part文件续传），边下载边计算SHA-256
+        digest = hashlib.sha256()
+        validators = {}
+        try:
+            download_to_file(self.http, url, staging_path, headers={'Referer': url},
+                             progress=progress, check=check, log=self.log, digest=digest,
+                             validators=validators, max_segments=max_segments,
+                             sniff=self.sniffer)
+        except NotMediaError as e:
+            self.log(f"文件开头是{e}内容，不是视频文件，已停止下载: {work_name}")
+            return None
+        except RejectedResponse:
+            return None
+
+        # 验证下载的文件
+        size = os.path.getsize(staging_path)
+        if size < 1024:  # 文件太小，可能不是视频
+            os.remove(staging_path)
+            self.sniffer.add_wasted(size)
+            self.log(f"下载的文件太小，可能不是视频文件: {work_name}")
+            return None
+            
+        return self.store.add(url, staging_path, digest.hexdigest(), work_name,
+                              validators['etag'], validators['last_modified'])
+
 class SystemPlayer:
     """系统播放器集成"""
     
@@ -260,9 +292,32 @@ class AdvancedCSVPlayer:
             pass
             
         # 数据存储
-        self.data = []
         self.columns = []
         self.work_data = {}
+        self.work_ids = []
+        self.work_store = CatalogStore(WORK_FIELDS)   # 作品记录的固定字段，用于保存快照
+        self.tree_item_ids = []
+        
+        # 搜索索引与后台搜索线程（结果经队列交回主线程）
+        self.search_index = NGramIndex()
+        self.search_results = queue.Queue()
+        self.search_worker = SearchWorker(
+            self.search_index,
+            lambda generation, row_ids: self.search_results.put((generation, row_ids)))
+        self.search_worker.start()
+        self.submitted_query = ''
+        self.applied_generation = 0
+        
+        # 工作线程送往界面的日志、进度和状态（主线程按帧合并处理）
+        self.ui_events = UIEventQueue()
+        
+        # 流式导入状态
+        self.import_worker = None
+        self.import_events = None
+        self.import_pending = []
+        self.import_file_name = ''
+        self.import_started = 0
+        self.first_batch_time = None
         
         # 初始化组件
         self.media_manager = MediaManager(
@@ -270,11 +325,38 @@ class AdvancedCSVPlayer:
             log_callback=self.add_log
         )
         self.player = SystemPlayer(log_callback=self.add_log)
+        # 证书无法校验的站点先询问用户，同意后才对该站点不校验证书
+        self.media_manager.http.confirm_insecure = self._confirm_insecure
+        
+        # 下载任务池（播放和下载都经过它，限制总并发数和每个站点的并发数）
+        self.download_pool = DownloadPool(DEFAULT_WORKERS, DEFAULT_PER_HOST,
+                                          on_idle=self._on_downloads_idle)
+        
+        # 预取选中的作品及其后的几个作品（单个连接，下载池忙时只取开头部分）
+        store = self.media_manager.store
+        self.prefetcher = Prefetcher(self.media_manager.prefetch_video,
+                                     lambda url: store.path_of(url) is not None,
+                                     lambda: not self.download_pool.pending(),
+                                     log=self.add_log)
+        self.prefetcher.start()
+        self.prefetch_after = None
+        
+        # 正在播放的作品（其缓存文件被钉住，不会被淘汰）
+        self.playing_work_id = None
+        self.playing_url = None
+        self.cache_policies = {
+            'LRU': LRUPolicy(),
+            'LFU': LFUPolicy(),
+            '即将播放优先保留': UpcomingPolicy(self._upcoming_urls),
+        }
         
         # 创建界面
         self.create_ui()
         self.setup_styles()
         
+        self.root.after(SEARCH_POLL_INTERVAL, self._poll_search_results)
+        self.root.after(FRAME_INTERVAL, self._drain_ui_events)
+        
     def setup_styles(self):
         """设置界面样式"""
         style = ttk.Style()
@@ -339,6 +421,10 @@ class AdvancedCSVPlayer:
         self.file_info_label = ttk.Label(file_frame, text="未导入文件", style='Info.TLabel')
         self.file_info_label.grid(row=1, column=0, sticky=tk.W, pady=2)
         
+        self.cancel_import_btn = ttk.Button(file_frame, text="⏹️ 取消导入", 
+                                            command=self.cancel_import, state=tk.DISABLED)
+        self.cancel_import_btn.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=2)
+        
         # 播放控制
         play_frame = ttk.LabelFrame(control_frame, text="播放控制", padding="8")
         play_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -359,4 +445,966 @@ class AdvancedCSVPlayer:
         mode_frame = ttk.LabelFrame(control_frame, text="播放模式", padding="8")
         mode_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         
-        self.play_mode = tk.StringVar(value="browser")\n        ttk.Radiobutton(mode_frame, text="🌐 浏览器播放 (推荐)", \n                       variable=self.play_mode, value="browser").grid(row=0, column=0, sticky=tk.W)\n        ttk.Radiobutton(mode_frame, text="💾 下载后播放", \n                       variable=self.play_mode, value="download").grid(row=1, column=0, sticky=tk.W)\n        \n        # 进度显示\n        progress_frame = ttk.LabelFrame(control_frame, text="进度信息", padding="8")\n        progress_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))\n        progress_frame.columnconfigure(0, weight=1)\n        \n        self.progress_var = tk.DoubleVar()\n        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)\n        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=2)\n        \n        self.status_label = ttk.Label(progress_frame, text="就绪", style='Info.TLabel')\n        self.status_label.grid(row=1, column=0, sticky=tk.W)\n        \n        # 工具按钮\n        tools_frame = ttk.LabelFrame(control_frame, text="工具", padding="8")\n        tools_frame.grid(row=4, column=0, sticky=(tk.W, tk.E))\n        tools_frame.columnconfigure(0, weight=1)\n        \n        ttk.Button(tools_frame, text="📂 打开缓存目录", \n                  command=self.open_cache_dir).grid(row=0, column=0, sticky=(tk.W, tk.E), pady=1)\n        ttk.Button(tools_frame, text="🗑️ 清理缓存", \n                  command=self.clear_cache).grid(row=1, column=0, sticky=(tk.W, tk.E), pady=1)\n        ttk.Button(tools_frame, text="ℹ️ 关于程序", \n                  command=self.show_about).grid(row=2, column=0, sticky=(tk.W, tk.E), pady=1)\n        \n    def create_work_list(self, parent):\n        """创建中间作品列表"""\n        list_frame = ttk.LabelFrame(parent, text="作品列表", padding="10")\n        list_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)\n        list_frame.columnconfigure(0, weight=1)\n        list_frame.rowconfigure(0, weight=1)\n        \n        # 创建Treeview\n        columns = ('作品名称', '参赛者', '组别', '指导老师', '推送单位', '状态')\n        self.tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=20)\n        \n        # 设置列\n        column_widths = {'作品名称': 200, '参赛者': 100, '组别': 80, \n                        '指导老师': 100, '推送单位': 150, '状态': 80}\n        \n        for col in columns:\n            self.tree.heading(col, text=col, command=lambda c=col: self.sort_column(c))\n            self.tree.column(col, width=column_widths.get(col, 100))\n        \n        # 滚动条\n        v_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)\n        h_scrollbar = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.tree.xview)\n        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)\n        \n        # 布局\n        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))\n        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))\n        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))\n        \n        # 事件绑定\n        self.tree.bind('<Double-1>', self.play_selected)\n        self.tree.bind('<Button-3>', self.show_context_menu)\n        self.tree.bind('<<TreeviewSelect>>', self.on_selection_change)\n        \n        # 创建右键菜单\n        self.create_context_menu()\n        \n    def create_context_menu(self):\n        """创建右键菜单"""\n        self.context_menu = tk.Menu(self.root, tearoff=0)\n        self.context_menu.add_command(label="▶️ 播放", command=self.play_selected)\n        self.context_menu.add_command(label="🌐 在浏览器中打开", command=self.open_in_browser)\n        self.context_menu.add_separator()\n        self.context_menu.add_command(label="💾 下载到本地", command=self.download_selected)\n        self.context_menu.add_command(label="📂 打开文件位置", command=self.open_file_location)\n        \n    def create_info_panel(self, parent):\n        """创建右侧信息面板"""\n        info_frame = ttk.LabelFrame(parent, text="详细信息", padding="10")\n        info_frame.grid(row=1, column=2, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(10, 0))\n        info_frame.columnconfigure(0, weight=1)\n        info_frame.rowconfigure(1, weight=1)\n        \n        # 作品信息显示\n        self.info_text = scrolledtext.ScrolledText(info_frame, width=35, height=15, \n                                                  wrap=tk.WORD, state=tk.DISABLED)\n        self.info_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))\n        \n        # 日志显示\n        log_label = ttk.Label(info_frame, text="操作日志", style='Heading.TLabel')\n        log_label.grid(row=1, column=0, sticky=tk.W, pady=(10, 5))\n        \n        self.log_text = scrolledtext.ScrolledText(info_frame, width=35, height=15, \n                                                 wrap=tk.WORD, state=tk.DISABLED)\n        self.log_text.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))\n        \n    def create_status_bar(self, parent):\n        """创建底部状态栏"""\n        status_frame = ttk.Frame(parent)\n        status_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))\n        status_frame.columnconfigure(1, weight=1)\n        \n        self.status_left = ttk.Label(status_frame, text="就绪")\n        self.status_left.grid(row=0, column=0, sticky=tk.W)\n        \n        self.status_right = ttk.Label(status_frame, text="CSV作品播放器 v2.0", style='Info.TLabel')\n        self.status_right.grid(row=0, column=2, sticky=tk.E)\n        \n    def import_csv(self):\n        """导入CSV文件"""\n        file_path = filedialog.askopenfilename(\n            title=\"选择CSV文件\",\n            filetypes=[(\"CSV files\", \"*.csv\"), (\"All files\", \"*.*\")]\n        )\n        \n        if not file_path:\n            return\n            \n        try:\n            self.add_log(f\"正在读取文件: {os.path.basename(file_path)}\")\n            \n            # 读取CSV文件\n            self.data, self.columns, encoding = CSVReader.read_csv(file_path)\n            \n            self.add_log(f\"文件编码: {encoding}\")\n            \n            # 检查必要的列\n            required_columns = ['作品名称']\n            missing_columns = [col for col in required_columns if col not in self.columns]\n            \n            if missing_columns:\n                messagebox.showerror(\"错误\", f\"文件缺少必要的列: {', '.join(missing_columns)}\")\n                return\n                \n            # 查找链接列\n            link_columns = []\n            for col in self.columns:\n                if any(keyword in col.lower() for keyword in ['链接', 'url', 'link', '地址', 'http']):\n                    link_columns.append(col)\n                    \n            if not link_columns:\n                messagebox.showwarning(\"警告\", \"未找到链接列，播放功能可能无法正常使用\")\n                \n            # 处理数据\n            self.process_data()\n            \n            # 更新界面\n            self.populate_tree()\n            \n            # 更新状态\n            self.file_info_label.config(text=f\"已导入: {os.path.basename(file_path)} ({len(self.data)} 条记录)\")\n            self.status_left.config(text=f\"已加载 {len(self.data)} 条作品记录\")\n            \n            self.add_log(f\"成功导入 {len(self.data)} 条记录\")\n            \n        except Exception as e:\n            error_msg = f\"导入失败: {e}\"\n            self.add_log(error_msg)\n            messagebox.showerror(\"错误\", error_msg)\n            \n    def process_data(self):\n        """处理导入的数据"""\n        self.work_data = {}\n        \n        for i, row in enumerate(self.data):\n            work_name = str(row.get('作品名称', f'作品_{i+1}')).strip()\n            if not work_name or work_name == 'nan':\n                work_name = f'作品_{i+1}'\n                \n            # 查找视频链接\n            video_url = \"\"\n            for col in self.columns:\n                if any(keyword in col.lower() for keyword in ['链接', 'url', 'link', '地址']):\n                    url_value = str(row.get(col, '')).strip()\n                    if url_value and url_value != 'nan' and url_value.startswith('http'):\n                        video_url = url_value\n                        break\n                        \n            # 存储作品数据\n            work_id = f\"work_{i}\"\n            self.work_data[work_id] = {\n                'id': work_id,\n                'name': work_name,\n                'participant': str(row.get('身份证名字', row.get('参赛者', row.get('姓名', '')))).strip(),\n                'category': str(row.get('参赛者组别', row.get('组别', ''))).strip(),\n                'teacher': str(row.get('指导老师', '')).strip(),\n                'organization': str(row.get('推送单位学校', row.get('推送单位', ''))).strip(),\n                'url': video_url,\n                'status': '有链接' if video_url else '无链接',\n                'cached_file': None\n            }\n            \n    def populate_tree(self):\n        """填充作品列表"""\n        # 清空现有数据\n        for item in self.tree.get_children():\n            self.tree.delete(item)\n            \n        # 添加数据\n        for work_id, work in self.work_data.items():\n            self.tree.insert('', tk.END, iid=work_id, values=(\n                work['name'],\n                work['participant'],\n                work['category'],\n                work['teacher'],\n                work['organization'],\n                work['status']\n            ))\n            \n    def filter_works(self, event=None):\n        """过滤作品列表"""\n        search_text = self.search_var.get().lower()\n        \n        # 清空现有显示\n        for item in self.tree.get_children():\n            self.tree.delete(item)\n            \n        # 重新添加匹配的项目\n        for work_id, work in self.work_data.items():\n            if (not search_text or \n                search_text in work['name'].lower() or \n                search_text in work['participant'].lower() or\n                search_text in work['organization'].lower()):\n                \n                self.tree.insert('', tk.END, iid=work_id, values=(\n                    work['name'],\n                    work['participant'],\n                    work['category'],\n                    work['teacher'],\n                    work['organization'],\n                    work['status']\n                ))\n                \n    def play_first_match(self, event=None):\n        """播放第一个匹配的作品"""\n        children = self.tree.get_children()\n        if children:\n            self.tree.selection_set(children[0])\n            self.play_selected()\n        else:\n            messagebox.showinfo(\"提示\", \"没有找到匹配的作品\")\n            \n    def play_selected(self, event=None):\n        """播放选中的作品"""\n        selection = self.tree.selection()\n        if not selection:\n            messagebox.showinfo(\"提示\", \"请先选择一个作品\")\n            return\n            \n        work_id = selection[0]\n        work = self.work_data.get(work_id)\n        \n        if not work or not work['url']:\n            messagebox.showinfo(\"提示\", \"该作品没有视频链接\")\n            return\n            \n        self.add_log(f\"准备播放: {work['name']}\")\n        \n        # 根据播放模式处理\n        if self.play_mode.get() == \"browser\" or self.media_manager.is_video_platform_url(work['url']):\n            # 浏览器播放\n            self.player.open_url_in_browser(work['url'])\n        else:\n            # 下载后播放\n            threading.Thread(target=self._download_and_play, args=(work,), daemon=True).start()\n            \n    def _download_and_play(self, work):\n        """下载并播放（在后台线程中执行）"""\n        try:\n            self.update_status(f\"正在下载: {work['name']}\")\n            \n            cached_file = self.media_manager.try_download_video(work['url'], work['name'])\n            \n            if cached_file:\n                work['cached_file'] = cached_file\n                work['status'] = '已缓存'\n                \n                # 更新界面\n                self.root.after(0, lambda: self.update_work_status(work['id'], '已缓存'))\n                \n                # 播放文件\n                self.root.after(0, lambda: self.player.play_file(cached_file))\n                self.root.after(0, lambda: self.update_status(\"播放中\"))\n            else:\n                # 下载失败，尝试浏览器播放\n                self.root.after(0, lambda: messagebox.showinfo(\n                    \"提示\", f\"无法下载视频文件，将在浏览器中打开\\n\\n作品: {work['name']}\"))\n                self.root.after(0, lambda: self.player.open_url_in_browser(work['url']))\n                \n        except Exception as e:\n            self.add_log(f\"播放失败: {e}\")\n            self.root.after(0, lambda: self.update_status(\"播放失败\"))\n            \n    def open_in_browser(self):\n        """在浏览器中打开选中的作品"""\n        selection = self.tree.selection()\n        if not selection:\n            return\n            \n        work_id = selection[0]\n        work = self.work_data.get(work_id)\n        \n        if work and work['url']:\n            self.player.open_url_in_browser(work['url'])\n        else:\n            messagebox.showinfo(\"提示\", \"该作品没有视频链接\")\n            \n    def download_selected(self):\n        """下载选中的作品"""\n        selection = self.tree.selection()\n        if not selection:\n            return\n            \n        work_id = selection[0]\n        work = self.work_data.get(work_id)\n        \n        if not work or not work['url']:\n            messagebox.showinfo(\"提示\", \"该作品没有视频链接\")\n            return\n            \n        threading.Thread(target=self._download_work, args=(work,), daemon=True).start()\n        \n    def _download_work(self, work):\n        """下载作品（后台线程）"""\n        try:\n            self.update_status(f\"正在下载: {work['name']}\")\n            \n            cached_file = self.media_manager.try_download_video(work['url'], work['name'])\n            \n            if cached_file:\n                work['cached_file'] = cached_file\n                work['status'] = '已缓存'\n                self.root.after(0, lambda: self.update_work_status(work['id'], '已缓存'))\n                self.add_log(f\"下载完成: {work['name']}\")\n            else:\n                self.add_log(f\"下载失败: {work['name']}\")\n                \n            self.root.after(0, lambda: self.update_status(\"就绪\"))\n            \n        except Exception as e:\n            self.add_log(f\"下载出错: {e}\")\n            \n    def open_file_location(self):\n        \"\"\"打开文件位置\"\"\"\n        selection = self.tree.selection()\n        if not selection:\n            return\n            \n        work_id = selection[0]\n        work = self.work_data.get(work_id)\n        \n        if work and work.get('cached_file') and os.path.exists(work['cached_file']):\n            file_path = work['cached_file']\n            if sys.platform.startswith('win'):\n                subprocess.run(['explorer', '/select,', file_path])\n            elif sys.platform.startswith('darwin'):\n                subprocess.run(['open', '-R', file_path])\n            else:\n                subprocess.run(['xdg-open', os.path.dirname(file_path)])\n        else:\n            messagebox.showinfo(\"提示\", \"文件未下载或不存在\")\n            \n    def update_work_status(self, work_id, status):\n        \"\"\"更新作品状态\"\"\"\n        if work_id in self.work_data:\n            self.work_data[work_id]['status'] = status\n            \n            # 更新树视图中的状态\n            try:\n                item = self.tree.item(work_id)\n                values = list(item['values'])\n                values[5] = status  # 状态列\n                self.tree.item(work_id, values=values)\n            except:\n                pass\n                \n    def show_context_menu(self, event):\n        \"\"\"显示右键菜单\"\"\"\n        try:\n            self.context_menu.tk_popup(event.x_root, event.y_root)\n        finally:\n            self.context_menu.grab_release()\n            \n    def on_selection_change(self, event=None):\n        \"\"\"选择改变时更新信息显示\"\"\"\n        selection = self.tree.selection()\n        if not selection:\n            return\n            \n        work_id = selection[0]\n        work = self.work_data.get(work_id)\n        \n        if work:\n            info_text = f\"\"\"作品信息\n{'='*30}\n\n作品名称: {work['name']}\n参赛者: {work['participant']}\n组别: {work['category']}\n指导老师: {work['teacher']}\n推送单位: {work['organization']}\n\n视频链接: {work['url'][:50] + '...' if len(work['url']) > 50 else work['url']}\n状态: {work['status']}\n\n{'='*30}\n双击播放 | 右键更多选项\"\"\"\n            \n            self.info_text.config(state=tk.NORMAL)\n            self.info_text.delete(1.0, tk.END)\n            self.info_text.insert(1.0, info_text)\n            self.info_text.config(state=tk.DISABLED)\n            \n    def sort_column(self, col):\n        \"\"\"排序列\"\"\"\n        # 简单的排序实现\n        items = [(self.tree.set(child, col), child) for child in self.tree.get_children('')]\n        items.sort()\n        \n        for index, (val, child) in enumerate(items):\n            self.tree.move(child, '', index)\n            \n    def open_cache_dir(self):\n        \"\"\"打开缓存目录\"\"\"\n        cache_dir = os.path.abspath(self.media_manager.cache_dir)\n        if not os.path.exists(cache_dir):\n            os.makedirs(cache_dir)\n            \n        if sys.platform.startswith('win'):\n            os.startfile(cache_dir)\n        elif sys.platform.startswith('darwin'):\n            subprocess.run(['open', cache_dir])\n        else:\n            subprocess.run(['xdg-open', cache_dir])\n            \n    def clear_cache(self):\n        \"\"\"清理缓存\"\"\"\n        result = messagebox.askyesno(\"确认\", \"确定要清理所有缓存文件吗？\")\n        if result:\n            try:\n                cache_dir = self.media_manager.cache_dir\n                if os.path.exists(cache_dir):\n                    shutil.rmtree(cache_dir)\n                    os.makedirs(cache_dir)\n                    \n                self.media_manager.cached_files = {}\n                self.media_manager.save_cache_info()\n                \n                # 更新作品状态\n                for work in self.work_data.values():\n                    if work['status'] == '已缓存':\n                        work['status'] = '有链接'\n                        work['cached_file'] = None\n                        \n                self.populate_tree()\n                self.add_log(\"缓存已清理\")\n                messagebox.showinfo(\"完成\", \"缓存清理完成\")\n                \n            except Exception as e:\n                error_msg = f\"清理缓存失败: {e}\"\n                self.add_log(error_msg)\n                messagebox.showerror(\"错误\", error_msg)\n                \n    def show_about(self):\n        \"\"\"显示关于信息\"\"\"\n        about_text = \"\"\"CSV作品播放器 v2.0 (高级版)\n\n功能特点:\n• 智能CSV文件读取（支持多种编码）\n• 在线视频播放（浏览器模式）\n• 本地缓存下载播放\n• 系统播放器集成\n• 无需外部依赖\n\n使用说明:\n1. 点击"导入CSV文件"选择数据文件\n2. 在作品列表中选择要播放的作品\n3. 双击播放或使用右键菜单\n4. 支持搜索过滤功能\n\n技术特点:\n• 纯Python标准库实现\n• 跨平台兼容（Windows/Mac/Linux）\n• 智能播放模式选择\n• 完善的错误处理\n\n作者: CodeBuddy\n版本: 2.0\"\"\"\n        \n        messagebox.showinfo(\"关于\", about_text)\n        \n    def add_log(self, message):\n        \"\"\"添加日志\"\"\"\n        timestamp = time.strftime('%H:%M:%S')\n        log_message = f\"[{timestamp}] {message}\\n\"\n        \n        self.root.after(0, lambda: self._update_log_display(log_message))\n        \n    def _update_log_display(self, message):\n        \"\"\"更新日志显示（主线程）\"\"\"\n        self.log_text.config(state=tk.NORMAL)\n        self.log_text.insert(tk.END, message)\n        self.log_text.see(tk.END)\n        self.log_text.config(state=tk.DISABLED)\n        \n        # 限制日志长度\n        lines = self.log_text.get(1.0, tk.END).split('\\n')\n        if len(lines) > 1000:\n            self.log_text.config(state=tk.NORMAL)\n            self.log_text.delete(1.0, f\"{len(lines)-500}.0\")\n            self.log_text.config(state=tk.DISABLED)\n            \n    def update_progress(self, value):\n        \"\"\"更新进度条\"\"\"\n        self.root.after(0, lambda: self.progress_var.set(value))\n        \n    def update_status(self, message):\n        \"\"\"更新状态\"\"\"\n        self.root.after(0, lambda: self.status_label.config(text=message))\n        \n    def run(self):\n        \"\"\"运行应用程序\"\"\"\n        self.add_log(\"CSV作品播放器 v2.0 启动成功\")\n        self.add_log(\"提示: 高级版支持智能播放和本地缓存\")\n        self.add_log(\"建议: 视频平台链接使用浏览器播放模式\")\n        \n        # 设置窗口关闭事件\n        self.root.protocol(\"WM_DELETE_WINDOW\", self.on_closing)\n        \n        self.root.mainloop()\n        \n    def on_closing(self):\n        \"\"\"程序关闭时的清理工作\"\"\"\n        self.add_log(\"程序正在关闭...\")\n        self.root.destroy()\n\ndef main():\n    \"\"\"主函数\"\"\"\n    try:\n        app = AdvancedCSVPlayer()\n        app.run()\n    except Exception as e:\n        print(f\"程序启动失败: {e}\")\n        messagebox.showerror(\"错误\", f\"程序启动失败:\\n{e}\")\n\nif __name__ == \"__main__\":\n    main()
\ No newline at end of file
+        self.play_mode = tk.StringVar(value="browser")
+        ttk.Radiobutton(mode_frame, text="🌐 浏览器播放 (推荐)", 
+                       variable=self.play_mode, value="browser").grid(row=0, column=0, sticky=tk.W)
+        ttk.Radiobutton(mode_frame, text="💾 下载后播放", 
+                       variable=self.play_mode, value="download").grid(row=1, column=0, sticky=tk.W)
+        
+        # 进度显示
+        progress_frame = ttk.LabelFrame(control_frame, text="进度信息", padding="8")
+        progress_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        progress_frame.columnconfigure(0, weight=1)
+        
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)
+        self.progress_bar.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=2)
+        
+        self.status_label = ttk.Label(progress_frame, text="就绪", style='Info.TLabel')
+        self.status_label.grid(row=1, column=0, sticky=tk.W)
+        
+        # 工具按钮
+        tools_frame = ttk.LabelFrame(control_frame, text="工具", padding="8")
+        tools_frame.grid(row=4, column=0, sticky=(tk.W, tk.E))
+        tools_frame.columnconfigure(0, weight=1)
+        
+        ttk.Button(tools_frame, text="📂 打开缓存目录", 
+                  command=self.open_cache_dir).grid(row=0, column=0, sticky=(tk.W, tk.E), pady=1)
+        ttk.Button(tools_frame, text="🗑️ 清理缓存", 
+                  command=self.clear_cache).grid(row=1, column=0, sticky=(tk.W, tk.E), pady=1)
+        ttk.Button(tools_frame, text="🔄 检查缓存更新", 
+                  command=self.start_revalidation).grid(row=2, column=0, sticky=(tk.W, tk.E), pady=1)
+        ttk.Button(tools_frame, text="ℹ️ 关于程序", 
+                  command=self.show_about).grid(row=3, column=0, sticky=(tk.W, tk.E), pady=1)
+        
+        # 缓存设置：容量上限和淘汰策略
+        cache_frame = ttk.LabelFrame(control_frame, text="缓存设置", padding="8")
+        cache_frame.grid(row=5, column=0, sticky=(tk.W, tk.E), pady=(10, 0))
+        cache_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(cache_frame, text="上限(GB):").grid(row=0, column=0, sticky=tk.W)
+        self.cache_budget_var = tk.IntVar(value=CACHE_BUDGET_GB)
+        ttk.Spinbox(cache_frame, from_=1, to=1000, width=6, textvariable=self.cache_budget_var,
+                    command=self.update_cache_settings).grid(row=0, column=1, sticky=tk.W, pady=1)
+        
+        ttk.Label(cache_frame, text="淘汰策略:").grid(row=1, column=0, sticky=tk.W)
+        self.cache_policy_var = tk.StringVar(value='LRU')
+        policy_box = ttk.Combobox(cache_frame, textvariable=self.cache_policy_var, state='readonly',
+                                  values=list(self.cache_policies), width=14)
+        policy_box.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=1)
+        policy_box.bind('<<ComboboxSelected>>', self.update_cache_settings)
+        
+        self.prefetch_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(cache_frame, text="预取后续作品", variable=self.prefetch_var,
+                        command=self.schedule_prefetch).grid(row=2, column=0, columnspan=2,
+                                                             sticky=tk.W, pady=1)
+        self.revalidate_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(cache_frame, text="使用缓存前检查更新", variable=self.revalidate_var,
+                        command=self.update_revalidate_mode).grid(row=3, column=0, columnspan=2,
+                                                                  sticky=tk.W, pady=1)
+        
+        self.cache_stats_label = ttk.Label(cache_frame, text="", style='Info.TLabel',
+                                           wraplength=220)
+        self.cache_stats_label.grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=(4, 0))
+        
+    def create_work_list(self, parent):
+        """创建中间作品列表"""
+        list_frame = ttk.LabelFrame(parent, text="作品列表", padding="10")
+        list_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+        list_frame.columnconfigure(0, weight=1)
+        list_frame.rowconfigure(0, weight=1)
+        
+        # 创建Treeview
+        columns = ('作品名称', '参赛者', '组别', '指导老师', '推送单位', '状态')
+        self.tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=20)
+        
+        # 设置列
+        column_widths = {'作品名称': 200, '参赛者': 100, '组别': 80, 
+                        '指导老师': 100, '推送单位': 150, '状态': 80}
+        
+        for col in columns:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_column(c))
+            self.tree.column(col, width=column_widths.get(col, 100))
+        
+        # 滚动条
+        v_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        h_scrollbar = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(yscrollcommand=lambda first, last: self._on_tree_scroll(
+            v_scrollbar, first, last), xscrollcommand=h_scrollbar.set)
+        
+        # 布局
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        
+        # 事件绑定
+        self.tree.bind('<Double-1>', self.play_selected)
+        self.tree.bind('<Button-3>', self.show_context_menu)
+        self.tree.bind('<<TreeviewSelect>>', self.on_selection_change)
+        
+        # 创建右键菜单
+        self.create_context_menu()
+        
+    def _on_tree_scroll(self, scrollbar, first, last):
+        """列表滚动：更新滚动条，并按新的可见范围调整预取"""
+        scrollbar.set(first, last)
+        self.schedule_prefetch()
+        
+    def create_context_menu(self):
+        """创建右键菜单"""
+        self.context_menu = tk.Menu(self.root, tearoff=0)
+        self.context_menu.add_command(label="▶️ 播放", command=self.play_selected)
+        self.context_menu.add_command(label="🌐 在浏览器中打开", command=self.open_in_browser)
+        self.context_menu.add_separator()
+        self.context_menu.add_command(label="💾 下载到本地", command=self.download_selected)
+        self.context_menu.add_command(label="📂 打开文件位置", command=self.open_file_location)
+        
+    def create_info_panel(self, parent):
+        """创建右侧信息面板"""
+        info_frame = ttk.LabelFrame(parent, text="详细信息", padding="10")
+        info_frame.grid(row=1, column=2, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(10, 0))
+        info_frame.columnconfigure(0, weight=1)
+        info_frame.rowconfigure(1, weight=1)
+        
+        # 作品信息显示
+        self.info_text = scrolledtext.ScrolledText(info_frame, width=35, height=15, 
+                                                  wrap=tk.WORD, state=tk.DISABLED)
+        self.info_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        
+        # 日志显示
+        log_label = ttk.Label(info_frame, text="操作日志", style='Heading.TLabel')
+        log_label.grid(row=1, column=0, sticky=tk.W, pady=(10, 5))
+        
+        self.log_text = scrolledtext.ScrolledText(info_frame, width=35, height=15, 
+                                                 wrap=tk.WORD, state=tk.DISABLED)
+        self.log_text.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+    def create_status_bar(self, parent):
+        """创建底部状态栏"""
+        status_frame = ttk.Frame(parent)
+        status_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        status_frame.columnconfigure(1, weight=1)
+        
+        self.status_left = ttk.Label(status_frame, text="就绪")
+        self.status_left.grid(row=0, column=0, sticky=tk.W)
+        
+        self.status_right = ttk.Label(status_frame, text="CSV作品播放器 v2.0", style='Info.TLabel')
+        self.status_right.grid(row=0, column=2, sticky=tk.E)
+        
+    def import_csv(self):
+        """导入CSV文件（后台线程流式读取，分批显示）"""
+        file_path = filedialog.askopenfilename(
+            title="选择CSV文件",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        
+        if not file_path:
+            return
+            
+        self.cancel_import()
+        self.add_log(f"正在读取文件: {os.path.basename(file_path)}")
+        self.import_started = time.perf_counter()
+        
+        # 清空旧数据
+        self.columns = []
+        self.work_data = {}
+        self.work_ids = []
+        self.work_store = CatalogStore(WORK_FIELDS)
+        self.search_index.build([], [])
+        self.populate_tree()
+        
+        self.import_file_name = os.path.basename(file_path)
+        self.import_file_path = file_path
+        
+        # 文件未变化时直接映射上次保存的目录快照
+        snapshot = load_snapshot(file_path, SNAPSHOT_PROFILE, WORK_FIELDS, SEARCH_FIELDS)
+        if snapshot is not None:
+            self._show_snapshot(snapshot)
+            return
+            
+        try:
+            self.import_fingerprint = file_fingerprint(file_path)
+        except OSError as e:
+            messagebox.showerror("错误", f"导入失败: {e}")
+            return
+        self.first_batch_time = None
+        self.import_pending = []
+        self.import_events = queue.Queue()
+        self.import_worker = CSVImportWorker(
+            lambda: CSVStream(file_path), self.import_events,
+            transform=self.make_work, index_fields=SEARCH_FIELDS)
+        self.import_worker.start()
+        
+        self.cancel_import_btn.config(state=tk.NORMAL)
+        self.file_info_label.config(text=f"正在导入: {self.import_file_name}")
+        self.root.after(IMPORT_POLL_INTERVAL, self._poll_import_events)
+        
+    def cancel_import(self):
+        """取消正在进行的导入"""
+        if self.import_worker is not None:
+            self.import_worker.cancel()
+            
+    def _poll_import_events(self):
+        """处理导入线程送来的数据（每次只插入有限的行数）"""
+        events = self.import_events
+        if self.import_worker is None or events is not self.import_worker.events:
+            return  # 导入已结束或已被新的导入取代
+            
+        while len(self.import_pending) < IMPORT_ROWS_PER_TICK:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+                
+            if isinstance(event, Exception):
+                self._finish_import()
+                error_msg = f"导入失败: {event}"
+                self.add_log(error_msg)
+                messagebox.showerror("错误", error_msg)
+                return
+                
+            if not self.columns and not self._check_columns(event.columns):
+                return
+                
+            self.import_pending.extend(event.items)
+            self.update_progress(event.progress)
+            if event.done:
+                self.import_pending.append(event)
+                break
+                
+        # 插入一部分新行，剩余的留到下次
+        chunk = self.import_pending[:IMPORT_ROWS_PER_TICK]
+        del self.import_pending[:IMPORT_ROWS_PER_TICK]
+        for work in chunk:
+            if isinstance(work, dict):
+                self._append_work(work)
+            else:
+                self._on_import_done(work)
+                return
+                
+        if self.first_batch_time is None and self.work_data:
+            self.first_batch_time = time.perf_counter() - self.import_started
+        if self.work_data:
+            self.status_left.config(text=f"正在导入... 已加载 {len(self.work_data)} 条作品记录")
+            
+        self.root.after(IMPORT_POLL_INTERVAL, self._poll_import_events)
+        
+    def _check_columns(self, columns):
+        """收到第一批数据时检查列"""
+        self.columns = columns or []
+        
+        # 检查必要的列
+        required_columns = ['作品名称']
+        missing_columns = [col for col in required_columns if col not in self.columns]
+        
+        if missing_columns:
+            self.import_worker.cancel()
+            self._finish_import()
+            messagebox.showerror("错误", f"文件缺少必要的列: {', '.join(missing_columns)}")
+            return False
+            
+        # 查找链接列
+        link_columns = []
+        for col in self.columns:
+            if any(keyword in col.lower() for keyword in ['链接', 'url', 'link', '地址', 'http']):
+                link_columns.append(col)
+                
+        if not link_columns:
+            messagebox.showwarning("警告", "未找到链接列，播放功能可能无法正常使用")
+            
+        return True
+        
+    def _append_work(self, work):
+        """追加一条导入的作品记录到列表"""
+        self.work_store.append(work)
+        self._add_work(work)
+        
+    def _add_work(self, work):
+        """登记作品记录并插入列表"""
+        work_id = work['id']
+        self.work_data[work_id] = work
+        self.work_ids.append(work_id)
+        self.tree_item_ids.append(work_id)
+        self.tree.insert('', tk.END, iid=work_id, values=(
+            work['name'],
+            work['participant'],
+            work['category'],
+            work['teacher'],
+            work['organization'],
+            work['status']
+        ))
+        
+    def _finish_import(self):
+        """导入结束（完成、取消或失败）"""
+        self.import_worker = None
+        self.import_pending = []
+        self.cancel_import_btn.config(state=tk.DISABLED)
+        
+    def _on_import_done(self, batch):
+        """全部数据已插入"""
+        self._finish_import()
+        elapsed = time.perf_counter() - self.import_started
+        count = len(self.work_data)
+        
+        # 后台建好的索引交给搜索线程使用，并应用当前的搜索词（取消时是已加载部分的索引）
+        self.search_index.adopt(batch.index)
+        if self.search_var.get():
+            self.apply_filter_now()
+            
+        if batch.cancelled:
+            self.file_info_label.config(text=f"已导入(部分): {self.import_file_name} ({count} 条记录)")
+            self.status_left.config(text=f"导入已取消，已加载 {count} 条作品记录")
+            self.add_log(f"导入已取消，已加载 {count} 条记录")
+            return
+            
+        # 更新状态
+        self.update_progress(100)
+        self.file_info_label.config(text=f"已导入: {self.import_file_name} ({count} 条记录)")
+        self.status_left.config(text=f"已加载 {count} 条作品记录")
+        
+        first_ms = (self.first_batch_time or elapsed) * 1000
+        csv_format = batch.csv_format
+        self.add_log(f"文件编码: {csv_format.encoding}，分隔符: {csv_format.delimiter!r}"
+                     f"（检测耗时 {csv_format.detect_time * 1000:.1f} ms）")
+        self.add_log(f"成功导入 {count} 条记录（首屏 {first_ms:.0f} ms，总耗时 {elapsed:.1f} s）")
+        
+        # 保存快照，下次导入同一文件时直接载入
+        save_snapshot_in_background(
+            self.import_file_path, SNAPSHOT_PROFILE, self.work_store, batch.index,
+            SEARCH_FIELDS, batch.columns, batch.row_count, batch.csv_format,
+            fingerprint=self.import_fingerprint, log=self.add_log)
+        
+    def _show_snapshot(self, snapshot):
+        """显示从快照载入的作品（分批插入列表）"""
+        self._finish_import()  # 之前未完成的导入送来的数据不再处理
+        self.columns = snapshot.columns
+        self.work_store = snapshot.store
+        self.search_index.adopt(snapshot.index)
+        self._insert_snapshot_works(snapshot.store, 0)
+        
+    def _insert_snapshot_works(self, store, start):
+        """分批把快照中的作品插入列表"""
+        if store is not self.work_store:
+            return  # 已导入了其他文件
+            
+        end = min(start + IMPORT_ROWS_PER_TICK, len(store))
+        for row_id in range(start, end):
+            work = store[row_id].to_dict()
+            work['status'] = '有链接' if work['url'] else '无链接'
+            work['cached_file'] = None
+            self._add_work(work)
+            
+        if end < len(store):
+            self.status_left.config(text=f"正在显示... 已加载 {end} 条作品记录")
+            self.root.after(1, lambda: self._insert_snapshot_works(store, end))
+            return
+            
+        if self.search_var.get():
+            self.apply_filter_now()
+        elapsed = time.perf_counter() - self.import_started
+        count = len(self.work_data)
+        self.update_progress(100)
+        self.file_info_label.config(text=f"已导入: {self.import_file_name} ({count} 条记录)")
+        self.status_left.config(text=f"已加载 {count} 条作品记录")
+        self.add_log(f"成功导入 {count} 条记录（来自缓存快照，耗时 {elapsed:.1f} s）")
+        
+    @staticmethod
+    def make_work(i, row, columns):
+        """把CSV行转换为作品记录（在导入线程中执行）"""
+        work_name = str(row.get('作品名称', f'作品_{i+1}')).strip()
+        if not work_name or work_name == 'nan':
+            work_name = f'作品_{i+1}'
+            
+        # 查找视频链接
+        video_url = ""
+        for col in columns:
+            if any(keyword in col.lower() for keyword in ['链接', 'url', 'link', '地址']):
+                url_value = str(row.get(col, '')).strip()
+                if url_value and url_value != 'nan' and url_value.startswith('http'):
+                    video_url = url_value
+                    break
+                    
+        # 作品数据
+        work_id = f"work_{i}"
+        return {
+            'id': work_id,
+            'name': work_name,
+            'participant': str(row.get('身份证名字', row.get('参赛者', row.get('姓名', '')))).strip(),
+            'category': str(row.get('参赛者组别', row.get('组别', ''))).strip(),
+            'teacher': str(row.get('指导老师', '')).strip(),
+            'organization': str(row.get('推送单位学校', row.get('推送单位', ''))).strip(),
+            'url': video_url,
+            'status': '有链接' if video_url else '无链接',
+            'cached_file': None
+        }
+        
+    def populate_tree(self):
+        """填充作品列表"""
+        # 清空现有数据（包括被搜索隐藏的项目）
+        stale_items = [iid for iid in self.tree_item_ids if self.tree.exists(iid)]
+        if stale_items:
+            self.tree.delete(*stale_items)
+        self.tree_item_ids = list(self.work_data)
+            
+        # 添加数据
+        for work_id, work in self.work_data.items():
+            self.tree.insert('', tk.END, iid=work_id, values=(
+                work['name'],
+                work['participant'],
+                work['category'],
+                work['teacher'],
+                work['organization'],
+                work['status']
+            ))
+            
+        # 保持当前的搜索过滤，并丢弃基于旧数据的后台查询
+        if self.search_var.get():
+            self.apply_filter_now()
+        else:
+            self.search_worker.cancel()
+            self.applied_generation = self.search_worker.generation
+            
+    def filter_works(self, event=None):
+        """过滤作品列表（提交给后台搜索线程，不阻塞界面）"""
+        if self.import_worker is not None:
+            return  # 导入完成后会按当前搜索词重新过滤
+        search_text = self.search_var.get()
+        if search_text == self.submitted_query:
+            return
+        self.submitted_query = search_text
+        self.search_worker.submit(search_text)
+        
+    def apply_filter_now(self):
+        """在主线程中立即按当前搜索词过滤"""
+        self.search_worker.cancel()
+        self.submitted_query = self.search_var.get()
+        row_ids = self.search_index.search(self.submitted_query)
+        self._show_filter_result(row_ids)
+        self.applied_generation = self.search_worker.generation
+        
+    def _poll_search_results(self):
+        """取出后台搜索结果，只发布最新的一次"""
+        latest = None
+        try:
+            while True:
+                latest = self.search_results.get_nowait()
+        except queue.Empty:
+            pass
+            
+        if latest is not None:
+            generation, row_ids = latest
+            if generation == self.search_worker.generation:
+                self._show_filter_result(row_ids)
+                self.applied_generation = generation
+                
+        self.root.after(SEARCH_POLL_INTERVAL, self._poll_search_results)
+        
+    def _show_filter_result(self, row_ids):
+        """按匹配行号显示作品（隐藏项目只是脱离列表，不重新创建）"""
+        if row_ids is None:
+            visible = self.work_ids
+        else:
+            visible = [self.work_ids[row_id] for row_id in row_ids]
+            
+        children = self.tree.get_children()
+        if children:
+            self.tree.detach(*children)
+        for index, work_id in enumerate(visible):
+            self.tree.move(work_id, '', index)
+            
+    def play_first_match(self, event=None):
+        """播放第一个匹配的作品"""
+        # 后台查询可能尚未完成，先同步应用最新的搜索词
+        if self.applied_generation != self.search_worker.generation:
+            self.apply_filter_now()
+            
+        children = self.tree.get_children()
+        if children:
+            self.tree.selection_set(children[0])
+            self.play_selected()
+        else:
+            messagebox.showinfo("提示", "没有找到匹配的作品")
+            
+    def play_selected(self, event=None):
+        """播放选中的作品"""
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showinfo("提示", "请先选择一个作品")
+            return
+            
+        work_id = selection[0]
+        work = self.work_data.get(work_id)
+        
+        if not work or not work['url']:
+            messagebox.showinfo("提示", "该作品没有视频链接")
+            return
+            
+        self.add_log(f"准备播放: {work['name']}")
+        
+        # 根据播放模式处理
+        if self.play_mode.get() == "browser" or self.media_manager.is_video_platform_url(work['url']):
+            # 浏览器播放
+            self.player.open_url_in_browser(work['url'])
+        else:
+            # 下载后播放（优先于其他下载，没有空闲名额时暂停一个批量下载）；
+            # 同一链接已在下载队列中时提高那个任务的优先级，结束后播放
+            job = self.download_pool.submit(canonical_url(work['url']), work['url'],
+                                            lambda job: self._download_work(work, job),
+                                            priority=INTERACTIVE)
+            job.add_done_callback(lambda job: self._play_downloaded(work, job))
+            
+    def _play_downloaded(self, work, job):
+        """下载任务结束后播放（在下载池的工作线程中执行），下载失败时在浏览器中打开"""
+        if job.status == CANCELLED:
+            return
+        if job.result:
+            self.ui_events.call(self._set_playing, work)
+            self.ui_events.call(self.player.play_file, job.result)
+            self.update_status("播放中")
+        else:
+            self.ui_events.call(messagebox.showinfo,
+                "提示", f"无法下载视频文件，将在浏览器中打开\n\n作品: {work['name']}")
+            self.ui_events.call(self.player.open_url_in_browser, work['url'])
+            
+    def _fetch_work(self, work, job):
+        """正式下载作品：先停止对它的预取，再下载（或直接使用缓存）"""
+        url = work['url']
+        if self.prefetcher.claim(url):
+            self.add_log(f"使用预取的内容: {work['name']}")
+        try:
+            return self.media_manager.try_download_video(
+                url, work['name'], progress=self._job_progress(work, job))
+        finally:
+            self.prefetcher.release(url)
+            
+    def _job_progress(self, work, job):
+        """下载进度回调：报告给下载池，并在列表中显示该作品的进度"""
+        def report(downloaded, total_size):
+            job.report(downloaded, total_size)
+            if total_size:
+                self.ui_events.item_progress(work['id'], downloaded * 100 / total_size)
+        return report
+        
+    def _show_item_progress(self, work_id, value):
+        """在状态列显示下载进度（不改变作品记录的状态）"""
+        try:
+            values = list(self.tree.item(work_id, 'values'))
+            values[5] = f"下载中 {value:.0f}%"
+            self.tree.item(work_id, values=values)
+        except (tk.TclError, IndexError):
+            pass
+            
+    def _confirm_insecure(self, host, reason):
+        """某个站点的证书无法校验时询问是否仍然连接（工作线程中调用，等待回答）"""
+        return self.ui_events.ask(
+            messagebox.askyesno, "证书无法校验",
+            f"{host} 的证书无法校验（{reason}）。\n\n"
+            f"不校验证书时，连接可能被冒充或篡改。仍然从这个站点下载吗？\n"
+            f"（只对本次运行有效）")
+            
+    def _on_downloads_idle(self, stats):
+        """一批下载全部结束（工作线程中调用）"""
+        self.add_log(f"下载结束：{stats.summary()}")
+        self.add_log(self.media_manager.http.stats().summary())
+        self.add_log(self.media_manager.sniffer.take_stats().summary())
+        self.add_log(self.media_manager.evictor.stats().summary())
+        self.add_log(self.prefetcher.stats().summary())
+        self.ui_events.refresh(self.update_cache_stats)
+        self.prefetcher.wakeup()
+        
+    def schedule_prefetch(self):
+        """选择或滚动位置变化后更新预取计划（合并短时间内的多次变化）"""
+        if self.prefetch_after is None:
+            self.prefetch_after = self.root.after(PREFETCH_UPDATE_DELAY, self.update_prefetch)
+            
+    def update_prefetch(self):
+        """按当前选择和可见范围重新计算预取计划（主线程）"""
+        self.prefetch_after = None
+        if (not self.prefetch_var.get() or self.import_worker is not None
+                or self.play_mode.get() == "browser"):
+            self.prefetcher.update([])
+            return
+        self.prefetcher.update([(work['url'], work['name'])
+                                for work in self._prefetch_candidates()])
+        
+    def _prefetch_candidates(self):
+        """最可能接着播放的作品：选中的作品及其后的作品（按列表当前的显示顺序）；
+        选中的作品不在可见范围内时，从可见范围的第一行开始
+        """
+        children = self.tree.get_children()
+        if not children:
+            return []
+        selection = self.tree.selection()
+        if selection and self.tree.bbox(selection[0]):
+            start = self.tree.index(selection[0])
+        else:
+            start = min(int(self.tree.yview()[0] * len(children)), len(children) - 1)
+            
+        works = []
+        for work_id in children[start:]:
+            work = self.work_data.get(work_id)
+            if work and work['url'] and not self.media_manager.is_video_platform_url(work['url']):
+                works.append(work)
+                if len(works) >= self.prefetcher.count:
+                    break
+        return works
+        
+    def _set_playing(self, work):
+        """记录正在播放的作品，并把它的缓存文件钉住（主线程）"""
+        store = self.media_manager.store
+        if self.playing_url:
+            store.unpin(self.playing_url)
+        self.playing_work_id = work['id']
+        self.playing_url = work['url']
+        store.pin(self.playing_url)
+        self.update_cache_stats()
+        
+    def _upcoming_urls(self):
+        """正在播放的作品之后的若干个作品链接（按列表顺序，即展演顺序）"""
+        work_ids = list(self.work_ids)
+        try:
+            start = work_ids.index(self.playing_work_id) + 1
+        except ValueError:
+            start = 0
+        urls = []
+        for work_id in work_ids[start:start + UPCOMING_COUNT]:
+            work = self.work_data.get(work_id)
+            if work and work['url']:
+                urls.append(work['url'])
+        return urls
+        
+    def update_cache_settings(self, event=None):
+        """应用缓存上限和淘汰策略"""
+        evictor = self.media_manager.evictor
+        try:
+            evictor.set_budget(self.cache_budget_var.get() * 1024 ** 3)
+        except (tk.TclError, ValueError):
+            pass
+        policy = self.cache_policies.get(self.cache_policy_var.get())
+        if policy is not None and policy is not evictor.policy:
+            evictor.set_policy(policy)
+            self.add_log(f"缓存淘汰策略: {policy.name}")
+        self.update_cache_stats()
+        
+    def update_revalidate_mode(self):
+        """切换使用缓存前是否先确认服务器上的文件没有变化"""
+        self.media_manager.revalidate_on_use = self.revalidate_var.get()
+        
+    def start_revalidation(self):
+        """后台验证全部缓存文件，服务器上已更新的重新下载"""
+        revalidator = self.media_manager.revalidator
+        if not revalidator.start(self._on_cache_changed, self._on_revalidation_done):
+            self.add_log("正在检查缓存更新，请稍候")
+            return
+        self.add_log("开始检查缓存更新")
+        self.update_status("正在检查缓存更新...")
+        
+    def _on_cache_changed(self, url, name):
+        """服务器上的文件已更新（验证线程中调用）：加入下载队列重新下载"""
+        self.add_log(f"服务器上的文件已更新: {name}")
+        self.download_pool.submit(canonical_url(url), url,
+                                  lambda job: self._refresh_cached(url, name, job))
+        
+    def _refresh_cached(self, url, name, job):
+        """重新下载已更新的文件（在下载池的工作线程中执行），失败时保留原来的缓存"""
+        cached_file = self.media_manager.try_download_video(url, name, progress=job.report,
+                                                            refresh=True)
+        if cached_file:
+            self.ui_events.call(self._update_cached_file, url, cached_file)
+            
+    def _update_cached_file(self, url, cached_file):
+        """使用同一链接（规范化后相同）的作品共用一个缓存文件"""
+        key = canonical_url(url)
+        for work in self.work_data.values():
+            if work['url'] and canonical_url(work['url']) == key:
+                work['cached_file'] = cached_file
+                self.update_work_status(work['id'], '已缓存')
+                
+    def _on_revalidation_done(self, stats):
+        """批量验证结束（验证线程中调用）"""
+        self.add_log(stats.summary())
+        self.update_status("缓存检查完成")
+        
+    def update_cache_stats(self):
+        """刷新缓存统计（主线程）"""
+        stats = self.media_manager.evictor.stats()
+        prefetch = self.prefetcher.stats()
+        self.cache_stats_label.config(text=(
+            f"已用 {stats.used / 1024 ** 3:.2f} GB，命中率 {stats.hit_rate * 100:.0f}%，"
+            f"已淘汰 {stats.evicted_bytes / 1024 / 1024:.0f} MB，"
+            f"预取命中率 {prefetch.hit_rate * 100:.0f}%"))
+        
+    def open_in_browser(self):
+        """在浏览器中打开选中的作品"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+            
+        work_id = selection[0]
+        work = self.work_data.get(work_id)
+        
+        if work and work['url']:
+            self.player.open_url_in_browser(work['url'])
+        else:
+            messagebox.showinfo("提示", "该作品没有视频链接")
+            
+    def download_selected(self):
+        """下载选中的作品"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+            
+        work_id = selection[0]
+        work = self.work_data.get(work_id)
+        
+        if not work or not work['url']:
+            messagebox.showinfo("提示", "该作品没有视频链接")
+            return
+            
+        self.download_pool.submit(canonical_url(work['url']), work['url'],
+                                  lambda job: self._download_work(work, job))
+        
+    def _download_work(self, work, job):
+        """下载作品（在下载池的工作线程中执行），返回缓存文件路径，失败时返回None"""
+        try:
+            self.update_status(f"正在下载: {work['name']}")
+            
+            cached_file = self._fetch_work(work, job)
+            
+            if cached_file:
+                self.add_log(f"下载完成: {work['name']}")
+                self.ui_events.call(self._update_cached_file, work['url'], cached_file)
+            else:
+                self.add_log(f"下载失败: {work['name']}")
+                self.ui_events.call(self.update_work_status, work['id'], work['status'])
+            self.update_status("就绪")
+            return cached_file
+            
+        except DownloadCancelled:
+            self.ui_events.call(self.update_work_status, work['id'], work['status'])
+            raise
+        except Exception as e:
+            self.add_log(f"下载出错: {e}")
+            self.ui_events.call(self.update_work_status, work['id'], work['status'])
+            return None
+            
+    def open_file_location(self):
+        """打开文件位置"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+            
+        work_id = selection[0]
+        work = self.work_data.get(work_id)
+        
+        if work and work.get('cached_file') and os.path.exists(work['cached_file']):
+            file_path = work['cached_file']
+            if sys.platform.startswith('win'):
+                subprocess.run(['explorer', '/select,', file_path])
+            elif sys.platform.startswith('darwin'):
+                subprocess.run(['open', '-R', file_path])
+            else:
+                subprocess.run(['xdg-open', os.path.dirname(file_path)])
+        else:
+            messagebox.showinfo("提示", "文件未下载或不存在")
+            
+    def update_work_status(self, work_id, status):
+        """更新作品状态"""
+        if work_id in self.work_data:
+            self.work_data[work_id]['status'] = status
+            
+            # 更新树视图中的状态
+            try:
+                item = self.tree.item(work_id)
+                values = list(item['values'])
+                values[5] = status  # 状态列
+                self.tree.item(work_id, values=values)
+            except:
+                pass
+                
+    def show_context_menu(self, event):
+        """显示右键菜单"""
+        try:
+            self.context_menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            self.context_menu.grab_release()
+            
+    def on_selection_change(self, event=None):
+        """选择改变时更新信息显示，并预取接下来可能播放的作品"""
+        self.schedule_prefetch()
+        selection = self.tree.selection()
+        if not selection:
+            return
+            
+        work_id = selection[0]
+        work = self.work_data.get(work_id)
+        
+        if work:
+            info_text = f"""作品信息
+{'='*30}
+
+作品名称: {work['name']}
+参赛者: {work['participant']}
+组别: {work['category']}
+指导老师: {work['teacher']}
+推送单位: {work['organization']}
+
+视频链接: {work['url'][:50] + '...' if len(work['url']) > 50 else work['url']}
+状态: {work['status']}
+
+{'='*30}
+双击播放 | 右键更多选项"""
+            
+            self.info_text.config(state=tk.NORMAL)
+            self.info_text.delete(1.0, tk.END)
+            self.info_text.insert(1.0, info_text)
+            self.info_text.config(state=tk.DISABLED)
+            
+    def sort_column(self, col):
+        """排序列"""
+        # 简单的排序实现
+        items = [(self.tree.set(child, col), child) for child in self.tree.get_children('')]
+        items.sort()
+        
+        for index, (val, child) in enumerate(items):
+            self.tree.move(child, '', index)
+            
+    def open_cache_dir(self):
+        """打开缓存目录"""
+        cache_dir = os.path.abspath(self.media_manager.cache_dir)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+            
+        if sys.platform.startswith('win'):
+            os.startfile(cache_dir)
+        elif sys.platform.startswith('darwin'):
+            subprocess.run(['open', cache_dir])
+        else:
+            subprocess.run(['xdg-open', cache_dir])
+            
+    def clear_cache(self):
+        """清理缓存"""
+        result = messagebox.askyesno("确认", "确定要清理所有缓存文件吗？")
+        if result:
+            try:
+                # 删除缓存目录中的文件（缓存数据库保留，只清空记录）
+                self.media_manager.store.clear(remove_files=True)
+                
+                # 更新作品状态
+                for work in self.work_data.values():
+                    if work['status'] == '已缓存':
+                        work['status'] = '有链接'
+                        work['cached_file'] = None
+                        
+                self.populate_tree()
+                self.add_log("缓存已清理")
+                messagebox.showinfo("完成", "缓存清理完成")
+                
+            except Exception as e:
+                error_msg = f"清理缓存失败: {e}"
+                self.add_log(error_msg)
+                messagebox.showerror("错误", error_msg)
+                
+    def show_about(self):
+        """显示关于信息"""
+        about_text = """CSV作品播放器 v2.0 (高级版)
+
+功能特点:
+• 智能CSV文件读取（支持多种编码）
+• 在线视频播放（浏览器模式）
+• 本地缓存下载播放
+• 系统播放器集成
+• 无需外部依赖
+
+使用说明:
+1. 点击"导入CSV文件"选择数据文件
+2. 在作品列表中选择要播放的作品
+3. 双击播放或使用右键菜单
+4. 支持搜索过滤功能
+
+技术特点:
+• 纯Python标准库实现
+• 跨平台兼容（Windows/Mac/Linux）
+• 智能播放模式选择
+• 完善的错误处理
+
+作者: CodeBuddy
+版本: 2.0"""
+        
+        messagebox.showinfo("关于", about_text)
+        
+    def add_log(self, message):
+        """添加日志（任意线程，下一帧显示）"""
+        self.ui_events.log(message)
+        
+    def _update_log_display(self, message):
+        """更新日志显示（主线程）"""
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, message)
+        self.log_text.see(tk.END)
+        self.log_text.config(state=tk.DISABLED)
+        
+        # 限制日志长度
+        lines = self.log_text.get(1.0, tk.END).split('\n')
+        if len(lines) > 1000:
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.delete(1.0, f"{len(lines)-500}.0")
+            self.log_text.config(state=tk.DISABLED)
+            
+    def update_progress(self, value):
+        """更新进度条（任意线程，下一帧显示）"""
+        self.ui_events.progress(value)
+        
+    def update_status(self, message):
+        """更新状态（任意线程，下一帧显示）"""
+        self.ui_events.status(message)
+        
+    def _drain_ui_events(self):
+        """按固定帧率处理界面事件（主线程）：合并进度，日志一次插入"""
+        update = self.ui_events.drain()
+        if update is not None:
+            if update.logs:
+                self._update_log_display(update.log_text)
+            if update.progress is not None:
+                self.progress_var.set(update.progress)
+            if update.status is not None:
+                self.status_label.config(text=update.status)
+            for work_id, value in update.item_progress.items():
+                self._show_item_progress(work_id, value)
+            for func, args in update.calls:
+                func(*args)
+        self.root.after(FRAME_INTERVAL, self._drain_ui_events)
+        
+    def run(self):
+        """运行应用程序"""
+        self.add_log("CSV作品播放器 v2.0 启动成功")
+        self.add_log("提示: 高级版支持智能播放和本地缓存")
+        self.add_log("建议: 视频平台链接使用浏览器播放模式")
+        
+        # 设置窗口关闭事件
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        
+        self.root.mainloop()
+        
+    def on_closing(self):
+        """程序关闭时的清理工作"""
+        self.add_log("程序正在关闭...")
+        self.search_worker.stop()
+        self.cancel_import()
+        self.download_pool.shutdown()
+        self.media_manager.evictor.stop()
+        self.media_manager.revalidator.cancel()
+        self.prefetcher.stop()
+        self.root.destroy()
+
+def main():
+    """主函数"""
+    try:
+        app = AdvancedCSVPlayer()
+        app.run()
+    except Exception as e:
+        print(f"程序启动失败: {e}")
+        messagebox.showerror("错误", f"程序启动失败:\n{e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载任务池
+固定数量的工作线程共享一个任务队列，同时限制总并发数和每个主机的并发数
+（同一站点的多个连接往往共用限速，开太多只会互相抢带宽）。
+每个任务的状态变化通过回调通知，并统计整体吞吐量。
+
+任务分为交互（正要播放）和批量两种优先级：交互任务总是先于批量任务开始，
+没有空闲名额时暂停一个最晚才需要的批量任务让出名额，被暂停的任务重新排队，
+之后从.part文件续传。批量任务按order（例如展演号码）从小到大排队。
+
+同一个键（规范化的链接，见url_canon）同时只有一个任务，重复提交的请求都
+等待这个任务。不经过下载池的下载（例如预取）用SingleFlight与之互斥。
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+
+# 默认并发数
+DEFAULT_WORKERS = 4
+DEFAULT_PER_HOST = 2
+
+# 任务优先级（数值小的先执行）
+INTERACTIVE = 0
+BULK = 1
+
+# 任务状态
+QUEUED = '排队中'
+RUNNING = '下载中'
+DONE = '已完成'
+FAILED = '失败'
+CANCELLED = '已取消'
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class DownloadCancelled(Exception):
+    """任务已被取消"""
+
+
+class DownloadPreempted(DownloadCancelled):
+    """任务被交互任务暂停，稍后重新排队继续"""
+
+
+class DownloadJob:
+    """下载任务
+
+    task(job)在工作线程中执行并返回结果（通常是本地文件路径），失败时抛出异常；
+    下载过程中调用job.report(已下载字节数, 总字节数)报告进度，任务被取消或
+    暂停后report会抛出DownloadCancelled（暂停时为DownloadPreempted），使下载
+    循环尽快退出；task应当让这个异常传出，被暂停的任务之后会再次执行。
+    """
+
+    def __init__(self, pool, key, url, task, on_status=None, priority=BULK, order=None):
+        self.pool = pool
+        self.key = key
+        self.url = url
+        self.host = urllib.parse.urlsplit(url).netloc.lower()
+        self.task = task
+        self.on_status = on_status
+        self.priority = priority
+        self.order = order
+        self.preemptions = 0
+        self.requests = 1       # 提交次数（包括合并进来的重复请求）
+        self.status = QUEUED
+        self.bytes_done = 0
+        self.total_bytes = 0
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._cancel_event = threading.Event()
+        self._preempt_event = threading.Event()
+        self._done_event = threading.Event()
+        self._done_callbacks = []
+        self._entry = None      # 在队列中的条目
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def progress(self):
+        """本任务的完成比例（0~1），总大小未知时为0"""
+        if self.status == DONE:
+            return 1.0
+        if not self.total_bytes:
+            return 0.0
+        return min(1.0, self.bytes_done / self.total_bytes)
+
+    @property
+    def speed(self):
+        """平均速度（字节/秒）"""
+        if not self.started:
+            return 0.0
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    def report(self, bytes_done, total_bytes=0):
+        """报告进度（在下载循环中调用）"""
+        if self._cancel_event.is_set():
+            raise DownloadCancelled("下载已取消")
+        if self._preempt_event.is_set():
+            raise DownloadPreempted("下载已暂停，让位于正要播放的作品")
+        self.bytes_done = bytes_done
+        if total_bytes:
+            self.total_bytes = total_bytes
+
+    def cancel(self):
+        """取消任务（排队中的任务直接移出队列）"""
+        self._cancel_event.set()
+        self.pool._cancel_queued(self)
+
+    def wait(self, timeout=None):
+        """等待任务结束，返回结果（失败或取消时为None）"""
+        self._done_event.wait(timeout)
+        return self.result
+
+    def add_done_callback(self, callback):
+        """任务结束后调用callback(job)（在工作线程中）；已结束时立即调用
+
+        合并到同一任务的各个请求用它分别处理结果
+        """
+        with self.pool._cond:
+            if self.status not in FINISHED_STATES:
+                self._done_callbacks.append(callback)
+                return
+        callback(self)
+
+
+class DownloadStats:
+    """一批任务（从池空闲到再次空闲）的统计快照"""
+
+    def __init__(self, jobs, elapsed):
+        counts = Counter(job.status for job in jobs)
+        self.total = len(jobs)
+        self.queued = counts[QUEUED]
+        self.running = counts[RUNNING]
+        self.done = counts[DONE]
+        self.failed = counts[FAILED]
+        self.cancelled = counts[CANCELLED]
+        self.bytes_done = sum(job.bytes_done for job in jobs)
+        self.joined = sum(job.requests - 1 for job in jobs)
+        self.elapsed = elapsed
+        # 整体进度（0~100）：已结束的任务计为完成，下载中的按已下载比例
+        self.progress = 100.0 if not jobs else sum(
+            1.0 if job.status in FINISHED_STATES else job.progress for job in jobs) * 100.0 / len(jobs)
+
+    @property
+    def throughput(self):
+        """整体吞吐量（字节/秒）"""
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"完成 {self.done} 个，失败 {self.failed} 个，取消 {self.cancelled} 个，"
+                f"合并重复请求 {self.joined} 个，共 {self.bytes_done / 1024 / 1024:.1f} MB，"
+                f"平均 {self.throughput / 1024 / 1024:.2f} MB/s")
+
+
+class _Flight:
+    """SingleFlight中一次进行中的执行"""
+
+    __slots__ = ('done', 'ok', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
+
+
+class SingleFlight:
+    """同一个键同时只执行一次
+
+    后来的调用等待正在执行的那次并得到相同的结果；执行的一方抛出异常（失败、
+    被取消或暂停）时，等待的一方重新执行。
+    """
+
+    POLL_INTERVAL = 0.2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}      # 键 -> _Flight
+        self.joined = 0         # 等待了别人的调用次数
+
+    def do(self, key, func, poll=None):
+        """执行func()或等待同一键正在进行的执行；poll()在等待期间定期调用，
+        可以抛出异常停止等待（例如所在的下载任务被取消）"""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                else:
+                    self.joined += 1
+
+            if leader:
+                try:
+                    flight.result = func()
+                    flight.ok = True
+                    return flight.result
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+
+            while not flight.done.wait(self.POLL_INTERVAL):
+                if poll:
+                    poll()
+            if flight.ok:
+                return flight.result
+
+
+class DownloadPool:
+    """有界下载线程池
+
+    on_status(job)在任务状态变化时调用（工作线程或提交任务的线程中），
+    on_idle(stats)在一批任务全部结束、池重新空闲时调用。
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                 on_status=None, on_idle=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.on_status = on_status
+        self.on_idle = on_idle
+
+        self._cond = threading.Condition()
+        self._queue = []                # 堆：[优先级, 无order, order, 序号, 任务]
+        self._seq = itertools.count()
+        self._active = {}               # key -> 未结束的任务
+        self._running = set()
+        self._running_hosts = Counter()
+        self._threads = 0
+        self._stopped = False
+
+        # 本批（从空闲到再次空闲）提交的任务，用于统计
+        self._batch = []
+        self._batch_started = None
+
+    def set_limits(self, max_workers=None, per_host=None):
+        """调整并发数（立即生效，多余的线程在空闲时退出）"""
+        with self._cond:
+            if max_workers is not None:
+                self.max_workers = max(1, int(max_workers))
+            if per_host is not None:
+                self.per_host = max(1, int(per_host))
+            self._start_threads()
+            self._cond.notify_all()
+
+    def submit(self, key, url, task, on_status=None, priority=BULK, order=None):
+        """提交任务；同一key的任务未结束时直接返回已有的任务（需要时提高其优先级、
+        提前其排队顺序）
+
+        order为批量任务的排队顺序（可比较的元组，例如展演号码），没有order的排在最后
+        """
+        with self._cond:
+            job = self._active.get(key)
+            if job is not None:
+                job.requests += 1
+                promote = priority < job.priority
+                earlier = order is not None and (job.order is None or order < job.order)
+                if promote:
+                    job.priority = priority
+                if earlier:
+                    job.order = order
+                if (promote or earlier) and job._entry is not None:
+                    self._push(job)
+                if promote:
+                    self._preempt_for(job)
+                self._cond.notify_all()
+                return job
+            job = DownloadJob(self, key, url, task, on_status, priority, order)
+            self._active[key] = job
+            self._push(job)
+            if not self._batch:
+                self._batch_started = time.perf_counter()
+            self._batch.append(job)
+            self._start_threads()
+            if priority == INTERACTIVE:
+                self._preempt_for(job)
+            self._cond.notify_all()
+        self._notify(job)
+        return job
+
+    def get(self, key):
+        """取得未结束的任务"""
+        with self._cond:
+            return self._active.get(key)
+
+    def scheduled(self):
+        """未结束的任务，按预计开始的顺序（下载中的在前，排队中的按优先级和order）"""
+        with self._cond:
+            running = sorted(self._running, key=lambda job: job.started)
+            queued = sorted((entry for entry in self._queue if entry[-1]._entry is entry),
+                            key=lambda entry: entry[:-1])
+            return running + [entry[-1] for entry in queued]
+
+    def pending(self):
+        """未结束（排队中和下载中）的任务数"""
+        with self._cond:
+            return len(self._active)
+
+    def cancel_all(self):
+        """取消全部排队中和下载中的任务"""
+        with self._cond:
+            jobs = list(self._active.values())
+        for job in jobs:
+            job.cancel()
+
+    def shutdown(self):
+        """取消全部任务并让工作线程退出"""
+        self.cancel_all()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self):
+        """当前这一批任务的统计快照"""
+        with self._cond:
+            elapsed = time.perf_counter() - self._batch_started if self._batch else 0.0
+            return DownloadStats(list(self._batch), elapsed)
+
+    def _start_threads(self):
+        """补足工作线程（调用时持有锁）"""
+        while self._threads < self.max_workers:
+            self._threads += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _push(self, job):
+        """把任务放入队列（调用时持有锁；已在队列中的旧条目作废）"""
+        entry = [job.priority, job.order is None, job.order or (), next(self._seq), job]
+        job._entry = entry
+        heapq.heappush(self._queue, entry)
+
+    def _preempt_for(self, job):
+        """交互任务没有空闲名额时，暂停一个最晚才需要的批量任务（调用时持有锁）"""
+        host_full = self._running_hosts[job.host] >= self.per_host
+        if not host_full and len(self._running) < self.max_workers:
+            return
+        victims = [running for running in self._running
+                   if running.priority > job.priority and not running._preempt_event.is_set()
+                   and (not host_full or running.host == job.host)]
+        if victims:
+            victim = max(victims, key=lambda running: (running.order is None,
+                                                       running.order or ()))
+            victim._preempt_event.set()
+
+    def _cancel_queued(self, job):
+        with self._cond:
+            if job._entry is None:
+                return  # 已开始下载，由下载循环响应取消
+            job._entry = None
+            finished = self._finish(job, CANCELLED)
+        finished()
+
+    def _take_job(self):
+        """取出优先级最高、所在主机未达并发上限的任务（调用时持有锁）"""
+        skipped = []
+        job = None
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            candidate = entry[-1]
+            if candidate._entry is not entry:
+                continue  # 已取消或已重新排队的旧条目
+            if self._running_hosts[candidate.host] < self.per_host:
+                candidate._entry = None
+                job = candidate
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped or self._threads > self.max_workers:
+                        self._threads -= 1
+                        return
+                    job = self._take_job()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+
+                job.status = RUNNING
+                job.started = job.started or time.perf_counter()
+                self._running.add(job)
+                self._running_hosts[job.host] += 1
+            self._notify(job)
+
+            try:
+                job.result = job.task(job)
+                status = DONE
+            except Exception as e:
+                job.error = e
+                status = CANCELLED if job.cancelled else FAILED
+            if status == DONE and job.cancelled:
+                job.result = None
+                status = CANCELLED
+
+            with self._cond:
+                self._running.discard(job)
+                self._running_hosts[job.host] -= 1
+                # 只有因暂停而中止的才重新排队；暂停期间出现的其他错误照常算失败
+                requeue = status == FAILED and isinstance(job.error, DownloadPreempted)
+                job._preempt_event.clear()
+                if requeue:
+                    # 被暂停：重新排队，之后从.part文件续传
+                    job.status = QUEUED
+                    job.error = None
+                    job.preemptions += 1
+                    self._push(job)
+                else:
+                    finished = self._finish(job, status)
+                self._cond.notify_all()
+            if requeue:
+                self._notify(job)
+            else:
+                finished()
+
+    def _finish(self, job, status):
+        """任务结束（调用时持有锁）；返回释放锁后调用的函数，由它执行通知和回调"""
+        job.status = status
+        job.finished = time.perf_counter()
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+
+        idle_stats = None
+        if not self._active:
+            idle_stats = DownloadStats(self._batch, job.finished - self._batch_started)
+            self._batch = []
+
+        callbacks, job._done_callbacks = job._done_callbacks, []
+
+        def finished():
+            job._done_event.set()
+            self._notify(job)
+            for callback in callbacks:
+                try:
+                    callback(job)
+                except Exception:
+                    pass
+            if idle_stats is not None and self.on_idle:
+                self.on_idle(idle_stats)
+        return finished
+
+    def _notify(self, job):
+        for callback in (job.on_status, self.on_status):
+            if callback:
+                try:
+                    callback(job)
+                except Exception:
+                    pass
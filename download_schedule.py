@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载排期
+批量下载按展演顺序（展演号码从小到大）排队，最早上场的作品最先下载好。
+按整体下载吞吐量估计每个作品的就绪时间，与上场时间比较，找出可能赶不上的作品。
+上场时间由开演时间和每个节目的时长推算：第n个节目在 开演时间 + n × 时长 上场。
+"""
+
+import re
+import time
+
+
+# 每个节目的默认时长（分钟）
+DEFAULT_SLOT_MINUTES = 5
+# 大小未知的任务按同批已知大小的平均值估计，都未知时按这个大小
+DEFAULT_SIZE_GUESS = 50 * 1024 * 1024
+# 就绪时间离上场不足这么多秒也算有风险
+SAFETY_MARGIN = 120
+
+
+def show_order_key(number):
+    """展演号码的排序键：数字部分按数值比较（"A2"排在"A10"之前）"""
+    parts = re.split(r'(\d+)', str(number).strip())
+    return tuple((0, int(part)) if part.isdigit() else (1, part) for part in parts if part)
+
+
+def parse_clock(text, now=None):
+    """把"HH:MM"解析为今天该时刻的时间戳，格式不对时返回None"""
+    match = re.fullmatch(r'\s*(\d{1,2})[:：](\d{2})\s*', text or '')
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return None
+    today = time.localtime(now)
+    return time.mktime((today.tm_year, today.tm_mon, today.tm_mday, hour, minute, 0, 0, 0, -1))
+
+
+class ShowSchedule:
+    """演出排期：展演号码 -> 上场时间"""
+
+    def __init__(self, start=None, slot_minutes=DEFAULT_SLOT_MINUTES):
+        self.start = start                  # 开演时间戳，None表示未设置
+        self.slot_minutes = slot_minutes
+        self._rank = {}
+
+    def set_numbers(self, numbers):
+        """设置全部展演号码（包括已下载的），按展演顺序编排上场次序"""
+        ordered = sorted({str(number) for number in numbers if str(number)}, key=show_order_key)
+        self._rank = {number: rank for rank, number in enumerate(ordered)}
+
+    def deadline(self, number):
+        """上场时间，未设置开演时间或号码未知时返回None"""
+        rank = self._rank.get(str(number))
+        if self.start is None or rank is None:
+            return None
+        return self.start + rank * self.slot_minutes * 60
+
+
+class ReadyEstimate:
+    """一个任务的预计就绪时间"""
+
+    __slots__ = ('job', 'ready_at', 'deadline')
+
+    def __init__(self, job, ready_at, deadline):
+        self.job = job
+        self.ready_at = ready_at
+        self.deadline = deadline
+
+    @property
+    def at_risk(self):
+        return self.deadline is not None and self.ready_at > self.deadline - SAFETY_MARGIN
+
+
+def estimate_ready(jobs, throughput, deadline_of=None, now=None):
+    """估计每个任务的就绪时间
+
+    jobs为未结束的任务（按预计开始的顺序，见DownloadPool.scheduled），把各任务
+    剩余的字节数依次累加后除以吞吐量（字节/秒）；deadline_of(job)返回上场时间。
+    吞吐量未知时返回[]。
+    """
+    if throughput <= 0:
+        return []
+    now = time.time() if now is None else now
+    known = [job.total_bytes for job in jobs if job.total_bytes]
+    size_guess = sum(known) / len(known) if known else DEFAULT_SIZE_GUESS
+
+    estimates = []
+    remaining = 0.0
+    for job in jobs:
+        total = job.total_bytes or max(size_guess, job.bytes_done)
+        remaining += max(0, total - job.bytes_done)
+        deadline = deadline_of(job) if deadline_of else None
+        estimates.append(ReadyEstimate(job, now + remaining / throughput, deadline))
+    return estimates
@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可续传的文件下载
+下载内容先写入"目标文件.part"，旁边的"目标文件.part.json"记录链接、
+ETag/Last-Modified和已下载字节数。传输中断后再次下载同一文件时，用
+Range: bytes=N- 请求剩余部分，并用If-Range校验服务器上的文件没有变化
+（已变化时服务器返回完整内容，从头下载）。长度与Content-Length一致后
+才把.part文件原子地重命名为目标文件。
+
+大文件分段下载：服务器支持Range（Accept-Ranges: bytes）且大小已知时，
+文件按PIECE_SIZE切成若干段，多个连接并行下载，按位置写入预先分配好的
+.part文件。部分对象存储按连接限速，多连接能明显缩短大文件的下载时间。
+连接数从INITIAL_SEGMENTS开始，每增加一个连接后观察吞吐量，提升不明显
+就不再增加。已完成的段记录在记录文件中，中断后只下载缺少的段。
+
+传输循环使用预先分配、反复使用的缓冲区（readinto直接读入，不为每块数据
+创建bytes对象），每次读取的大小按耗时在256 KB~4 MB间自动调整，慢速
+连接也能及时报告进度。大小已知时先用posix_fallocate为文件分配空间。
+
+传入sniff回调时，从头下载的文件先读入开头SNIFF_BYTES字节交给它检查（判断
+是否媒体文件），不是所需内容时立即中止，不再下载整个响应。
+
+传入digest（hashlib对象）时按文件顺序计算内容摘要：单连接下载边写边算；
+续传时先补算已有部分；分段下载时，从文件开头起连续完成的段刚写入就从
+文件（页缓存）读回计算，下载结束时摘要也已算完。
+"""
+
+import errno
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+from collections import deque
+from http.client import IncompleteRead
+
+
+PART_SUFFIX = '.part'
+META_SUFFIX = '.part.json'
+
+# 每次读取的字节数范围，以及期望的单次读取耗时（秒）
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+CHUNK_TARGET_TIME = 0.25
+
+# 交给sniff回调检查的文件开头字节数（MPEG-TS至少需要三个188字节的包）
+SNIFF_BYTES = 8 * 1024
+
+# 单连接下载时记录文件的保存间隔（秒），进程意外退出时最多重新下载这段时间的数据
+META_SAVE_INTERVAL = 2.0
+
+CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+# 分段下载：不小于SEGMENT_MIN_SIZE的文件才分段
+SEGMENT_MIN_SIZE = 16 * 1024 * 1024
+PIECE_SIZE = 8 * 1024 * 1024
+INITIAL_SEGMENTS = 2
+MAX_SEGMENTS = 6
+# 每隔ADAPT_INTERVAL秒评估一次吞吐量；增加连接后提升不足ADAPT_GAIN则不再增加
+ADAPT_INTERVAL = 1.0
+ADAPT_GAIN = 1.15
+
+
+class RejectedResponse(Exception):
+    """响应内容不是要下载的文件（由check回调抛出），.part文件会被删除"""
+
+
+class IncompleteDownload(Exception):
+    """下载的长度与Content-Length不一致，.part文件保留以便续传"""
+
+
+class RemoteFileChanged(Exception):
+    """分段下载过程中服务器上的文件发生了变化"""
+
+
+def _body_length(response):
+    """响应头声明的响应体长度；分块传输或没有Content-Length时为None"""
+    if 'chunked' in response.headers.get('Transfer-Encoding', '').lower():
+        return None
+    value = response.headers.get('Content-Length', '')
+    return int(value) if value.isdigit() else None
+
+
+def part_paths(dest_path):
+    """目标文件对应的(.part文件, 记录文件)路径"""
+    return dest_path + PART_SUFFIX, dest_path + META_SUFFIX
+
+
+def _load_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta if isinstance(meta, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_meta(meta_path, meta):
+    try:
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    except OSError:
+        pass
+
+
+def discard_partial(dest_path):
+    """删除未完成的下载"""
+    for path in part_paths(dest_path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _validator(meta):
+    """If-Range使用的校验值：强ETag优先，否则用Last-Modified"""
+    etag = meta.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return meta.get('last_modified')
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _resume_offset(part_path, meta, url):
+    """可以续传的字节数（没有可用的校验值时不续传）
+
+    .part文件可能已按总大小预分配，以记录文件中的字节数为准
+    """
+    if meta.get('url') != url or not _validator(meta):
+        return 0
+    return min(meta.get('bytes') or 0, _file_size(part_path))
+
+
+def _preallocate(f, size):
+    """按总大小为文件分配空间（磁盘空间不足时尽早失败，也减少碎片）"""
+    f.flush()
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+            # 文件系统不支持时退回truncate
+    f.truncate(size)
+
+
+class _ChunkBuffer:
+    """可复用的读缓冲区
+
+    每次读取的大小在MIN_CHUNK_SIZE~MAX_CHUNK_SIZE之间调整：读满缓冲区的
+    耗时远小于CHUNK_TARGET_TIME时加倍，远大于时减半。
+    """
+
+    def __init__(self):
+        self.view = memoryview(bytearray(MAX_CHUNK_SIZE))
+        self.size = MIN_CHUNK_SIZE
+
+    def read_from(self, response, limit=None):
+        """从响应读入一块，返回指向缓冲区的memoryview（读完时长度为0）"""
+        size = self.size if limit is None else min(self.size, limit)
+        start = time.perf_counter()
+        count = response.readinto(self.view[:size])
+        elapsed = time.perf_counter() - start
+        if count == self.size:
+            if elapsed < CHUNK_TARGET_TIME / 2 and self.size < MAX_CHUNK_SIZE:
+                self.size *= 2
+            elif elapsed > CHUNK_TARGET_TIME * 2 and self.size > MIN_CHUNK_SIZE:
+                self.size //= 2
+        return self.view[:count]
+
+
+class _PrefixedResponse:
+    """已读出开头部分的响应：先返回读出的部分，再继续读原响应"""
+
+    def __init__(self, response, prefix):
+        self._response = response
+        self._prefix = memoryview(prefix)
+        self.status = response.status
+        self.headers = response.headers
+        self.url = response.url
+
+    def readinto(self, buffer):
+        if self._prefix:
+            count = min(len(buffer), len(self._prefix))
+            buffer[:count] = self._prefix[:count]
+            self._prefix = self._prefix[count:]
+            return count
+        return self._response.readinto(buffer)
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_head(response, size):
+    """从响应读出最多size字节（响应较短时读完为止）"""
+    head = bytearray()
+    while len(head) < size:
+        data = response.read(size - len(head))
+        if not data:
+            break
+        head += data
+    return bytes(head)
+
+
+def _positional_writer(f):
+    """返回write(data, offset)：按位置写入，多个线程可同时调用"""
+    if hasattr(os, 'pwrite'):
+        fd = f.fileno()
+
+        def write(data, offset):
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                view = view[written:]
+                offset += written
+    else:
+        # Windows没有pwrite，用锁保护seek+write；每次写入后立即flush：记录文件中
+        # 标为已完成的段不能还留在缓冲区中，_OrderedDigest也通过另一个文件句柄读取
+        lock = threading.Lock()
+
+        def write(data, offset):
+            with lock:
+                f.seek(offset)
+                f.write(data)
+                f.flush()
+    return write
+
+
+class _Segments:
+    """分段下载的共享状态"""
+
+    def __init__(self, total_size, piece_size, done):
+        self.total_size = total_size
+        self.piece_size = piece_size
+        count = (total_size + piece_size - 1) // piece_size
+        self.done = set(index for index in done if 0 <= index < count)
+        self.pending = deque(index for index in range(count) if index not in self.done)
+        self.bytes_done = sum(min(piece_size, total_size - index * piece_size)
+                              for index in self.done)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.error = None
+        self.workers = 0
+
+    def piece_range(self, index):
+        start = index * self.piece_size
+        return start, min(start + self.piece_size, self.total_size) - 1
+
+    def take(self):
+        with self.lock:
+            if self.stopped.is_set() or not self.pending:
+                return None
+            return self.pending.popleft()
+
+    def add_bytes(self, count):
+        with self.lock:
+            self.bytes_done += count
+
+    def finish(self, index):
+        with self.lock:
+            self.done.add(index)
+
+    def fail(self, index, error):
+        with self.lock:
+            self.pending.appendleft(index)
+            if self.error is None:
+                self.error = error
+        self.stopped.set()
+
+
+def _fetch_piece(http, url, headers, validator, segments, write, buffer, index,
+                 response=None, timeout=30):
+    """下载一段并写入对应位置；response为已打开的、从该段起点开始的响应"""
+    start, end = segments.piece_range(index)
+    if response is None:
+        piece_headers = dict(headers)
+        piece_headers['Range'] = f'bytes={start}-{end}'
+        piece_headers['If-Range'] = validator
+        response = http.open(url, headers=piece_headers, timeout=timeout)
+        match = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+        if response.status != 206 or not match or int(match.group(1)) != start:
+            response.close()
+            raise RemoteFileChanged("服务器上的文件已变化，需要重新下载")
+
+    with response:
+        position = start
+        while position <= end:
+            if segments.stopped.is_set():
+                return False
+            data = buffer.read_from(response, end + 1 - position)
+            if not data:
+                raise IncompleteDownload(f"分段下载中断（{position}/{end + 1} 字节）")
+            write(data, position)
+            position += len(data)
+            segments.add_bytes(len(data))
+    return True
+
+
+def _segment_worker(http, url, headers, validator, segments, write, first=None, timeout=30):
+    """分段下载线程：依次领取未下载的段，first为(段号, 已打开的响应)"""
+    buffer = _ChunkBuffer()
+    try:
+        while True:
+            if first is not None:
+                (index, response), first = first, None
+            else:
+                index, response = segments.take(), None
+                if index is None:
+                    return
+            try:
+                if not _fetch_piece(http, url, headers, validator, segments, write,
+                                    buffer, index, response, timeout):
+                    with segments.lock:
+                        segments.pending.appendleft(index)
+                    return
+            except Exception as e:
+                segments.fail(index, e)
+                return
+            segments.finish(index)
+    finally:
+        with segments.lock:
+            segments.workers -= 1
+
+
+def _hash_file(digest, f, start, end):
+    """把文件[start, end)的内容加入摘要"""
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = f.read(min(MAX_CHUNK_SIZE, remaining))
+        if not data:
+            raise IncompleteDownload("文件长度不足，无法计算摘要")
+        digest.update(data)
+        remaining -= len(data)
+
+
+class _OrderedDigest:
+    """分段下载的摘要：从文件开头起，已完成的段按顺序读回计算"""
+
+    def __init__(self, digest, part_path, segments):
+        self.digest = digest
+        self.segments = segments
+        self.next_piece = 0
+        self.f = open(part_path, 'rb') if digest is not None else None
+
+    def advance(self):
+        if self.f is None:
+            return
+        while True:
+            with self.segments.lock:
+                if self.next_piece not in self.segments.done:
+                    return
+            start, end = self.segments.piece_range(self.next_piece)
+            _hash_file(self.digest, self.f, start, end + 1)
+            self.next_piece += 1
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def _download_segmented(http, url, headers, part_path, meta_path, meta, segments,
+                        progress, log, max_segments, first_response=None, timeout=30,
+                        digest=None):
+    """多连接分段下载到part_path（文件已按总大小预分配）"""
+    validator = _validator(meta)
+    threads = []
+    ordered_digest = _OrderedDigest(digest, part_path, segments)
+
+    def add_worker(first=None):
+        with segments.lock:
+            segments.workers += 1
+        thread = threading.Thread(
+            target=_segment_worker,
+            args=(http, url, headers, validator, segments, write, first, timeout),
+            daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    def save():
+        with segments.lock:
+            meta['pieces'] = sorted(segments.done)
+            meta['bytes'] = segments.bytes_done
+        _save_meta(meta_path, meta)
+
+    with open(part_path, 'r+b') as f:
+        write = _positional_writer(f)
+        try:
+            first = None
+            if first_response is not None:
+                first = (segments.take(), first_response)
+            for _ in range(min(INITIAL_SEGMENTS, max_segments)):
+                add_worker(first)
+                first = None
+
+            # 逐步增加连接数：每加一个连接后比较吞吐量，提升不明显就停止增加
+            last_time, last_bytes = time.perf_counter(), segments.bytes_done
+            last_rate, growing = 0.0, True
+            next_check = last_time + ADAPT_INTERVAL
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.1)
+                ordered_digest.advance()
+                if progress:
+                    progress(segments.bytes_done, segments.total_size)
+                now = time.perf_counter()
+                if now < next_check:
+                    continue
+                next_check = now + ADAPT_INTERVAL
+                rate = (segments.bytes_done - last_bytes) / (now - last_time)
+                last_time, last_bytes = now, segments.bytes_done
+                save()
+
+                if growing and segments.error is None:
+                    if last_rate and rate < last_rate * ADAPT_GAIN:
+                        growing = False
+                    elif segments.workers < max_segments and segments.pending:
+                        add_worker()
+                    last_rate = rate
+        except BaseException:
+            # 取消或出错：通知各线程退出，保留已完成的段以便续传
+            segments.stopped.set()
+            ordered_digest.close()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+            save()
+
+    try:
+        if segments.error is None:
+            ordered_digest.advance()
+    finally:
+        ordered_digest.close()
+
+    if segments.error is not None:
+        if isinstance(segments.error, RemoteFileChanged):
+            for path in (part_path, meta_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        raise segments.error
+    if log:
+        log(f"分段下载完成（{len(threads)} 个连接）: {meta.get('name', '')}")
+    return segments.bytes_done
+
+
+def _can_segment(response, total_size, meta):
+    return (response.status == 200 and total_size >= SEGMENT_MIN_SIZE
+            and response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            and _validator(meta))
+
+
+def download_to_file(http, url, dest_path, headers=None, progress=None, check=None,
+                     log=None, timeout=30, max_segments=MAX_SEGMENTS, digest=None,
+                     validators=None, sniff=None):
+    """下载url到dest_path，支持断点续传；返回dest_path
+
+    http为HTTPConnectionPool；progress(已下载字节数, 总字节数)报告进度（包括
+    续传前已有的部分），可以抛出异常中止下载，此时.part文件保留；
+    check(response)在写入前检查响应，不是所需内容时抛出RejectedResponse；
+    sniff(head)在从头下载时检查文件开头的字节，同样可以抛出RejectedResponse。
+    max_segments为分段下载的最大连接数，为1时不分段；
+    digest为hashlib对象时，下载完成后其中是整个文件内容的摘要；
+    validators为dict时，下载完成后填入服务器返回的etag和last_modified。
+    """
+    part_path, meta_path = part_paths(dest_path)
+    meta = _load_meta(meta_path)
+    offset = _resume_offset(part_path, meta, url)
+    headers = dict(headers or {})
+
+    # 上次是分段下载：只下载缺少的段（已完成的段不一定连续，不能按长度续传）
+    if meta.get('pieces') is not None:
+        offset = 0
+        if (meta.get('url') == url and _validator(meta) and meta.get('total')
+                and _file_size(part_path) == meta['total']):
+            segments = _Segments(meta['total'], meta.get('piece_size', PIECE_SIZE), meta['pieces'])
+            if log:
+                log(f"继续分段下载（已完成 {segments.bytes_done / 1024 / 1024:.1f} MB）: {meta['name']}")
+            downloaded = _download_segmented(http, url, headers, part_path, meta_path, meta,
+                                             segments, progress, log, max_segments,
+                                             timeout=timeout, digest=digest)
+            return _complete(part_path, meta_path, dest_path, downloaded, meta['total'],
+                             meta, validators)
+
+    request_headers = dict(headers)
+    if offset:
+        request_headers['Range'] = f'bytes={offset}-'
+        request_headers['If-Range'] = _validator(meta)
+
+    try:
+        response = http.open(url, headers=request_headers, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # 请求的范围无效（服务器上的文件变短了），从头下载
+        discard_partial(dest_path)
+        request_headers = dict(headers)
+        offset = 0
+        response = http.open(url, headers=request_headers, timeout=timeout)
+
+    with response:
+        total_size = 0
+        match = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+        if response.status == 206 and offset and match and int(match.group(1)) == offset:
+            if match.group(3) != '*':
+                total_size = int(match.group(3))
+            elif _body_length(response) is not None:
+                # 总长度未知，但范围一直到文件末尾：按响应体长度检查是否下载完整
+                # （readinto遇到连接提前关闭不会报错，只返回0）
+                total_size = offset + _body_length(response)
+            if log:
+                log(f"从 {offset / 1024 / 1024:.1f} MB 处继续下载: {os.path.basename(dest_path)}")
+        else:
+            # 不支持Range或文件已变化，服务器返回了完整内容
+            offset = 0
+            total_size = int(response.headers.get('Content-Length') or 0)
+
+        try:
+            if check:
+                check(response)
+            if sniff and not offset:
+                head = _read_head(response, SNIFF_BYTES)
+                sniff(head)
+                response = _PrefixedResponse(response, head)
+        except RejectedResponse:
+            discard_partial(dest_path)
+            raise
+
+        meta = {
+            'url': url,
+            'name': os.path.basename(dest_path),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'total': total_size,
+            'bytes': offset,
+        }
+
+        if max_segments > 1 and _can_segment(response, total_size, meta):
+            # 当前响应用作第一段，其余段由新连接并行下载
+            meta['piece_size'] = PIECE_SIZE
+            meta['pieces'] = []
+            with open(part_path, 'wb') as f:
+                _preallocate(f, total_size)
+            _save_meta(meta_path, meta)
+            segments = _Segments(total_size, PIECE_SIZE, [])
+            downloaded = _download_segmented(http, url, headers, part_path, meta_path, meta,
+                                             segments, progress, log, max_segments,
+                                             first_response=response, timeout=timeout,
+                                             digest=digest)
+            return _complete(part_path, meta_path, dest_path, downloaded, total_size,
+                             meta, validators)
+
+        _save_meta(meta_path, meta)
+        downloaded = offset
+        try:
+            with open(part_path, 'r+b' if offset else 'wb') as f:
+                if digest is not None and offset:
+                    # 续传：先补算已下载部分的摘要
+                    _hash_file(digest, f, 0, offset)
+                f.seek(offset)
+                f.truncate()
+                if total_size:
+                    _preallocate(f, total_size)
+
+                buffer = _ChunkBuffer()
+                next_save = time.monotonic() + META_SAVE_INTERVAL
+                while True:
+                    data = buffer.read_from(response)
+                    if not data:
+                        break
+                    f.write(data)
+                    if digest is not None:
+                        digest.update(data)
+                    downloaded += len(data)
+                    if progress:
+                        progress(downloaded, total_size)
+                    if time.monotonic() >= next_save:
+                        # 先把数据写入文件再记录字节数
+                        f.flush()
+                        meta['bytes'] = downloaded
+                        _save_meta(meta_path, meta)
+                        next_save = time.monotonic() + META_SAVE_INTERVAL
+        except IncompleteRead as e:
+            # 分块传输没有收到结尾的空块
+            raise IncompleteDownload(f"下载不完整（{downloaded} 字节），下次将继续下载") from e
+        finally:
+            meta['bytes'] = downloaded
+            _save_meta(meta_path, meta)
+
+    return _complete(part_path, meta_path, dest_path, downloaded, total_size,
+                     meta, validators)
+
+
+def _complete(part_path, meta_path, dest_path, downloaded, total_size, meta, validators):
+    """长度一致时把.part文件重命名为目标文件
+
+    total_size为0（长度未知）时，响应体已由分块传输的结尾或服务器关闭连接
+    正常结束。
+    """
+    if total_size and downloaded != total_size:
+        raise IncompleteDownload(f"下载不完整（{downloaded}/{total_size} 字节），下次将继续下载")
+
+    os.replace(part_path, dest_path)
+    try:
+        os.remove(meta_path)
+    except OSError:
+        pass
+    if validators is not None:
+        validators['etag'] = meta.get('etag')
+        validators['last_modified'] = meta.get('last_modified')
+    return dest_path
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP连接池
+按(协议, 主机, 端口)保存空闲的keep-alive连接，下载同一站点的多个文件时
+不必每次重新解析域名、建立TCP连接和完成TLS握手。所有HTTPS连接共用一个
+SSLContext，并复用TLS会话。
+
+证书校验始终开启。某个站点的证书无法校验时（部分资料链接使用自签名证书），
+只有该站点在允许列表中（insecure_hosts），或confirm_insecure回调询问用户后
+同意，才对这一个站点改用不校验证书的连接；否则请求照常失败。
+"""
+
+import http.client
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, OrderedDict, defaultdict, deque
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# 每个站点最多保留的空闲连接数，以及空闲连接的最长保留时间（秒）
+MAX_IDLE_PER_HOST = 8
+IDLE_TIMEOUT = 60
+
+MAX_REDIRECTS = 10
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# 复用的空闲连接可能已被服务器关闭，遇到这些错误时换新连接重试一次
+STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+
+
+def _insecure_context():
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class PoolStats:
+    """连接池统计"""
+
+    def __init__(self, requests, new_connections, reused, handshake_time):
+        self.requests = requests
+        self.new_connections = new_connections
+        self.reused = reused
+        self.handshake_time = handshake_time    # 建立新连接（TCP+TLS）的总耗时
+
+    @property
+    def reuse_rate(self):
+        total = self.new_connections + self.reused
+        return self.reused / total if total else 0.0
+
+    @property
+    def saved_time(self):
+        """复用连接省下的握手时间（按新连接的平均握手耗时估算）"""
+        if not self.new_connections:
+            return 0.0
+        return self.reused * self.handshake_time / self.new_connections
+
+    def summary(self):
+        return (f"连接复用率 {self.reuse_rate * 100:.0f}%"
+                f"（新建 {self.new_connections}，复用 {self.reused}），"
+                f"节省握手时间约 {self.saved_time:.1f} 秒")
+
+
+class _PooledHTTPSConnection(http.client.HTTPSConnection):
+    """复用TLS会话的HTTPS连接"""
+
+    def __init__(self, host, port, pool, session_key, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self._pool = pool
+        self._session_key = session_key
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._context.wrap_socket(
+            self.sock, server_hostname=server_hostname,
+            session=self._pool._tls_sessions.get(self._session_key))
+
+    def remember_session(self):
+        """保存TLS会话（TLS 1.3的会话票据在读取响应后才会到达）"""
+        session = getattr(self.sock, 'session', None)
+        if session is not None:
+            self._pool._tls_sessions[self._session_key] = session
+
+
+class PooledResponse:
+    """连接池返回的响应
+
+    与urlopen的返回值用法相同（status、headers、read、readinto、with语句）；
+    响应体读完后连接自动放回池中，提前关闭则丢弃连接。
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        if not data or self._response.isclosed():
+            self._release()
+        return data
+
+    def readinto(self, buffer):
+        count = self._response.readinto(buffer)
+        if not count or self._response.isclosed():
+            self._release()
+        return count
+
+    def _release(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._response.isclosed() and not self._response.will_close:
+            # 本次请求可能用了不同的超时，放回池中前恢复连接池的默认值
+            self._pool._set_timeout(conn, self._pool.timeout)
+            self._pool._put_idle(self._key, conn)
+        else:
+            conn.close()
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._response.isclosed():
+            self._release()
+        else:
+            # 响应体未读完，连接上还有剩余数据，不能复用
+            self._response.close()
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HTTPConnectionPool:
+    """keep-alive连接池（线程安全）"""
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST, timeout=30, log=None,
+                 insecure_hosts=()):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self.log = log
+        # confirm_insecure(主机名, 原因)在证书无法校验时调用（工作线程中），返回是否
+        # 对该站点不校验证书；未设置时不降级
+        self.confirm_insecure = None
+        self.context = ssl.create_default_context()
+        self._insecure_context = _insecure_context()
+        self._insecure_hosts = {host.lower() for host in insecure_hosts}
+        self._refused_hosts = set()
+        self._confirm_lock = threading.Lock()   # 同一时间只询问一次
+        self._tls_sessions = {}
+        self._idle = defaultdict(list)   # key -> [(放回时间, 连接)]
+        self._lock = threading.Lock()
+
+        self._requests = 0
+        self._new_connections = 0
+        self._reused = 0
+        self._handshake_time = 0.0
+
+    def stats(self):
+        with self._lock:
+            return PoolStats(self._requests, self._new_connections,
+                             self._reused, self._handshake_time)
+
+    def allow_insecure(self, host):
+        """把站点加入允许不校验证书的列表"""
+        with self._lock:
+            self._insecure_hosts.add(host.lower())
+            self._refused_hosts.discard(host.lower())
+
+    def _may_skip_verification(self, host, error):
+        """证书无法校验时决定是否对该站点不校验证书（每个站点只询问一次）"""
+        with self._confirm_lock:
+            with self._lock:
+                if host in self._insecure_hosts:
+                    return True
+                if host in self._refused_hosts:
+                    return False
+            allowed = bool(self.confirm_insecure
+                           and self.confirm_insecure(host, error.verify_message))
+            with self._lock:
+                (self._insecure_hosts if allowed else self._refused_hosts).add(host)
+        if self.log:
+            self.log(f"{host} 的证书无法校验（{error.verify_message}），"
+                     + ("已允许该站点不校验证书" if allowed else "不下载该站点的文件"))
+        return allowed
+
+    def close(self):
+        """关闭全部空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, defaultdict(list)
+        for conns in idle.values():
+            for _, conn in conns:
+                conn.close()
+
+    def _proxy_for(self, scheme, host):
+        proxies = urllib.request.getproxies()
+        proxy = proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        parsed = urllib.parse.urlsplit(proxy if '://' in proxy else f'http://{proxy}')
+        return parsed.hostname, parsed.port or 80
+
+    def _set_timeout(self, conn, timeout):
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    def _new_connection(self, key, timeout):
+        scheme, host, port = key
+        proxy = self._proxy_for(scheme, host)
+        if scheme == 'https':
+            context = self._insecure_context if host in self._insecure_hosts else self.context
+            if proxy:
+                conn = _PooledHTTPSConnection(proxy[0], proxy[1], self, key,
+                                              timeout=timeout, context=context)
+                conn.set_tunnel(host, port)
+            else:
+                conn = _PooledHTTPSConnection(host, port, self, key,
+                                              timeout=timeout, context=context)
+        elif proxy:
+            conn = http.client.HTTPConnection(proxy[0], proxy[1], timeout=timeout)
+            conn.absolute_urls = True
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+        start = time.perf_counter()
+        conn.connect()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._new_connections += 1
+            self._handshake_time += elapsed
+        return conn
+
+    def _get_connection(self, key, timeout):
+        """取空闲连接（设置为本次请求的超时），没有则新建；返回(连接, 是否复用)"""
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                released, conn = idle.pop()
+                if now - released < IDLE_TIMEOUT and conn.sock is not None:
+                    self._reused += 1
+                    break
+                conn.close()
+            else:
+                conn = None
+        if conn is None:
+            return self._new_connection(key, timeout), False
+        self._set_timeout(conn, timeout)
+        return conn, True
+
+    def _put_idle(self, key, conn):
+        if isinstance(conn, _PooledHTTPSConnection):
+            conn.remember_session()
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) < self.max_idle_per_host:
+                idle.append((time.monotonic(), conn))
+                return
+        conn.close()
+
+    def _send(self, key, method, target, headers, url, timeout):
+        """在一个连接上发送请求，复用的连接已失效时换新连接重试一次
+
+        timeout用于建立连接、发送请求和等待响应头，也用于之后读取响应体
+        """
+        for attempt in range(2):
+            try:
+                conn, reused = self._get_connection(key, timeout)
+            except ssl.SSLCertVerificationError as e:
+                if not self._may_skip_verification(key[1], e):
+                    raise
+                conn, reused = self._new_connection(key, timeout), False
+
+            request_target = url if getattr(conn, 'absolute_urls', False) else target
+            try:
+                conn.request(method, request_target, headers=headers)
+                return conn, conn.getresponse()
+            except STALE_ERRORS:
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+    def open(self, url, headers=None, method='GET', timeout=None, follow_redirects=True):
+        """发送请求并返回PooledResponse；状态码>=400时抛出HTTPError（与urlopen一致）"""
+        request_headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'identity'}
+        request_headers.update(headers or {})
+
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            scheme = parts.scheme.lower()
+            if scheme not in ('http', 'https'):
+                raise ValueError(f"不支持的链接: {url}")
+            port = parts.port or (443 if scheme == 'https' else 80)
+            key = (scheme, parts.hostname.lower(), port)
+            target = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+
+            with self._lock:
+                self._requests += 1
+            conn, response = self._send(key, method, target, request_headers, url,
+                                        self.timeout if timeout is None else timeout)
+            result = PooledResponse(self, key, conn, response, url)
+
+            if follow_redirects and response.status in REDIRECT_CODES:
+                location = response.getheader('Location')
+                # 读完重定向响应的内容，连接可以继续使用
+                result.read()
+                result.close()
+                if not location:
+                    raise urllib.error.HTTPError(url, response.status, "重定向缺少Location",
+                                                 response.headers, None)
+                url = urllib.parse.urljoin(url, location)
+                if response.status == 303:
+                    method = 'GET'
+                continue
+
+            if response.status >= 400:
+                result.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, None)
+            return result
+
+        raise urllib.error.HTTPError(url, 310, "重定向次数过多", None, None)
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool():
+    """进程内共用的连接池"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = HTTPConnectionPool()
+        return _shared_pool
+
+
+def for_each_per_host(items, url_of, func, workers, per_host, stop_event=None):
+    """用最多workers个线程对items逐个调用func(item)，阻塞到全部完成
+
+    同一站点（url_of(item)的主机名）同时最多per_host个；空闲的线程从还有名额的
+    站点中轮流取下一个，不会因为排在前面的站点已满而等待；stop_event置位后不再
+    开始新的
+    """
+    pending = OrderedDict()     # 主机名 -> 未开始的项目
+    for item in items:
+        host = urllib.parse.urlsplit(url_of(item)).netloc.lower()
+        pending.setdefault(host, deque()).append(item)
+    count = sum(len(waiting) for waiting in pending.values())
+    running = Counter()
+    cond = threading.Condition()
+
+    def take():
+        """取出下一个可以开始的项目，返回(主机名, 项目)；没有了返回(None, None)"""
+        with cond:
+            while pending and not (stop_event is not None and stop_event.is_set()):
+                for host, waiting in pending.items():
+                    if running[host] < per_host:
+                        item = waiting.popleft()
+                        if waiting:
+                            pending.move_to_end(host)
+                        else:
+                            del pending[host]
+                        running[host] += 1
+                        return host, item
+                # 剩下的站点都已满：等其中一个完成（定时醒来检查stop_event）
+                cond.wait(0.2)
+            return None, None
+
+    def worker():
+        while True:
+            host, item = take()
+            if host is None:
+                return
+            try:
+                func(item)
+            finally:
+                with cond:
+                    running[host] -= 1
+                    cond.notify_all()
+
+    threads = [threading.Thread(target=worker, daemon=True)
+               for _ in range(min(workers, count))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+链接检查
+导入后并发检查每个资料链接（HEAD请求；服务器不支持HEAD时改用Range: bytes=0-0
+的GET），不下载内容就能知道链接是媒体文件、网页还是已失效，以及文件大小、
+类型和重定向后的最终地址。
+结果保存在媒体目录数据库中，有效期内直接使用；过期后带上ETag/Last-Modified
+重新检查，服务器返回304时沿用原结果。
+"""
+
+import http.client
+import threading
+import time
+import urllib.error
+from collections import Counter
+
+from http_pool import for_each_per_host
+
+
+# 并发数（总数和每个站点），单个请求的超时（秒），以及结果的有效期（秒）
+PROBE_WORKERS = 8
+PROBE_PER_HOST = 4
+PROBE_TIMEOUT = 15
+PROBE_TTL = 6 * 3600
+
+# 链接类型
+MEDIA = '媒体文件'
+REDIRECTED = '重定向'       # 经重定向到达的媒体文件
+PAGE = '网页'
+BROKEN = '失效'
+
+DOWNLOADABLE = (MEDIA, REDIRECTED)
+
+# 服务器不支持HEAD（或签名链接只允许GET）时常见的状态码
+HEAD_UNSUPPORTED = (403, 405, 501)
+# 小于这个大小的不是媒体文件（错误提示页之类）
+MIN_MEDIA_SIZE = 1024
+PAGE_TYPES = ('text/html', 'application/xhtml')
+ERROR_TYPES = ('text/', 'application/json', 'application/xml')
+
+
+def format_size(size):
+    """把字节数显示为KB/MB/GB"""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+class ProbeResult:
+    """一个链接的检查结果"""
+
+    FIELDS = ('url', 'kind', 'status', 'size', 'content_type', 'final_url',
+              'etag', 'last_modified', 'probed_at', 'error')
+
+    def __init__(self, url, kind, status=0, size=None, content_type='', final_url=None,
+                 etag=None, last_modified=None, probed_at=None, error=''):
+        self.url = url
+        self.kind = kind
+        self.status = status
+        self.size = size
+        self.content_type = content_type
+        self.final_url = final_url or url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.probed_at = time.time() if probed_at is None else probed_at
+        self.error = error
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{field: row[field] for field in cls.FIELDS})
+
+    def as_row(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @property
+    def downloadable(self):
+        return self.kind in DOWNLOADABLE
+
+    def fresh(self, ttl=PROBE_TTL, now=None):
+        return (time.time() if now is None else now) - self.probed_at < ttl
+
+
+def classify(status, content_type, size, redirected):
+    """按状态码、内容类型和大小判断链接类型"""
+    if status >= 400:
+        return BROKEN
+    if content_type.startswith(PAGE_TYPES):
+        return PAGE
+    if content_type.startswith(ERROR_TYPES):
+        return BROKEN
+    if size is not None and size < MIN_MEDIA_SIZE:
+        return BROKEN
+    return REDIRECTED if redirected else MEDIA
+
+
+def _content_size(response):
+    """文件总大小：Range请求看Content-Range，否则看Content-Length"""
+    content_range = response.headers.get('Content-Range', '')
+    if response.status == 206 and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+def probe_link(pool, url, cached=None, timeout=PROBE_TIMEOUT):
+    """检查一个链接，返回ProbeResult（不抛出异常）
+
+    pool为HTTPConnectionPool；cached为过期的旧结果时发送条件请求
+    """
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+    try:
+        try:
+            response = pool.open(url, headers=headers, method='HEAD', timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code not in HEAD_UNSUPPORTED:
+                raise
+            # 只取第一个字节，从Content-Range得到总大小
+            response = pool.open(url, headers=dict(headers, Range='bytes=0-0'), timeout=timeout)
+
+        with response:
+            if response.status == 304 and cached is not None:
+                return ProbeResult(**dict(cached.as_row(), probed_at=time.time()))
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            size = _content_size(response)
+            redirected = response.url != url
+            if response.status == 206:
+                response.read()  # 只有一个字节，读完后连接可以复用
+            return ProbeResult(
+                url, classify(response.status, content_type, size, redirected),
+                status=response.status, size=size, content_type=content_type,
+                final_url=response.url, etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'))
+    except urllib.error.HTTPError as e:
+        return ProbeResult(url, BROKEN, status=e.code, error=str(e.reason))
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        return ProbeResult(url, BROKEN, error=str(e) or type(e).__name__)
+
+
+class ProbeSummary:
+    """一次检查的统计"""
+
+    def __init__(self, results, cached, elapsed, cancelled):
+        self.results = results
+        self.counts = Counter(result.kind for result in results)
+        self.cached = cached
+        self.elapsed = elapsed
+        self.cancelled = cancelled
+
+    @property
+    def download_bytes(self):
+        """可下载链接的已知总大小"""
+        return sum(result.size or 0 for result in self.results if result.downloadable)
+
+    @property
+    def unknown_sizes(self):
+        return sum(1 for result in self.results if result.downloadable and result.size is None)
+
+    def summary(self):
+        kinds = '，'.join(f"{kind} {self.counts[kind]}" for kind in (MEDIA, REDIRECTED, PAGE, BROKEN)
+                         if self.counts[kind])
+        return (f"检查了 {len(self.results)} 个链接（{kinds or '无'}；其中 {self.cached} 个使用缓存结果），"
+                f"耗时 {self.elapsed:.1f} 秒")
+
+
+class LinkProber:
+    """并发检查一批链接，结果写入目录数据库（MediaCatalog）"""
+
+    def __init__(self, pool, catalog, workers=PROBE_WORKERS, per_host=PROBE_PER_HOST,
+                 ttl=PROBE_TTL):
+        self.pool = pool
+        self.catalog = catalog
+        self.workers = workers
+        self.per_host = per_host
+        self.ttl = ttl
+        self.cancel_event = threading.Event()
+
+    def cached_results(self):
+        """数据库中的全部检查结果：{链接: ProbeResult}（包括过期的）"""
+        return {row['url']: ProbeResult.from_row(row) for row in self.catalog.probes()}
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self, urls, on_result=None):
+        """检查全部链接（阻塞到结束），返回ProbeSummary
+
+        on_result(result)在检查线程中逐个调用
+        """
+        self.cancel_event.clear()
+        start = time.perf_counter()
+        urls = list(dict.fromkeys(url for url in urls if url))
+        cached = self.cached_results()
+        results = []
+        reused = 0
+        pending = []
+        for url in urls:
+            result = cached.get(url)
+            if result is not None and result.fresh(self.ttl):
+                reused += 1
+                results.append(result)
+                if on_result:
+                    on_result(result)
+            else:
+                pending.append((url, result))
+
+        lock = threading.Lock()
+
+        def probe(item):
+            url, stale = item
+            result = probe_link(self.pool, url, stale)
+            self.catalog.put_probe(result.as_row())
+            with lock:
+                results.append(result)
+            if on_result:
+                on_result(result)
+
+        for_each_per_host(pending, lambda item: item[0], probe, self.workers, self.per_host,
+                          self.cancel_event)
+        return ProbeSummary(results, reused, time.perf_counter() - start,
+                            self.cancel_event.is_set())
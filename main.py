@@ -7,18 +7,26 @@ CSV作品播放器
 
 import sys
 import os
-import csv
+import time
+import threading
 import webbrowser
 from urllib.parse import urlparse
 
+from catalog_snapshot import file_fingerprint, load_snapshot, save_snapshot_in_background
+from catalog_store import CatalogStore, MappedCatalog
+from csv_loader import MappedCSV, iter_import_batches, open_stream
+from search_index import NGramIndex, SearchWorker
+
 
 try:
     from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
-                                QWidget, QPushButton, QTableWidget, QTableWidgetItem, 
+                                QWidget, QPushButton, QTableView, QAbstractItemView,
                                 QFileDialog, QMessageBox, QLabel, QLineEdit, QProgressBar,
                                 QHeaderView, QSplitter, QTextEdit, QGroupBox, QGridLayout,
                                 QFrame, QStatusBar)
-    from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QUrl
+    from PyQt5.QtCore import (Qt, QThread, pyqtSignal, QTimer, QUrl,
+                              QAbstractTableModel, QModelIndex, QVariant,
+                              QSortFilterProxyModel)
     from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
     from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
     from PyQt5.QtMultimediaWidgets import QVideoWidget
@@ -29,16 +37,159 @@ except ImportError:
 
 
 
+def playable_row(row_number, row, columns):
+    """只保留有作品名称和资料链接的记录"""
+    if row.get('作品名称') and row.get('资料链接'):
+        return row
+    return None
+
+
+class CSVImportThread(QThread):
+    """后台导入线程：分批读取CSV并同时建立搜索索引"""
+    
+    batch_loaded = pyqtSignal(object)  # ImportBatch
+    failed = pyqtSignal(str)
+    
+    def __init__(self, stream, parent=None):
+        super().__init__(parent)
+        self.stream = stream  # CSVStream或MappedCSV
+        self.cancel_event = threading.Event()
+        
+    def cancel(self):
+        """取消导入"""
+        self.cancel_event.set()
+        
+    def run(self):
+        try:
+            for batch in iter_import_batches(
+                    self.stream, transform=playable_row,
+                    index_fields=SEARCH_FIELDS,
+                    cancel_event=self.cancel_event):
+                self.batch_loaded.emit(batch)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class CatalogTableModel(QAbstractTableModel):
+    """作品列表数据模型（按需渲染，不为每个单元格创建对象）"""
+    
+    # (表头, CSV列名)
+    COLUMNS = [
+        ("作品名称", "作品名称"),
+        ("参赛者", "身份证名字"),
+        ("组别", "参赛者组别"),
+        ("指导老师", "指导老师"),
+        ("推送单位", "推送单位学校"),
+        ("资料链接", "资料链接"),
+    ]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = CatalogStore()
+        
+    def set_rows(self, rows):
+        """整体替换数据（CatalogStore，只重置模型，不逐行插入）"""
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+        
+    def append_rows(self, rows):
+        """追加数据（流式导入时分批调用）"""
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+        
+    def row_data(self, source_row):
+        """按源数据行号取记录"""
+        if 0 <= source_row < len(self._rows):
+            return self._rows[source_row]
+        return None
+        
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+        
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+        
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            key = self.COLUMNS[index.column()][1]
+            return self._rows.value(index.row(), key)
+        return QVariant()
+        
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return self.COLUMNS[section][0]
+        return section + 1
+
+
+# 目录中保留的列：表格显示的列加上详情面板用到的联系电话
+CATALOG_FIELDS = [key for _, key in CatalogTableModel.COLUMNS] + ['联系电话']
+
+# 参与搜索的列（链接几乎都是不重复的字符，建索引代价大且很少按链接搜索）
+SEARCH_FIELDS = [key for _, key in CatalogTableModel.COLUMNS if key != '资料链接']
+
+# 目录快照的类别名
+SNAPSHOT_PROFILE = 'player'
+
+
+class CatalogFilterProxyModel(QSortFilterProxyModel):
+    """按搜索结果过滤的代理模型（可见行集合一次性批量应用）"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._visible = None
+        
+    def set_visible_rows(self, row_ids):
+        """设置可见的源数据行号；None表示全部可见"""
+        if row_ids is None:
+            self._visible = None
+        else:
+            mask = bytearray(self.sourceModel().rowCount())
+            for row_id in row_ids:
+                mask[row_id] = 1
+            self._visible = mask
+        self.invalidateFilter()
+        
+    def filterAcceptsRow(self, source_row, source_parent):
+        # 可见集合之后追加的行（导入中）暂不显示，导入完成后重新过滤
+        visible = self._visible
+        return visible is None or (source_row < len(visible) and bool(visible[source_row]))
+
 
 class CSVPlayer(QMainWindow):
     """CSV作品播放器主窗口"""
     
+    # 后台搜索结果（由搜索线程发出，经队列连接回到主线程）
+    search_results_ready = pyqtSignal(int, object)
+    # 后台保存快照的结果（由保存线程发出），附加在状态栏的消息后面
+    snapshot_message = pyqtSignal(str)
+    
     def __init__(self):
         super().__init__()
-        self.csv_data = []
+        self.csv_data = CatalogStore(CATALOG_FIELDS)
+        self.search_index = NGramIndex()
+        self.import_thread = None
+        self.import_started = 0
+        self.first_batch_time = None
+        self.import_file_path = None
+        self.import_fingerprint = None
         
         self.init_ui()
         self.setup_media_player()
+        self.setup_search_worker()
+        self.snapshot_message.connect(self.on_snapshot_message)
         
     def init_ui(self):
         """初始化用户界面"""
@@ -65,12 +216,12 @@ class CSVPlayer(QMainWindow):
             QPushButton:pressed {
                 background-color: #3d8b40;
             }
-            QTableWidget {
+            QTableView {
                 gridline-color: #d0d0d0;
                 background-color: white;
                 alternate-background-color: #f9f9f9;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #2196F3;
                 color: white;
             }
@@ -119,6 +270,13 @@ class CSVPlayer(QMainWindow):
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("准备就绪 - 请导入CSV文件")
         
+        # 导入进度
+        self.import_progress = QProgressBar()
+        self.import_progress.setRange(0, 100)
+        self.import_progress.setFixedWidth(200)
+        self.import_progress.hide()
+        self.status_bar.addPermanentWidget(self.import_progress)
+        
     def create_control_panel(self):
         """创建顶部控制面板"""
         group = QGroupBox("文件操作")
@@ -129,6 +287,11 @@ class CSVPlayer(QMainWindow):
         self.import_btn.clicked.connect(self.import_csv)
         layout.addWidget(self.import_btn)
         
+        self.cancel_import_btn = QPushButton("⏹️ 取消导入")
+        self.cancel_import_btn.clicked.connect(self.cancel_import)
+        self.cancel_import_btn.setEnabled(False)
+        layout.addWidget(self.cancel_import_btn)
+        
         # 文件信息标签
         self.file_info_label = QLabel("未导入文件")
         self.file_info_label.setStyleSheet("color: #666; font-size: 12px;")
@@ -142,7 +305,7 @@ class CSVPlayer(QMainWindow):
         
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("输入作品名称或参赛者姓名...")
-        self.search_input.textChanged.connect(self.filter_table)
+        self.search_input.textChanged.connect(self.on_search_text_changed)
         self.search_input.setFixedWidth(300)
         layout.addWidget(self.search_input)
         
@@ -153,17 +316,25 @@ class CSVPlayer(QMainWindow):
         group = QGroupBox("作品列表")
         layout = QVBoxLayout(group)
         
-        # 作品表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels([
-            "作品名称", "参赛者", "组别", "指导老师", "推送单位", "资料链接"
-        ])
+        # 作品表格（模型/视图：视图只绘制可见行，排序经过代理模型）
+        self.table_model = CatalogTableModel(self)
+        self.proxy_model = CatalogFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.table_model)
+        
+        self.table = QTableView()
+        self.table.setModel(self.proxy_model)
         
         # 设置表格属性
         self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.AscendingOrder)  # 初始保持CSV原始顺序
+        
+        # 固定行高，避免大数据量时逐行计算尺寸
+        vertical_header = self.table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(24)
         
         # 设置列宽
         header = self.table.horizontalHeader()
@@ -175,7 +346,10 @@ class CSVPlayer(QMainWindow):
         header.resizeSection(4, 150)  # 推送单位
         
         # 双击播放
-        self.table.cellDoubleClicked.connect(self.play_video)
+        self.table.doubleClicked.connect(self.play_video)
+        
+        # 选择改变时更新信息
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
         layout.addWidget(self.table)
         
@@ -244,64 +418,189 @@ class CSVPlayer(QMainWindow):
         self.media_player.stateChanged.connect(self.on_media_state_changed)
         self.media_player.error.connect(self.on_media_error)
         
+    def setup_search_worker(self):
+        """启动后台搜索线程"""
+        self.search_results_ready.connect(self.on_search_results)
+        self.search_worker = SearchWorker(
+            self.search_index, self.search_results_ready.emit)
+        self.search_worker.start()
+        
     def import_csv(self):
         """导入CSV文件"""
         file_path, _ = QFileDialog.getOpenFileName(
             self, "选择CSV文件", "", "CSV files (*.csv)")
         
         if file_path:
-            try:
-                self.load_csv_data(file_path)
-                self.populate_table()
-                self.file_info_label.setText(f"已导入: {os.path.basename(file_path)} ({len(self.csv_data)} 条记录)")
-                self.status_bar.showMessage(f"成功导入 {len(self.csv_data)} 条作品记录")
-                self.play_btn.setEnabled(True)
-                self.open_link_btn.setEnabled(True)
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"导入CSV文件失败:\n{str(e)}")
+            self.load_csv_data(file_path)
                 
     def load_csv_data(self, file_path):
-        """加载CSV数据"""
-        self.csv_data = []
-        
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # 只保留有作品名称和资料链接的记录
-                if row.get('作品名称') and row.get('资料链接'):
-                    self.csv_data.append(row)
-                    
-    def populate_table(self):
-        """填充表格数据"""
-        self.table.setRowCount(len(self.csv_data))
-        
-        for row, data in enumerate(self.csv_data):
-            self.table.setItem(row, 0, QTableWidgetItem(data.get('作品名称', '')))
-            self.table.setItem(row, 1, QTableWidgetItem(data.get('身份证名字', '')))
-            self.table.setItem(row, 2, QTableWidgetItem(data.get('参赛者组别', '')))
-            self.table.setItem(row, 3, QTableWidgetItem(data.get('指导老师', '')))
-            self.table.setItem(row, 4, QTableWidgetItem(data.get('推送单位学校', '')))
-            self.table.setItem(row, 5, QTableWidgetItem(data.get('资料链接', '')))
+        """在后台线程中流式加载CSV数据，分批显示"""
+        self.abandon_import()
+        
+        # 文件未变化时直接映射上次保存的目录快照
+        self.import_started = time.perf_counter()
+        snapshot = load_snapshot(file_path, SNAPSHOT_PROFILE, CATALOG_FIELDS, SEARCH_FIELDS)
+        if snapshot is not None:
+            self.show_snapshot(file_path, snapshot)
+            return
+        
+        try:
+            self.import_fingerprint = file_fingerprint(file_path)
+            stream = open_stream(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导入CSV文件失败:\n{str(e)}")
+            return
+        self.import_file_path = file_path
+        
+        # 导入过程中先显示全部行，导入完成并建好索引后再应用搜索过滤；
+        # 大文件只记录行号，表格显示时再从映射的文件中解码
+        if isinstance(stream, MappedCSV):
+            self.csv_data = MappedCatalog(stream)
+        else:
+            self.csv_data = CatalogStore(CATALOG_FIELDS)
+        self.search_index.build([], [])
+        self.search_worker.cancel()
+        self.table_model.set_rows(self.csv_data)
+        self.proxy_model.set_visible_rows(None)
+        
+        self.import_file_name = os.path.basename(file_path)
+        self.first_batch_time = None
+        
+        self.import_thread = CSVImportThread(stream, self)
+        self.import_thread.batch_loaded.connect(self.on_import_batch)
+        self.import_thread.failed.connect(self.on_import_failed)
+        self.import_thread.start()
+        
+        self.cancel_import_btn.setEnabled(True)
+        self.import_progress.setValue(0)
+        self.import_progress.show()
+        self.file_info_label.setText(f"正在导入: {self.import_file_name}")
+        self.status_bar.showMessage("正在导入...")
+        
+    def show_snapshot(self, file_path, snapshot):
+        """显示从快照载入的目录"""
+        self.csv_data = snapshot.store
+        self.search_index.adopt(snapshot.index)
+        self.table_model.set_rows(self.csv_data)
+        self.filter_table()
+        
+        elapsed = time.perf_counter() - self.import_started
+        self.file_info_label.setText(f"已导入: {os.path.basename(file_path)} ({len(self.csv_data)} 条记录)")
+        self.status_bar.showMessage(
+            f"成功导入 {len(self.csv_data)} 条作品记录（来自缓存快照，耗时 {elapsed * 1000:.0f} ms）")
+        self.play_btn.setEnabled(True)
+        self.open_link_btn.setEnabled(True)
+        
+    def cancel_import(self):
+        """取消正在进行的导入"""
+        if self.import_thread is not None:
+            self.import_thread.cancel()
             
-        # 选择改变时更新信息
-        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
+    def abandon_import(self):
+        """取消正在进行的导入并丢弃它之后送来的数据（改为载入另一个文件时）
+
+        旧线程已排队的信号仍会送达，import_thread清空后由sender()检查丢弃，
+        不会追加到新的目录中
+        """
+        thread = self.import_thread
+        if thread is None:
+            return
+        self.import_thread = None
+        thread.cancel()
+        thread.batch_loaded.disconnect(self.on_import_batch)
+        thread.failed.disconnect(self.on_import_failed)
+        self.cancel_import_btn.setEnabled(False)
+        self.import_progress.hide()
+            
+    def on_import_batch(self, batch):
+        """导入线程送来一批数据"""
+        if self.sender() is not self.import_thread:
+            return  # 已被新的导入取代
+            
+        self.table_model.append_rows(batch.items)
+        self.import_progress.setValue(int(batch.progress))
         
+        if self.first_batch_time is None and self.csv_data:
+            self.first_batch_time = time.perf_counter() - self.import_started
+            self.play_btn.setEnabled(True)
+            self.open_link_btn.setEnabled(True)
+            
+        if not batch.done:
+            self.status_bar.showMessage(
+                f"正在导入... 已读取 {batch.row_count} 行，{len(self.csv_data)} 条作品记录")
+            return
+            
+        # 导入结束
+        self.import_thread = None
+        self.cancel_import_btn.setEnabled(False)
+        self.import_progress.hide()
+        elapsed = time.perf_counter() - self.import_started
+        
+        # 取消时索引只包含已载入的部分，同样可以搜索
+        self.search_index.adopt(batch.index)
+        self.filter_table()
+        
+        if batch.cancelled:
+            self.file_info_label.setText(f"已导入(部分): {self.import_file_name} ({len(self.csv_data)} 条记录)")
+            self.status_bar.showMessage(f"导入已取消，已载入 {len(self.csv_data)} 条作品记录")
+            return
+        
+        # 保存快照，下次导入同一文件时直接载入（内存映射模式本身不复制数据，不保存）
+        if isinstance(self.csv_data, CatalogStore):
+            save_snapshot_in_background(
+                self.import_file_path, SNAPSHOT_PROFILE, self.csv_data, batch.index,
+                SEARCH_FIELDS, batch.columns, batch.row_count, batch.csv_format,
+                fingerprint=self.import_fingerprint, log=self.snapshot_message.emit)
+        
+        first_ms = (self.first_batch_time or elapsed) * 1000
+        self.file_info_label.setText(f"已导入: {self.import_file_name} ({len(self.csv_data)} 条记录)")
+        self.status_bar.showMessage(
+            f"成功导入 {len(self.csv_data)} 条作品记录（共 {batch.row_count} 行，"
+            f"首屏 {first_ms:.0f} ms，总耗时 {elapsed:.1f} s）")
+        
+    def on_snapshot_message(self, message):
+        """显示保存快照的结果，保留导入完成的提示"""
+        current = self.status_bar.currentMessage()
+        self.status_bar.showMessage(f"{current}；{message}" if current else message)
+        
+    def on_import_failed(self, message):
+        """导入失败"""
+        if self.sender() is not self.import_thread:
+            return
+        self.import_thread = None
+        self.cancel_import_btn.setEnabled(False)
+        self.import_progress.hide()
+        QMessageBox.critical(self, "错误", f"导入CSV文件失败:\n{message}")
+        
+    def current_source_row(self):
+        """当前选中行对应的源数据行号（排序后视图行号与数据行号不同）"""
+        index = self.table.currentIndex()
+        if not index.isValid():
+            return -1
+        return self.proxy_model.mapToSource(index).row()
+        
+    def on_search_text_changed(self, text):
+        """输入变化时交给后台线程查询，不阻塞界面"""
+        self.search_worker.submit(text)
+        
+    def on_search_results(self, generation, row_ids):
+        """发布后台查询结果（只接受最新一次输入的结果）"""
+        if self.import_thread is not None:
+            return  # 导入完成后会按当前搜索词重新过滤
+        if generation == self.search_worker.generation:
+            self.proxy_model.set_visible_rows(row_ids)
+            
     def filter_table(self):
-        """过滤表格内容"""
-        search_text = self.search_input.text().lower()
-        
-        for row in range(self.table.rowCount()):
-            match = False
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item and search_text in item.text().lower():
-                    match = True
-                    break
-            self.table.setRowHidden(row, not match)
+        """立即按当前搜索词过滤表格内容"""
+        # 丢弃基于旧数据的后台查询
+        self.search_worker.cancel()
+        # 通过倒排索引得到匹配行，再一次性应用到代理模型
+        row_ids = self.search_index.search(self.search_input.text())
+        self.proxy_model.set_visible_rows(row_ids)
             
     def on_selection_changed(self):
         """选择改变时更新作品信息"""
-        current_row = self.table.currentRow()
+        current_row = self.current_source_row()
         if current_row >= 0 and current_row < len(self.csv_data):
             data = self.csv_data[current_row]
             
@@ -317,13 +616,13 @@ class CSVPlayer(QMainWindow):
             
             self.info_text.setHtml(info_html)
             
-    def play_video(self, row, column):
+    def play_video(self, index):
         """双击播放视频"""
         self.play_selected_video()
         
     def play_selected_video(self):
         """播放选中的视频"""
-        current_row = self.table.currentRow()
+        current_row = self.current_source_row()
         if current_row >= 0 and current_row < len(self.csv_data):
             video_url = self.csv_data[current_row].get('资料链接', '')
             work_name = self.csv_data[current_row].get('作品名称', '未知作品')
@@ -380,7 +679,7 @@ class CSVPlayer(QMainWindow):
         
     def open_in_browser(self):
         """在浏览器中打开视频链接"""
-        current_row = self.table.currentRow()
+        current_row = self.current_source_row()
         if current_row >= 0 and current_row < len(self.csv_data):
             video_url = self.csv_data[current_row].get('资料链接', '')
             if video_url:
@@ -436,6 +735,10 @@ class CSVPlayer(QMainWindow):
         
     def closeEvent(self, event):
         """程序关闭事件"""
+        self.search_worker.stop()
+        if self.import_thread is not None:
+            self.import_thread.cancel()
+            self.import_thread.wait(1000)
         event.accept()
 
 
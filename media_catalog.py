@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体目录数据库（SQLite，WAL模式）
+media表每个链接一行：文件路径、大小、内容摘要、ETag/Last-Modified、下载时间、
+最后一次确认服务器上的文件未变化的时间、最近使用时间和命中次数；objects表每个按摘要保存的文件一行；probes表保存链接
+检查的结果（见link_probe）。
+每次下载或命中只在一个事务中更新相关的行，不再整体重写JSON文件；WAL模式下
+读取不会被写入阻塞，每个线程使用自己的连接。
+
+链接统一按规范化的形式保存和查找（见url_canon），同一资料链接的不同写法
+共用一条记录和一个文件。
+
+第一次打开时自动导入旧版的JSON记录（cache_info.json、download_history.json），
+导入后改名为 *.migrated。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from url_canon import canonical_url
+
+
+DB_FILE = 'media.db'
+MIGRATED_SUFFIX = '.migrated'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    url           TEXT PRIMARY KEY,
+    path          TEXT,
+    digest        TEXT,
+    size          INTEGER,
+    name          TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    downloaded_at REAL,
+    validated_at  REAL,
+    accessed_at   REAL,
+    hits          INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS media_digest ON media(digest);
+CREATE TABLE IF NOT EXISTS objects (
+    digest      TEXT PRIMARY KEY,
+    ext         TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    names       TEXT NOT NULL DEFAULT '[]',
+    accessed_at REAL,
+    hits        INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS probes (
+    url           TEXT PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    status        INTEGER,
+    size          INTEGER,
+    content_type  TEXT,
+    final_url     TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    probed_at     REAL NOT NULL,
+    error         TEXT
+);
+"""
+
+# 旧版数据库缺少的列：(表, 列, 类型)
+ADDED_COLUMNS = [
+    ('media', 'validated_at', 'REAL'),
+]
+# 数据库格式版本（PRAGMA user_version）：1起链接为规范化的形式
+SCHEMA_VERSION = 1
+
+
+class MediaCatalog:
+    """媒体目录数据库（线程安全，每个线程一个连接）"""
+
+    def __init__(self, path, log=None):
+        self.path = path
+        self.log = log
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        for table, column, kind in ADDED_COLUMNS:
+            columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                with conn:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._canonicalize_urls(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _canonicalize_urls(self, conn):
+        """把旧记录中的链接改为规范化的形式（同一链接有多条记录时保留最近下载的）"""
+        rows = conn.execute("SELECT url, downloaded_at FROM media").fetchall()
+        with conn:
+            for row in rows:
+                url = canonical_url(row['url'])
+                if url == row['url']:
+                    continue
+                existing = conn.execute("SELECT downloaded_at FROM media WHERE url = ?",
+                                        (url,)).fetchone()
+                if (existing is not None
+                        and (existing['downloaded_at'] or 0) >= (row['downloaded_at'] or 0)):
+                    conn.execute("DELETE FROM media WHERE url = ?", (row['url'],))
+                else:
+                    conn.execute("DELETE FROM media WHERE url = ?", (url,))
+                    conn.execute("UPDATE media SET url = ? WHERE url = ?", (url, row['url']))
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL模式下NORMAL不会损坏数据库，只是断电时可能丢失最后几个事务
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def files(self):
+        """数据库文件（包括WAL和共享内存文件）"""
+        return [self.path, self.path + '-wal', self.path + '-shm']
+
+    # ---- 链接 ----
+
+    def get(self, url):
+        """链接的记录（含对应文件的扩展名ext），没有时返回None"""
+        return self._connect().execute(
+            "SELECT media.*, objects.ext FROM media "
+            "LEFT JOIN objects ON objects.digest = media.digest WHERE url = ?",
+            (canonical_url(url),)).fetchone()
+
+    def record(self, url, path, size, digest=None, name='', etag=None, last_modified=None):
+        """记录下载完成的链接（已有记录时保留命中次数）"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO media (url, path, digest, size, name, etag, last_modified,"
+                " downloaded_at, validated_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET path = excluded.path, digest = excluded.digest,"
+                " size = excluded.size, name = excluded.name, etag = excluded.etag,"
+                " last_modified = excluded.last_modified, downloaded_at = excluded.downloaded_at,"
+                " validated_at = excluded.validated_at, accessed_at = excluded.accessed_at",
+                (canonical_url(url), path, digest, size, name, etag, last_modified, now, now, now))
+
+    def touch(self, url, digest=None):
+        """记录一次命中"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE media SET accessed_at = ?, hits = hits + 1 WHERE url = ?",
+                         (now, canonical_url(url)))
+            if digest:
+                conn.execute("UPDATE objects SET accessed_at = ?, hits = hits + 1 "
+                             "WHERE digest = ?", (now, digest))
+
+    def mark_validated(self, url, etag=None, last_modified=None):
+        """记录服务器上的文件未变化（同时补上旧记录缺少的校验值）"""
+        with self._connect() as conn:
+            conn.execute("UPDATE media SET validated_at = ?, etag = COALESCE(?, etag),"
+                         " last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                         (time.time(), etag, last_modified, canonical_url(url)))
+
+    def media_rows(self, validated_before=None):
+        """全部链接记录；validated_before为时间戳时只返回此前未确认过的"""
+        if validated_before is None:
+            return self._connect().execute("SELECT * FROM media").fetchall()
+        return self._connect().execute(
+            "SELECT * FROM media WHERE COALESCE(validated_at, downloaded_at, 0) < ?",
+            (validated_before,)).fetchall()
+
+    def forget(self, url):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM media WHERE url = ?", (canonical_url(url),))
+
+    def forget_all(self):
+        """删除全部链接记录（保留文件记录）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM media")
+
+    def urls_by_digest(self):
+        """摘要 -> [链接]"""
+        urls = {}
+        for url, digest in self._connect().execute(
+                "SELECT url, digest FROM media WHERE digest IS NOT NULL"):
+            urls.setdefault(digest, []).append(url)
+        return urls
+
+    # ---- 按摘要保存的文件 ----
+
+    def get_object(self, digest):
+        return self._connect().execute(
+            "SELECT * FROM objects WHERE digest = ?", (digest,)).fetchone()
+
+    def put_object(self, digest, ext, size, name=''):
+        """记录入库的文件；已有记录时只追加名称"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT names FROM objects WHERE digest = ?",
+                               (digest,)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO objects (digest, ext, size, names, accessed_at) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             (digest, ext, size, json.dumps([name] if name else [],
+                                                            ensure_ascii=False), now))
+                return
+            names = json.loads(row['names'])
+            if name and name not in names:
+                names.append(name)
+            conn.execute("UPDATE objects SET ext = ?, size = ?, names = ?, accessed_at = ? "
+                         "WHERE digest = ?",
+                         (ext, size, json.dumps(names, ensure_ascii=False), now, digest))
+
+    def objects(self):
+        return self._connect().execute("SELECT * FROM objects").fetchall()
+
+    def remove_object(self, digest):
+        """删除文件记录及指向它的链接"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+            conn.execute("DELETE FROM media WHERE digest = ?", (digest,))
+
+    def legacy_files(self):
+        """没有摘要的旧版记录（migrate_paths导入的），同一文件的多个链接合为一项"""
+        return self._connect().execute(
+            "SELECT path, MAX(size) AS size, MAX(accessed_at) AS accessed_at,"
+            " SUM(hits) AS hits, GROUP_CONCAT(url, char(10)) AS urls"
+            " FROM media WHERE digest IS NULL GROUP BY path").fetchall()
+
+    def remove_legacy(self, path):
+        """删除指向一个旧版文件的全部链接"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM media WHERE digest IS NULL AND path = ?", (path,))
+
+    def total_size(self):
+        """全部文件的总字节数（包括没有摘要的旧版文件）"""
+        return self.counts()[2]
+
+    def counts(self):
+        """(链接数, 文件数, 文件总字节数)，文件包括没有摘要的旧版文件"""
+        conn = self._connect()
+        urls = conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+        files, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        legacy_files, legacy_size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM"
+            " (SELECT MAX(size) AS size FROM media WHERE digest IS NULL GROUP BY path)").fetchone()
+        return urls, files + legacy_files, size + legacy_size
+
+    # ---- 链接检查结果 ----
+
+    def probes(self):
+        return self._connect().execute("SELECT * FROM probes").fetchall()
+
+    def put_probe(self, probe):
+        """保存一个链接的检查结果（dict，键与probes表的列相同）"""
+        columns = ', '.join(probe)
+        placeholders = ', '.join('?' * len(probe))
+        with self._connect() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO probes ({columns}) VALUES ({placeholders})",
+                         tuple(probe.values()))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM media")
+            conn.execute("DELETE FROM objects")
+
+    # ---- 导入旧版JSON记录 ----
+
+    def _read_legacy(self, json_path):
+        if not os.path.exists(json_path):
+            return None
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            if self.log:
+                self.log(f"读取旧版记录失败 {os.path.basename(json_path)}: {e}")
+            return None
+
+    def _finish_migration(self, json_path, count):
+        try:
+            os.replace(json_path, json_path + MIGRATED_SUFFIX)
+        except OSError:
+            pass
+        if self.log and count:
+            self.log(f"已导入旧版记录 {os.path.basename(json_path)}（{count} 条）")
+
+    def migrate_paths(self, json_path):
+        """导入 {链接: 文件路径} 格式的旧记录（cache_info.json、download_history.json）"""
+        paths = self._read_legacy(json_path)
+        if not isinstance(paths, dict):
+            return
+        now = time.time()
+        rows = []
+        for url, path in paths.items():
+            if isinstance(path, str) and os.path.exists(path):
+                rows.append((canonical_url(url), path, os.path.getsize(path), now, now))
+        with self._connect() as conn:
+            # 已有记录（例如已按摘要入库）优先
+            conn.executemany(
+                "INSERT OR IGNORE INTO media (url, path, size, downloaded_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+        self._finish_migration(json_path, len(rows))
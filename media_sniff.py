@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按文件开头的字节判断媒体类型
+服务器返回的Content-Type经常不可靠：网页、登录页和错误提示常被标成
+application/octet-stream，视频也常没有扩展名。下载开始时先检查收到的前几KB
+（见download_to_file的sniff参数）：是网页或文本时立即中止，不再下载整个响应；
+是已知的媒体格式时按格式确定扩展名，不再默认使用.mp4。
+"""
+
+import threading
+
+from file_download import SNIFF_BYTES, RejectedResponse
+
+
+# 判断结果（媒体格式直接返回扩展名）
+PAGE = 'page'
+TEXT = 'text'
+
+HTML_PREFIXES = (b'<!doctype html', b'<html', b'<head', b'<body', b'<?xml', b'<!--',
+                 b'<script', b'<meta', b'<title')
+# MPEG-TS的包长（检查开头三个包的同步字节）
+TS_PACKET = 188
+
+
+def _sniff_mp4(head):
+    """ISO媒体文件（MP4/MOV/M4A/3GP）：第4~8字节是box类型"""
+    box = head[4:8]
+    if box == b'ftyp':
+        brand = head[8:12]
+        if brand == b'qt  ':
+            return '.mov'
+        if brand in (b'M4A ', b'M4B '):
+            return '.m4a'
+        if brand.startswith(b'3g'):
+            return '.3gp'
+        return '.mp4'
+    if box in (b'moov', b'mdat', b'wide', b'free', b'skip'):
+        return '.mov'
+    return None
+
+
+def _sniff_mpeg_audio(head):
+    """没有ID3标签的MP3，或ADTS格式的AAC：以帧同步字开头"""
+    if len(head) < 2 or head[0] != 0xFF or head[1] & 0xE0 != 0xE0:
+        return None
+    if head[1] & 0xF6 == 0xF0:
+        return '.aac'
+    if head[1] & 0x06:  # layer不为0才是MPEG音频
+        return '.mp3'
+    return None
+
+
+def _looks_like_text(head):
+    """没有NUL字节且能按UTF-8解码（末尾可能截断在多字节字符中间）"""
+    if not head or b'\x00' in head:
+        return False
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        return e.reason == 'unexpected end of data'
+    return True
+
+
+def sniff(head):
+    """判断文件开头head（bytes）的类型
+
+    已知媒体格式返回扩展名；网页返回PAGE；其他文本返回TEXT；无法判断时返回None
+    """
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return '.webm' if b'webm' in head[:64] else '.mkv'
+    if head.startswith(b'FLV\x01'):
+        return '.flv'
+    if head.startswith(b'RIFF'):
+        return {b'WAVE': '.wav', b'AVI ': '.avi'}.get(head[8:12])
+    if head.startswith(b'ID3'):
+        return '.mp3'
+    if head.startswith(b'OggS'):
+        return '.ogg'
+    if head.startswith(b'fLaC'):
+        return '.flac'
+    if head.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'):
+        return '.wmv'
+    if head.startswith(b'\x00\x00\x01\xba'):
+        return '.mpg'
+    if head.startswith(b'.RMF'):
+        return '.rm'
+    if (head[:1] == b'\x47' and len(head) > TS_PACKET * 2
+            and head[TS_PACKET] == 0x47 and head[TS_PACKET * 2] == 0x47):
+        return '.ts'
+    ext = _sniff_mp4(head) or _sniff_mpeg_audio(head)
+    if ext:
+        return ext
+
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if text.startswith(HTML_PREFIXES) or b'<html' in text[:1024]:
+        return PAGE
+    if _looks_like_text(head):
+        return TEXT
+    return None
+
+
+def sniff_file(path):
+    """文件的媒体扩展名，无法判断或不是媒体文件时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            kind = sniff(f.read(SNIFF_BYTES))
+    except OSError:
+        return None
+    return kind if kind not in (PAGE, TEXT) else None
+
+
+class NotMediaError(RejectedResponse):
+    """下载内容的开头是网页或文本，不是媒体文件"""
+
+
+class SniffStats:
+    """一批下载的检查统计"""
+
+    def __init__(self, checked, rejected, wasted_bytes):
+        self.checked = checked
+        self.rejected = rejected
+        self.wasted_bytes = wasted_bytes
+
+    def summary(self):
+        return (f"检查 {self.checked} 个文件开头，拒绝 {self.rejected} 个非媒体文件，"
+                f"浪费 {self.wasted_bytes / 1024:.1f} KB")
+
+
+class MediaSniffer:
+    """传给download_to_file的sniff回调：不是媒体文件时抛出NotMediaError
+
+    统计被拒绝的下载浪费的字节数（线程安全），take_stats()取出并清零
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._rejected = 0
+        self._wasted = 0
+
+    def __call__(self, head):
+        kind = sniff(head)
+        with self._lock:
+            self._checked += 1
+        if kind in (PAGE, TEXT):
+            self.add_wasted(len(head))
+            raise NotMediaError("网页" if kind == PAGE else "文本")
+        return kind
+
+    def add_wasted(self, size):
+        """记录一次被拒绝的下载（例如下载完成后才发现不是媒体文件）"""
+        with self._lock:
+            self._rejected += 1
+            self._wasted += size
+
+    def take_stats(self):
+        with self._lock:
+            stats = SniffStats(self._checked, self._rejected, self._wasted)
+            self._checked = self._rejected = self._wasted = 0
+        return stats
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容寻址的媒体存储
+文件按内容的SHA-256保存为 objects/<摘要前两位>/<摘要><扩展名>，不同作品名称
+相近时不会互相覆盖，多行引用同一个视频时也只保存一份。
+链接 -> 摘要、每个摘要对应的可读名称（作品名称）、最近使用时间和命中次数
+记录在SQLite数据库中（见media_catalog）；不另建符号链接（Windows上创建符号
+链接需要额外权限）。
+摘要在下载时边写边算（见download_to_file的digest参数），入库时不再读一遍文件。
+扩展名按文件开头的字节判断（见media_sniff），无法判断时才用链接或作品名称中的。
+
+最近使用时间和命中次数供缓存淘汰（cache_eviction）使用；正在播放或下载的
+链接可以钉住，淘汰时跳过。
+旧版记录导入的文件没有摘要，同样计入总大小并参与淘汰（见remove_legacy）。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import urllib.parse
+from collections import Counter
+
+from media_catalog import DB_FILE, MediaCatalog
+from media_sniff import sniff_file
+from url_canon import canonical_url
+
+
+OBJECTS_DIR = 'objects'
+STAGING_DIR = 'partial'
+
+DEFAULT_EXTENSION = '.mp4'
+
+
+def media_extension(filename, default=DEFAULT_EXTENSION):
+    """文件名（或链接）的扩展名，没有时用默认扩展名"""
+    path = urllib.parse.urlsplit(filename).path if '://' in filename else filename
+    ext = os.path.splitext(path)[1].lower()
+    if not ext or len(ext) > 6 or not ext[1:].isalnum():
+        return default
+    return ext
+
+
+class MediaStore:
+    """内容寻址的媒体存储（线程安全）"""
+
+    def __init__(self, root, log=None):
+        self.root = root
+        self.log = log
+        self.catalog = MediaCatalog(os.path.join(root, DB_FILE), log=log)
+        self._lock = threading.Lock()   # 入库和删除文件
+        self._pins = Counter()  # 钉住的链接
+        self.hits = 0
+        self.misses = 0
+
+    def import_history(self, json_path):
+        """导入旧版的 {链接: 文件路径} 记录（只在第一次启动时有内容）"""
+        self.catalog.migrate_paths(json_path)
+
+    def object_path(self, digest, ext):
+        return os.path.join(self.root, OBJECTS_DIR, digest[:2], digest + ext)
+
+    def staging_path(self, url, ext):
+        """下载中的文件位置（同一链接固定不变，便于断点续传）"""
+        name = hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()[:24]
+        staging_dir = os.path.join(self.root, STAGING_DIR)
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, name + ext)
+
+    def _path(self, row):
+        if row is None:
+            return None
+        if row['digest'] and row['ext']:
+            return self.object_path(row['digest'], row['ext'])
+        return row['path']  # 旧版记录的文件
+
+    def path_of(self, url):
+        """链接对应的已存文件路径，没有或文件已丢失时返回None（不计入命中率）"""
+        path = self._path(self.catalog.get(url))
+        return path if path and os.path.exists(path) else None
+
+    def lookup(self, url):
+        """链接对应的已存文件路径，没有或文件已丢失时返回None（计入命中率）"""
+        row = self.catalog.get(url)
+        path = self._path(row)
+        if path is None or not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.catalog.touch(url, row['digest'])
+        return path
+
+    def info(self, url):
+        """链接的记录（sqlite3.Row，含etag、last_modified等），没有时返回None"""
+        return self.catalog.get(url)
+
+    def digest_of(self, url):
+        row = self.catalog.get(url)
+        return row['digest'] if row else None
+
+    def names(self, digest):
+        """摘要对应的可读名称"""
+        row = self.catalog.get_object(digest)
+        return json.loads(row['names']) if row else []
+
+    def add(self, url, staged_path, digest, name='', etag=None, last_modified=None):
+        """把下载完成的文件按摘要入库，返回存储路径
+
+        相同内容已存在时删除新文件，只记录链接和名称
+        """
+        ext = sniff_file(staged_path) or media_extension(staged_path)
+        with self._lock:
+            info = self.catalog.get_object(digest)
+            existing = self.object_path(digest, info['ext']) if info else None
+            if existing and os.path.exists(existing) and os.path.getsize(existing) == info['size']:
+                os.remove(staged_path)
+                path = existing
+                ext = info['ext']
+                if self.log:
+                    self.log(f"内容与已有文件相同，只保留一份: {name or url}")
+            else:
+                path = self.object_path(digest, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(staged_path, path)
+            size = os.path.getsize(path)
+
+            self.catalog.put_object(digest, ext, size, name)
+            self.catalog.record(url, path, size, digest, name, etag, last_modified)
+        return path
+
+    def forget(self, url):
+        """删除链接的记录（文件仍被其他链接引用时保留）"""
+        self.catalog.forget(url)
+
+    def forget_all(self):
+        """删除全部链接记录（不删除文件）"""
+        self.catalog.forget_all()
+
+    def pin(self, url):
+        """钉住链接对应的文件（可重复调用，与unpin成对使用）"""
+        with self._lock:
+            self._pins[canonical_url(url)] += 1
+
+    def unpin(self, url):
+        url = canonical_url(url)
+        with self._lock:
+            self._pins[url] -= 1
+            if self._pins[url] <= 0:
+                del self._pins[url]
+
+    def entries(self):
+        """全部文件的快照：[{'digest', 'path', 'size', 'atime', 'hits', 'urls', 'pinned'}]
+
+        没有摘要的旧版文件（migrate_paths导入的）digest为None，用remove_legacy删除
+        """
+        urls = self.catalog.urls_by_digest()
+        with self._lock:
+            pins = set(self._pins)
+        entries = [{
+            'digest': row['digest'],
+            'path': self.object_path(row['digest'], row['ext']),
+            'size': row['size'],
+            'atime': row['accessed_at'] or 0.0,
+            'hits': row['hits'],
+            'urls': urls.get(row['digest'], []),
+            'pinned': any(url in pins for url in urls.get(row['digest'], ())),
+        } for row in self.catalog.objects()]
+        for row in self.catalog.legacy_files():
+            legacy_urls = row['urls'].split('\n')
+            entries.append({
+                'digest': None,
+                'path': row['path'],
+                'size': row['size'] or 0,
+                'atime': row['accessed_at'] or 0.0,
+                'hits': row['hits'] or 0,
+                'urls': legacy_urls,
+                'pinned': any(url in pins for url in legacy_urls),
+            })
+        return entries
+
+    def total_size(self):
+        return self.catalog.total_size()
+
+    def remove_object(self, digest):
+        """删除一个文件及指向它的链接，返回释放的字节数（已钉住或无法删除时返回0）"""
+        with self._lock:
+            info = self.catalog.get_object(digest)
+            if info is None:
+                return 0
+            urls = self.catalog.urls_by_digest().get(digest, [])
+            if any(url in self._pins for url in urls):
+                return 0
+            try:
+                os.remove(self.object_path(digest, info['ext']))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return 0  # 文件正被播放器占用等
+            self.catalog.remove_object(digest)
+            return info['size']
+
+    def remove_legacy(self, path):
+        """删除一个没有摘要的旧版文件及指向它的链接，返回释放的字节数"""
+        with self._lock:
+            rows = [row for row in self.catalog.legacy_files() if row['path'] == path]
+            if not rows:
+                return 0
+            if any(url in self._pins for url in rows[0]['urls'].split('\n')):
+                return 0
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return 0
+            self.catalog.remove_legacy(path)
+            return rows[0]['size'] or 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self, remove_files=False):
+        """清空记录；remove_files为True时同时删除目录中的全部文件（数据库除外）"""
+        with self._lock:
+            if remove_files and os.path.isdir(self.root):
+                keep = {os.path.abspath(path) for path in self.catalog.files()}
+                for entry in os.scandir(self.root):
+                    if os.path.abspath(entry.path) in keep:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+            self.catalog.clear()
+
+    def stats(self):
+        """(链接数, 文件数, 总字节数)"""
+        return self.catalog.counts()
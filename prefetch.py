@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预取接下来可能播放的作品
+操作员选中或滚动到某个作品时，后台线程用一个连接依次预取接下来最可能播放的
+几个作品：下载池正忙时只取每个文件的开头几MB（留在.part文件中，正式下载时
+续传），下载池空闲时取完整文件放入媒体缓存。选择改变后，不在新计划中的预取
+立即取消。预取过的作品被正式播放或下载时计为命中。
+链接按规范化的形式（见url_canon）比较，写法不同的同一链接只预取一次。
+"""
+
+import threading
+import time
+
+from url_canon import canonical_url
+
+
+# 预取的作品数和下载池忙时每个文件预取的字节数
+PREFETCH_COUNT = 3
+PREFETCH_HEAD = 4 * 1024 * 1024
+# 选择连续变化（例如按住方向键）时，等稳定后再开始预取（秒）
+SETTLE_DELAY = 0.3
+
+# 预取结果
+HEAD = 'head'
+FULL = 'full'
+
+
+class PrefetchStopped(Exception):
+    """预取已取到计划的字节数，或已被取消（.part文件保留）"""
+
+
+class PrefetchStats:
+    """预取统计"""
+
+    def __init__(self, prefetched, hits, cancelled, bytes_fetched):
+        self.prefetched = prefetched
+        self.hits = hits
+        self.cancelled = cancelled
+        self.bytes_fetched = bytes_fetched
+
+    @property
+    def hit_rate(self):
+        """预取过的作品中被用到的比例"""
+        return self.hits / self.prefetched if self.prefetched else 0.0
+
+    def summary(self):
+        return (f"预取 {self.prefetched} 个作品（{self.bytes_fetched / 1024 / 1024:.1f} MB），"
+                f"命中 {self.hits} 个，命中率 {self.hit_rate * 100:.0f}%，取消 {self.cancelled} 次")
+
+
+class Prefetcher:
+    """后台预取线程
+
+    fetch(url, name, progress)把url下载到媒体缓存，progress(已下载字节数, 总字节数)
+    抛出异常时中止下载并保留.part文件；cached(url)返回是否已在缓存中；
+    is_idle()返回下载池是否空闲。
+    """
+
+    def __init__(self, fetch, cached, is_idle, log=None, count=PREFETCH_COUNT,
+                 head_bytes=PREFETCH_HEAD):
+        self.fetch = fetch
+        self.cached = cached
+        self.is_idle = is_idle
+        self.log = log
+        self.count = count
+        self.head_bytes = head_bytes
+
+        self._cond = threading.Condition()
+        self._plan = []             # [(规范化的链接, (url, 名称))]，可能性从高到低
+        self._plan_time = 0.0
+        self._current = None        # 正在预取的链接（规范化的形式，下同）
+        self._cancel = False
+        self._done = {}             # 链接 -> HEAD / FULL（尚未被用到的预取）
+        self._failed = set()
+        self._claimed = set()       # 正在正式下载的链接
+        self._stopped = False
+        self._thread = None
+
+        self._prefetched = 0
+        self._hits = 0
+        self._cancelled = 0
+        self._bytes = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cancel = True
+            self._cond.notify_all()
+
+    def update(self, candidates):
+        """设置新的预取计划：[(url, 名称)]，按可能性从高到低"""
+        plan = {}
+        for url, name in candidates:
+            if url:
+                plan.setdefault(canonical_url(url), (url, name))
+        plan = list(plan.items())[:self.count]
+        with self._cond:
+            self._plan = plan
+            self._plan_time = time.monotonic()
+            if self._current and self._current not in {key for key, _ in plan}:
+                self._cancel = True
+            self._cond.notify_all()
+
+    def wakeup(self):
+        """下载池变为空闲时调用，把只取了开头的作品取完"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def claim(self, url):
+        """正式下载url前调用：停止对它的预取并等待结束；返回是否用到了预取
+
+        下载结束后调用release(url)
+        """
+        key = canonical_url(url)
+        with self._cond:
+            self._claimed.add(key)
+            if self._current == key:
+                self._cancel = True
+            while self._current == key:
+                self._cond.wait()
+            hit = self._done.pop(key, None) is not None
+            if hit:
+                self._hits += 1
+        return hit
+
+    def release(self, url):
+        with self._cond:
+            self._claimed.discard(canonical_url(url))
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return PrefetchStats(self._prefetched, self._hits, self._cancelled, self._bytes)
+
+    def _next(self):
+        """下一个要预取的作品（调用时持有锁）；下载池空闲时把只取了开头的作品取完"""
+        idle = None
+        for key, (url, name) in self._plan:
+            if key in self._claimed or key in self._failed:
+                continue
+            state = self._done.get(key)
+            if state == FULL:
+                continue
+            if state == HEAD:
+                if idle is None:
+                    idle = self.is_idle()
+                if not idle:
+                    continue
+            elif self.cached(url):
+                continue
+            return key, url, name
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    wait = self._plan_time + SETTLE_DELAY - time.monotonic()
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                    job = self._next()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                key, url, name = job
+                self._current = key
+                self._cancel = False
+            try:
+                self._prefetch(key, url, name)
+            finally:
+                with self._cond:
+                    self._current = None
+                    self._cond.notify_all()
+
+    def _prefetch(self, key, url, name):
+        first = None
+        fetched = [0]
+
+        def progress(downloaded, total_size):
+            nonlocal first
+            if first is None:
+                first = downloaded  # 续传前已有的部分不计入
+            fetched[0] = downloaded - first
+            if self._cancel:
+                raise PrefetchStopped("预取已取消")
+            if downloaded >= self.head_bytes and not self.is_idle():
+                raise PrefetchStopped("下载池正忙，只预取开头部分")
+
+        state = None
+        try:
+            path = self.fetch(url, name, progress)
+            if path:
+                state = FULL
+            else:
+                with self._cond:
+                    self._failed.add(key)
+        except PrefetchStopped:
+            # 因为正式下载要开始而停止时，已取到的部分同样有用
+            if first is not None and (not self._cancel or key in self._claimed):
+                state = HEAD
+        except Exception as e:
+            with self._cond:
+                self._failed.add(key)
+            if self.log:
+                self.log(f"预取失败 {name}: {e}")
+
+        with self._cond:
+            self._bytes += fetched[0]
+            if state is None:
+                if self._cancel and not self._stopped:
+                    self._cancelled += 1
+                return
+            if key not in self._done:
+                self._prefetched += 1
+            self._done[key] = state
+        if self.log:
+            what = "完整文件" if state == FULL else f"开头 {self.head_bytes // 1024 // 1024} MB"
+            self.log(f"已预取{what}: {name}")
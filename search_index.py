@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+作品搜索索引
+基于字符二元/三元组(n-gram)的倒排索引，不依赖空格分词，适用于中文
+"""
+
+import threading
+from array import array
+
+
+# 索引字段之间的分隔符，保证n-gram不会跨字段拼接
+FIELD_SEPARATOR = '\x00'
+
+# 扫描/校验时每隔多少行检查一次是否已取消
+CANCEL_CHECK_INTERVAL = 4096
+
+
+class SearchCancelled(Exception):
+    """查询已被更新的输入取代"""
+
+
+class NGramIndex:
+    """字符n-gram倒排索引"""
+
+    def __init__(self):
+        # (各行预处理文本, 倒排表)，整体替换以便后台线程安全读取
+        self._data = ([], {})
+
+    def __len__(self):
+        return len(self._data[0])
+
+    @staticmethod
+    def _grams(text, n):
+        """提取文本中的全部n-gram（去重）"""
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def build(self, rows, fields):
+        """为rows中的指定字段建立索引，行号即rows中的下标"""
+        fresh = NGramIndex()
+        fresh.add(rows, fields)
+        self._data = fresh._data
+
+    @classmethod
+    def from_parts(cls, texts, postings):
+        """由已有的数据组装索引（texts为行文本序列，postings提供get(gram)）"""
+        index = cls()
+        index._data = (texts, postings)
+        return index
+
+    def parts(self):
+        """返回(行文本序列, 倒排表)，用于保存快照"""
+        return self._data
+
+    def adopt(self, other):
+        """整体换用另一个索引的数据（后台建好的索引交给界面使用）"""
+        self._data = other._data
+
+    def add(self, rows, fields):
+        """追加索引rows，行号接在已有行之后（用于边导入边建索引）"""
+        texts, postings = self._data
+        row_id = len(texts)
+
+        for row in rows:
+            text = FIELD_SEPARATOR.join(
+                str(row.get(field, '') or '').lower() for field in fields)
+            texts.append(text)
+
+            for n in (2, 3):
+                for gram in self._grams(text, n):
+                    if FIELD_SEPARATOR in gram:
+                        continue
+                    posting = postings.get(gram)
+                    if posting is None:
+                        posting = postings[gram] = array('I')
+                    posting.append(row_id)
+            row_id += 1
+
+    def search(self, query, cancelled=None):
+        """返回包含query的行号列表（升序）；空查询返回None表示全部匹配
+
+        cancelled为可选的回调，返回True时抛出SearchCancelled
+        """
+        query = query.lower()
+        if not query:
+            return None
+
+        texts, index = self._data
+
+        def check(i):
+            if cancelled and i % CANCEL_CHECK_INTERVAL == 0 and cancelled():
+                raise SearchCancelled()
+
+        # 单字查询没有对应的n-gram，直接扫描预处理好的文本
+        if len(query) == 1:
+            result = []
+            for row_id, text in enumerate(texts):
+                check(row_id)
+                if query in text:
+                    result.append(row_id)
+            return result
+
+        # 二元/三元查询与索引项一一对应，倒排表即为精确结果
+        if len(query) <= 3:
+            return list(index.get(query, ()))
+
+        # 更长的查询：按倒排表长度从短到长求交集，再校验候选行
+        postings = []
+        for gram in self._grams(query, 3):
+            posting = index.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            check(0)
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        result = []
+        for i, row_id in enumerate(sorted(candidates)):
+            check(i)
+            if query in texts[row_id]:
+                result.append(row_id)
+        return result
+
+
+class SearchWorker(threading.Thread):
+    """后台搜索线程
+
+    输入先经过防抖窗口，窗口内有新输入则重新计时；
+    新查询提交后正在执行的旧查询会被取消，只有最新查询的结果会回调on_result。
+    on_result(generation, row_ids)在工作线程中调用，界面层需自行切回主线程，
+    并可用generation与worker.generation比较丢弃已过期的结果。
+    """
+
+    def __init__(self, index, on_result, debounce=0.15):
+        super().__init__(daemon=True)
+        self.index = index
+        self.on_result = on_result
+        self.debounce = debounce
+        self.generation = 0
+        self._pending = None
+        self._stopped = False
+        self._cond = threading.Condition()
+
+    def submit(self, query):
+        """提交新查询（取代尚未完成的旧查询）"""
+        with self._cond:
+            self.generation += 1
+            self._pending = query
+            self._cond.notify()
+
+    def cancel(self):
+        """取消尚未发布的查询结果"""
+        with self._cond:
+            self.generation += 1
+            self._pending = None
+            self._cond.notify()
+
+    def stop(self):
+        """停止工作线程"""
+        with self._cond:
+            self._stopped = True
+            self.generation += 1
+            self._cond.notify()
+
+    def _is_stale(self, generation):
+        return generation != self.generation
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+
+                # 防抖：等待输入停顿
+                while True:
+                    generation = self.generation
+                    self._cond.wait(self.debounce)
+                    if self._stopped:
+                        return
+                    if generation == self.generation:
+                        break
+                if self._pending is None:
+                    continue
+                query = self._pending
+                self._pending = None
+
+            try:
+                row_ids = self.index.search(
+                    query, cancelled=lambda: self._is_stale(generation))
+            except SearchCancelled:
+                continue
+
+            if not self._is_stale(generation):
+                self.on_result(generation, row_ids)
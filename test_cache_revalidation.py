@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试缓存文件的条件重新验证：304、返回了内容时比较ETag/Last-Modified/大小、
+失效的链接，以及后台批量验证（conftest中的本地文件服务）
+"""
+
+import hashlib
+import threading
+
+import pytest
+
+from cache_revalidation import (CHANGED, FAILED, FRESH, GONE, UNKNOWN, CacheRevalidator,
+                                revalidate)
+from conftest import CONTENT, LAST_MODIFIED
+from http_pool import HTTPConnectionPool
+from media_store import MediaStore
+
+
+@pytest.fixture
+def pool():
+    pool = HTTPConnectionPool(timeout=5)
+    yield pool
+    pool.close()
+
+
+def cached(url, etag='"v1"', last_modified=None, size=len(CONTENT)):
+    """目录数据库中的链接记录"""
+    return {'url': url, 'etag': etag, 'last_modified': last_modified, 'size': size}
+
+
+def test_not_modified(pool, url, server):
+    assert revalidate(pool, cached(url)) == (FRESH, '"v1"', None)
+    request = server.requests[-1]
+    assert request['If-None-Match'] == '"v1"'
+    assert request['Range'] == 'bytes=0-0'
+    assert server.bytes_sent == 0
+
+
+def test_conditional_request_ignored_with_same_etag(pool, url, server):
+    """服务器不支持条件请求：返回了内容，但ETag相同（弱校验前缀不影响比较）"""
+    server.conditional = False
+    assert revalidate(pool, cached(url))[0] == FRESH
+    assert revalidate(pool, cached(url, etag='W/"v1"'))[0] == FRESH
+    assert server.bytes_sent == 2
+
+
+def test_changed_etag(pool, url, server):
+    server.set_content(CONTENT, '"v2"')
+    assert revalidate(pool, cached(url)) == (CHANGED, '"v2"', LAST_MODIFIED)
+
+
+def test_old_records_without_etag(pool, url, server):
+    server.conditional = False
+    assert revalidate(pool, cached(url, etag=None, last_modified=LAST_MODIFIED))[0] == FRESH
+    other_date = 'Tue, 02 Jan 2024 00:00:00 GMT'
+    assert revalidate(pool, cached(url, etag=None, last_modified=other_date))[0] == CHANGED
+    # 只有文件大小：按Content-Range中的总大小比较
+    assert revalidate(pool, cached(url, etag=None))[0] == FRESH
+    assert revalidate(pool, cached(url, etag=None, size=10))[0] == CHANGED
+    assert revalidate(pool, cached(url, etag=None, size=None)) == (UNKNOWN, '"v1"', LAST_MODIFIED)
+
+
+def test_gone_and_failed(pool, server):
+    server.missing.add('/gone.mp4')
+    assert revalidate(pool, cached(f'{server.base_url}/gone.mp4'))[0] == GONE
+    assert revalidate(pool, cached('http://127.0.0.1:1/video.mp4'), timeout=1)[0] == FAILED
+
+
+def add_cached(store, url, etag, data=None):
+    path = store.staging_path(url, '.tmp')
+    data = data or b'\x00\x00\x00\x20ftypisom' + url.encode()
+    with open(path, 'wb') as f:
+        f.write(data)
+    store.add(url, path, hashlib.sha256(data).hexdigest(), url.rsplit('/', 1)[1], etag=etag)
+
+
+def test_background_revalidation(pool, server, tmp_path):
+    store = MediaStore(str(tmp_path / 'cache'))
+    base = server.base_url
+    add_cached(store, f'{base}/same.mp4', '"v1"')
+    add_cached(store, f'{base}/changed.mp4', '"v0"')
+    # 旧记录没有校验值，按大小比较
+    add_cached(store, f'{base}/legacy.mp4', None, CONTENT)
+    server.missing.add('/gone.mp4')
+    add_cached(store, f'{base}/gone.mp4', '"v1"')
+
+    changed = []
+    done = threading.Event()
+    result = []
+    revalidator = CacheRevalidator(pool, store)
+    assert revalidator.start(on_changed=lambda url, name: changed.append(name),
+                             on_done=lambda stats: (result.append(stats), done.set()))
+    assert done.wait(5)
+    stats, = result
+    assert changed == ['changed.mp4']
+    assert stats.counts[FRESH] == 2 and stats.counts[CHANGED] == 1
+    assert stats.counts[GONE] == 1 and stats.checked == 4
+    assert not stats.cancelled
+    # 旧记录补上了这次返回的校验值，下次可以发送条件请求
+    assert store.info(f'{base}/legacy.mp4')['etag'] == '"v1"'
+
+    assert revalidator.check(f'{base}/same.mp4') == FRESH
+    assert revalidator.check(f'{base}/unknown.mp4') == UNKNOWN
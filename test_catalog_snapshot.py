@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试作品目录快照：保存后载入的内容一致，源文件变化后快照失效
+"""
+
+import os
+
+import pytest
+
+import catalog_snapshot
+from catalog_snapshot import load_snapshot, save_snapshot
+from catalog_store import CatalogStore
+from csv_loader import CSVStream, iter_import_batches
+
+FIELDS = ['作品名称', '身份证名字', '参赛者组别', '资料链接']
+SEARCH_FIELDS = ['作品名称', '身份证名字']
+CSV_TEXT = (
+    "作品名称|身份证名字|参赛者组别|资料链接\r\n"
+    "'春江|花月夜'|张三|少儿组|http://example.com/1.mp4\r\n"
+    "茉莉花|李四|少儿组|http://example.com/2.mp4\r\n"
+    "'第一行\r\n第二行'|王五|青年组|\r\n"
+)
+
+
+@pytest.fixture
+def csv_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_snapshot, 'SNAPSHOT_DIR', str(tmp_path / 'catalog'))
+    path = tmp_path / 'works.csv'
+    path.write_bytes(CSV_TEXT.encode('utf-8'))
+    return str(path)
+
+
+def import_file(path):
+    """与界面相同：流式导入，得到目录、索引和最后一批的信息"""
+    store = CatalogStore(FIELDS)
+    for batch in iter_import_batches(CSVStream(path), index_fields=SEARCH_FIELDS):
+        store.extend(batch.items)
+    return store, batch
+
+
+def save(path, store, batch):
+    return save_snapshot(path, 'test', store, batch.index, SEARCH_FIELDS, batch.columns,
+                         batch.row_count, batch.csv_format)
+
+
+def test_round_trip(csv_path):
+    store, batch = import_file(csv_path)
+    assert batch.csv_format.dialect.quotechar == "'"
+    save(csv_path, store, batch)
+
+    snapshot = load_snapshot(csv_path, 'test', FIELDS, SEARCH_FIELDS)
+    assert snapshot is not None
+    assert [row.to_dict() for row in snapshot.store] == [row.to_dict() for row in store]
+    assert snapshot.store[0]['作品名称'] == '春江|花月夜'
+    assert snapshot.store[2]['作品名称'] == '第一行\r\n第二行'
+    assert snapshot.columns == batch.columns
+    assert snapshot.row_count == 3
+    for query in ('花', '春江', '花月夜', '李四', '第二行', '不存在'):
+        assert snapshot.index.search(query) == batch.index.search(query)
+
+
+def test_round_trip_keeps_full_dialect(csv_path):
+    store, batch = import_file(csv_path)
+    save(csv_path, store, batch)
+    dialect = load_snapshot(csv_path, 'test').csv_format.dialect
+    original = batch.csv_format.dialect
+    for name in ('delimiter', 'quotechar', 'doublequote', 'escapechar', 'skipinitialspace'):
+        assert getattr(dialect, name) == getattr(original, name)
+
+
+def test_changed_content_invalidates(csv_path):
+    store, batch = import_file(csv_path)
+    save(csv_path, store, batch)
+    # 大小不变、只改内容，并还原修改时间
+    stat = os.stat(csv_path)
+    data = open(csv_path, 'rb').read().replace('张三'.encode(), '赵六'.encode())
+    with open(csv_path, 'wb') as f:
+        f.write(data)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_snapshot(csv_path, 'test') is None
+
+
+def test_appended_rows_invalidate(csv_path):
+    store, batch = import_file(csv_path)
+    save(csv_path, store, batch)
+    with open(csv_path, 'ab') as f:
+        f.write('新作品|孙七|少儿组|\r\n'.encode('utf-8'))
+    assert load_snapshot(csv_path, 'test') is None
+
+
+def test_touched_file_invalidates(csv_path):
+    store, batch = import_file(csv_path)
+    save(csv_path, store, batch)
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_snapshot(csv_path, 'test') is None
+
+
+def test_mismatched_fields_or_profile(csv_path):
+    store, batch = import_file(csv_path)
+    save(csv_path, store, batch)
+    assert load_snapshot(csv_path, 'test', ['作品名称']) is None
+    assert load_snapshot(csv_path, 'test', FIELDS, ['作品名称']) is None
+    assert load_snapshot(csv_path, 'other') is None
+
+
+def test_corrupt_snapshot_is_ignored(csv_path):
+    store, batch = import_file(csv_path)
+    path = save(csv_path, store, batch)
+    with open(path, 'r+b') as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b'\0\0\0\0')
+    assert load_snapshot(csv_path, 'test') is None
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试列式作品目录
+"""
+
+import pytest
+
+from catalog_store import CatalogStore, InternedColumn, TextColumn
+
+ROWS = [
+    {'作品名称': '春江花月夜', '身份证名字': '张三', '参赛者组别': '少儿组',
+     '资料链接': 'http://example.com/1.mp4', '备注': '不保留'},
+    {'作品名称': '茉莉花', '身份证名字': None, '参赛者组别': '少儿组',
+     '资料链接': 'http://example.com/2.mp4'},
+    {'作品名称': '', '身份证名字': '李四', '参赛者组别': '青年组', '资料链接': ''},
+]
+
+
+def test_values_round_trip():
+    store = CatalogStore(['作品名称', '身份证名字', '参赛者组别', '资料链接'])
+    store.extend(ROWS)
+    assert len(store) == 3 and store
+    for row_id, source in enumerate(ROWS):
+        row = store[row_id]
+        for field in store.fields:
+            assert row[field] == (source.get(field) or '')
+    assert store[-1].to_dict()['身份证名字'] == '李四'
+    assert [row['作品名称'] for row in store] == ['春江花月夜', '茉莉花', '']
+
+
+def test_missing_fields_behave_like_dict():
+    store = CatalogStore(['作品名称'])
+    store.append(ROWS[0])
+    row = store[0]
+    assert '备注' not in row
+    assert row.get('备注', 'x') == 'x'
+    assert store.value(0, '备注') == ''
+    with pytest.raises(KeyError):
+        row['备注']
+    with pytest.raises(IndexError):
+        store[1]
+
+
+def test_interned_column_stores_each_value_once():
+    column = InternedColumn()
+    for value in ['少儿组', '青年组', '少儿组', '少儿组']:
+        column.append(value)
+    ids, values = column.buffers()
+    assert values == ['少儿组', '青年组']
+    assert list(ids) == [0, 1, 0, 0]
+    assert column.get(3) == '少儿组'
+
+
+def test_text_column_from_buffers():
+    column = TextColumn()
+    for value in ['春江', '', '花月夜']:
+        column.append(value)
+    buffer, offsets = column.buffers()
+    copy = TextColumn.from_buffers(memoryview(bytes(buffer)), offsets)
+    assert list(copy) == ['春江', '', '花月夜']
+
+
+def test_for_columns_keeps_projected_and_link_columns():
+    store = CatalogStore.for_columns(
+        ['序号', '作品名称', '视频链接', '备用URL', '备注', '展演号码'], extra_fields=['备注'])
+    assert store.fields == ['作品名称', '展演号码', '视频链接', '备用URL', '备注']
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试CSV加载：编码和分隔符检测、gb18030回退、流式分批导入、内存映射模式的行偏移索引
+"""
+
+import codecs
+import csv
+import io
+import threading
+
+import pytest
+
+from csv_loader import (CANCEL_CHECK_ROWS, CSVStream, MappedCSV, detect_csv_format,
+                        iter_import_batches, open_csv, open_stream)
+
+ROWS = [
+    {'作品名称': '春江花月夜', '资料链接': 'http://example.com/1.mp4'},
+    {'作品名称': '茉莉花', '资料链接': 'http://example.com/2.mp4'},
+]
+
+
+def write_csv(tmp_path, rows=ROWS, encoding='utf-8', delimiter=',', prefix=b''):
+    text = io.StringIO(newline='')
+    writer = csv.DictWriter(text, fieldnames=list(rows[0]), delimiter=delimiter)
+    writer.writeheader()
+    writer.writerows(rows)
+    path = tmp_path / 'works.csv'
+    path.write_bytes(prefix + text.getvalue().encode(encoding))
+    return str(path)
+
+
+def read_rows(path, csv_format=None):
+    f, reader = open_csv(path, csv_format or detect_csv_format(path))
+    with f:
+        return list(reader)
+
+
+@pytest.mark.parametrize('encoding, prefix, expected', [
+    ('utf-8', b'', 'utf-8'),
+    ('utf-8', codecs.BOM_UTF8, 'utf-8-sig'),
+    ('gbk', b'', 'gbk'),
+    ('utf-16-le', codecs.BOM_UTF16_LE, 'utf-16'),
+])
+def test_detect_encoding(tmp_path, encoding, prefix, expected):
+    path = write_csv(tmp_path, encoding=encoding, prefix=prefix)
+    csv_format = detect_csv_format(path)
+    assert csv_format.encoding == expected
+    assert read_rows(path, csv_format) == ROWS
+
+
+@pytest.mark.parametrize('delimiter', [',', ';', '\t', '|'])
+def test_detect_delimiter(tmp_path, delimiter):
+    path = write_csv(tmp_path, delimiter=delimiter)
+    assert detect_csv_format(path).delimiter == delimiter
+    assert read_rows(path) == ROWS
+
+
+def test_sample_truncated_inside_multibyte_character(tmp_path):
+    """样本末尾截断在多字节字符中间时不应判为其他编码"""
+    path = write_csv(tmp_path)
+    data = open(path, 'rb').read()
+    cut = data.index('春'.encode('utf-8')) + 1
+    assert detect_csv_format(path, sample_size=cut).encoding == 'utf-8'
+
+
+def test_falls_back_to_gb18030_after_sample(tmp_path):
+    """样本全是ASCII、之后才出现GBK字节时，读取中途改用gb18030且不重复产出行"""
+    rows = [{'作品名称': f'work{i}', '资料链接': f'http://example.com/{i}.mp4'}
+            for i in range(50)]
+    rows.append({'作品名称': '春江花月夜', '资料链接': 'http://example.com/x.mp4'})
+    header = 'name,link\r\n'.encode('ascii')
+    body = ''.join(f"{row['作品名称']},{row['资料链接']}\r\n" for row in rows)
+    path = tmp_path / 'late_gbk.csv'
+    path.write_bytes(header + body.encode('gb18030'))
+
+    csv_format = detect_csv_format(str(path), sample_size=64)
+    assert csv_format.encoding == 'utf-8'
+    stream = CSVStream(str(path), csv_format)
+    result = list(stream)
+    assert stream.csv_format.encoding == 'gb18030'
+    assert [row['name'] for row in result] == [row['作品名称'] for row in rows]
+
+
+def test_undecodable_file_raises(tmp_path):
+    path = tmp_path / 'binary.csv'
+    path.write_bytes(b'a,b\r\n' + b'\xff\xfe\x00\x81\x30' * 10)
+    with pytest.raises(Exception):
+        read_rows(str(path))
+
+
+def test_import_batches(tmp_path):
+    rows = [{'作品名称': f'作品{i}', '资料链接': f'http://example.com/{i}.mp4'}
+            for i in range(30)]
+    path = write_csv(tmp_path, rows=rows)
+    batches = list(iter_import_batches(
+        CSVStream(path), transform=lambda i, row, columns: row if i % 2 == 0 else None,
+        index_fields=['作品名称'], first_batch_size=5))
+
+    assert batches[0].columns == ['作品名称', '资料链接']
+    assert len(batches[0].items) == 5
+    last = batches[-1]
+    assert last.done and not last.cancelled
+    assert last.item_count == 15 and last.row_count == 30
+    items = [item for batch in batches for item in batch.items]
+    assert [item['作品名称'] for item in items] == [f'作品{i}' for i in range(0, 30, 2)]
+    assert last.index.search('作品1') == [5, 6, 7, 8, 9]
+    assert last.csv_format.encoding == 'utf-8'
+
+
+def test_cancelled_import_indexes_loaded_rows(tmp_path):
+    """取消时最后一批带有已导入部分（包括尚未发出的记录）的索引"""
+    rows = [{'作品名称': f'作品{i}', '资料链接': ''} for i in range(1000)]
+    path = write_csv(tmp_path, rows=rows)
+    cancel = threading.Event()
+    batches = []
+    for batch in iter_import_batches(CSVStream(path), index_fields=['作品名称'],
+                                     cancel_event=cancel, first_batch_size=5, interval=60):
+        batches.append(batch)
+        cancel.set()
+
+    last = batches[-1]
+    assert last.done and last.cancelled
+    assert last.item_count == sum(len(batch.items) for batch in batches) == CANCEL_CHECK_ROWS - 1
+    assert last.index.search('作品200') == [200]
+    assert last.index.search('作品300') == []
+
+
+# ---- 内存映射模式 ----
+
+TRICKY_ROWS = [
+    ['作品名称', '简介', '资料链接'],
+    ['春江花月夜', '第一行\n第二行', 'http://example.com/1.mp4'],
+    ['茉莉花', '含有"引号"和,逗号', 'http://example.com/2.mp4'],
+    ['空简介', '', 'http://example.com/3.mp4'],
+    ['多行', '\r\n\n开头就换行\r\n', 'http://example.com/4.mp4'],
+    ['末行', '"', ''],
+]
+
+
+def write_tricky(tmp_path, encoding='utf-8', blank_lines=True):
+    text = io.StringIO(newline='')
+    writer = csv.writer(text, lineterminator='\r\n')
+    for i, row in enumerate(TRICKY_ROWS):
+        writer.writerow(row)
+        if blank_lines and i == 2:
+            text.write('\r\n\r\n')  # 空行不算一行
+    path = tmp_path / 'tricky.csv'
+    path.write_bytes(text.getvalue().encode(encoding))
+    return str(path)
+
+
+def expected_rows(path, encoding='utf-8'):
+    with open(path, encoding=encoding, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'gbk'])
+def test_mapped_rows_match_csv_module(tmp_path, encoding):
+    path = write_tricky(tmp_path, encoding)
+    mapped = MappedCSV(path)
+    try:
+        assert mapped.columns == TRICKY_ROWS[0]
+        assert list(mapped) == expected_rows(path, encoding)
+        assert len(mapped) == len(TRICKY_ROWS) - 1
+    finally:
+        mapped.close()
+
+
+def test_mapped_offsets_skip_quoted_newlines(tmp_path):
+    """每个偏移都落在记录边界上：从偏移开始单独解码恰好是那一行"""
+    path = write_tricky(tmp_path, blank_lines=False)
+    mapped = MappedCSV(path)
+    try:
+        list(mapped)
+        data = open(path, 'rb').read()
+        for row_id, values in enumerate(TRICKY_ROWS[1:]):
+            start, end = mapped._offsets[row_id], mapped._offsets[row_id + 1]
+            assert next(csv.reader(io.StringIO(data[start:end].decode(), newline=''))) == values
+        assert mapped._offsets[-1] == len(data)
+    finally:
+        mapped.close()
+
+
+def test_mapped_random_access(tmp_path):
+    path = write_tricky(tmp_path)
+    expected = expected_rows(path)
+    mapped = MappedCSV(path, cache_size=2)
+    try:
+        list(mapped)
+        for row_id in (3, 0, 4, 1, 0, 2):
+            row = mapped.row(row_id)
+            assert row == expected[row_id]
+            assert row.row_id == row_id
+        with pytest.raises(IndexError):
+            mapped.row(len(expected))
+    finally:
+        mapped.close()
+
+
+def test_mapped_short_and_long_rows(tmp_path):
+    """字段数与表头不符时与DictReader一致（缺的为None，多的放在None键下）"""
+    path = tmp_path / 'ragged.csv'
+    path.write_bytes(b'a,b,c\r\n1,2\r\n1,2,3,4\r\n')
+    mapped = MappedCSV(str(path))
+    try:
+        assert list(mapped) == expected_rows(str(path))
+    finally:
+        mapped.close()
+
+
+def test_mapped_row_while_scanning(tmp_path):
+    """导入线程扫描的同时，界面线程读取已扫描到的行"""
+    rows = [{'作品名称': f'作品{i}', '简介': '第一行\n第二行' * (i % 3)} for i in range(20000)]
+    path = write_csv(tmp_path, rows=rows)
+    mapped = MappedCSV(path, cache_size=16)
+    errors = []
+
+    def scan():
+        try:
+            assert sum(1 for _ in mapped) == len(rows)
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        thread = threading.Thread(target=scan)
+        thread.start()
+        checked = 0
+        while thread.is_alive() or checked < 100:
+            available = len(mapped)
+            if available:
+                row_id = (checked * 7919) % available
+                assert mapped.row(row_id) == rows[row_id]
+                checked += 1
+        thread.join()
+        assert not errors
+    finally:
+        mapped.close()
+
+
+def test_open_stream_chooses_mapped_for_large_files(tmp_path):
+    path = write_tricky(tmp_path)
+    stream = open_stream(path, mapped_min_size=0)
+    assert isinstance(stream, MappedCSV)
+    stream.close()
+    assert isinstance(open_stream(path), CSVStream)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试下载任务池：并发限制、取消、统计、排队顺序和交互任务抢占、
+同一链接只下载一次
+"""
+
+import threading
+import time
+
+import pytest
+
+from download_pool import (BULK, CANCELLED, DONE, FAILED, INTERACTIVE, QUEUED, RUNNING,
+                           DownloadCancelled, DownloadPool, SingleFlight)
+
+TIMEOUT = 5
+
+
+class Gate:
+    """让任务停在下载循环中，直到测试放行；记录同时运行的任务数"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.peak_by_host = {}
+        self.started = []
+
+    def task(self, job):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.started.append(job.key)
+            host_running = sum(1 for key in self.started if key.startswith(job.host))
+            self.peak_by_host[job.host] = max(self.peak_by_host.get(job.host, 0), host_running)
+        try:
+            while not self.release.wait(0.01):
+                job.report(1, 10)
+            job.report(10, 10)
+            return f'/tmp/{job.key}'
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.started.remove(job.key)
+
+
+def wait_until(condition, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('等待超时')
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pool():
+    pool = DownloadPool(max_workers=3, per_host=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_limits_total_and_per_host_concurrency(pool):
+    gate = Gate()
+    jobs = [pool.submit(f'a.com-{i}', f'http://a.com/{i}.mp4', gate.task) for i in range(4)]
+    jobs += [pool.submit(f'b.com-{i}', f'http://b.com/{i}.mp4', gate.task) for i in range(2)]
+    wait_until(lambda: gate.running == 3)
+    time.sleep(0.1)
+    assert gate.peak == 3
+    assert gate.peak_by_host['a.com'] <= 2
+    gate.release.set()
+    for job in jobs:
+        assert job.wait(TIMEOUT) == f'/tmp/{job.key}'
+        assert job.status == DONE
+    assert gate.peak_by_host['a.com'] == 2
+
+
+def test_same_key_returns_existing_job(pool):
+    gate = Gate()
+    first = pool.submit('k', 'http://a.com/x.mp4', gate.task)
+    second = pool.submit('k', 'http://a.com/x.mp4', gate.task)
+    assert first is second
+    gate.release.set()
+    first.wait(TIMEOUT)
+    assert pool.submit('k', 'http://a.com/x.mp4', gate.task) is not first
+
+
+def test_cancel_running_and_queued_jobs(pool):
+    gate = Gate()
+    pool.set_limits(max_workers=1)
+    running = pool.submit('r', 'http://a.com/r.mp4', gate.task)
+    queued = pool.submit('q', 'http://a.com/q.mp4', gate.task)
+    wait_until(lambda: gate.running == 1)
+    assert queued.status == QUEUED
+
+    queued.cancel()
+    assert queued.status == CANCELLED
+    running.cancel()
+    assert running.wait(TIMEOUT) is None
+    assert running.status == CANCELLED
+
+
+def test_failed_task_and_idle_stats():
+    idle = []
+    pool = DownloadPool(max_workers=2, on_idle=idle.append)
+
+    submitted = threading.Event()
+
+    def succeed(job):
+        submitted.wait(TIMEOUT)
+        job.report(100, 100)
+        return 'path'
+
+    def fail(job):
+        submitted.wait(TIMEOUT)
+        raise ValueError('链接失效')
+
+    ok = pool.submit('ok', 'http://a.com/1.mp4', succeed)
+    bad = pool.submit('bad', 'http://a.com/2.mp4', fail)
+    submitted.set()
+    ok.wait(TIMEOUT)
+    bad.wait(TIMEOUT)
+    wait_until(lambda: idle)
+    pool.shutdown()
+
+    assert bad.status == FAILED and isinstance(bad.error, ValueError)
+    stats = idle[0]
+    assert (stats.total, stats.done, stats.failed) == (2, 1, 1)
+    assert stats.bytes_done == 100
+    assert stats.progress == 100.0
+
+
+def test_bulk_jobs_run_in_order(pool):
+    gate = Gate()
+    pool.set_limits(max_workers=1)
+    blocker = pool.submit('blocker', 'http://a.com/0.mp4', gate.task)
+    wait_until(lambda: gate.running == 1)
+
+    started = []
+
+    def record(job):
+        started.append(job.key)
+        return job.key
+
+    jobs = [pool.submit(str(order), f'http://a.com/{order}.mp4', record, order=(order,))
+            for order in (3, 1, 2)]
+    jobs.append(pool.submit('none', 'http://a.com/none.mp4', record))
+    gate.release.set()
+    for job in [blocker] + jobs:
+        job.wait(TIMEOUT)
+    assert started == ['1', '2', '3', 'none']
+
+
+def test_interactive_job_preempts_latest_bulk_job(pool):
+    gate = Gate()
+    pool.set_limits(max_workers=2)
+    early = pool.submit('early', 'http://a.com/1.mp4', gate.task, order=(1,))
+    late = pool.submit('late', 'http://a.com/2.mp4', gate.task, order=(2,))
+    wait_until(lambda: gate.running == 2)
+
+    urgent = pool.submit('urgent', 'http://b.com/x.mp4', lambda job: 'played',
+                         priority=INTERACTIVE)
+    assert urgent.wait(TIMEOUT) == 'played'
+    wait_until(lambda: late.preemptions == 1)
+    assert early.preemptions == 0 and early.status != QUEUED
+
+    gate.release.set()
+    assert early.wait(TIMEOUT) and late.wait(TIMEOUT)
+    assert late.status == DONE and late.error is None
+
+
+def test_duplicate_submit_promotes_queued_job(pool):
+    gate = Gate()
+    pool.set_limits(max_workers=1)
+    running = pool.submit('bulk', 'http://a.com/1.mp4', gate.task, order=(1,))
+    wait_until(lambda: gate.running == 1)
+    queued = pool.submit('later', 'http://a.com/2.mp4', lambda job: 'done', order=(2,))
+    assert queued.priority == BULK
+
+    assert pool.submit('later', 'http://a.com/2.mp4', gate.task,
+                       priority=INTERACTIVE) is queued
+    assert queued.priority == INTERACTIVE
+    assert queued.wait(TIMEOUT) == 'done'
+    wait_until(lambda: running.preemptions == 1)
+    gate.release.set()
+    assert running.wait(TIMEOUT) == '/tmp/bulk'
+
+
+def test_done_callback_before_and_after_finish(pool):
+    gate = Gate()
+    results = []
+    job = pool.submit('k', 'http://a.com/x.mp4', gate.task)
+    job.add_done_callback(lambda done: results.append(('early', done.result)))
+    gate.release.set()
+    job.wait(TIMEOUT)
+    wait_until(lambda: results)
+    job.add_done_callback(lambda done: results.append(('late', done.status)))
+    assert results == [('early', '/tmp/k'), ('late', DONE)]
+
+
+def test_failure_while_preempted_is_not_requeued(pool):
+    """暂停标志已设置、任务却因其他错误失败时，照常算失败"""
+    gate = Gate()
+    pool.set_limits(max_workers=1)
+
+    def failing(job):
+        wait_until(lambda: job._preempt_event.is_set())
+        raise OSError('磁盘已满')
+
+    bulk = pool.submit('bulk', 'http://a.com/1.mp4', failing, order=(1,))
+    wait_until(lambda: bulk.status == RUNNING)
+    urgent = pool.submit('urgent', 'http://a.com/2.mp4', gate.task, priority=INTERACTIVE)
+    bulk.wait(TIMEOUT)
+    assert bulk.status == FAILED and isinstance(bulk.error, OSError)
+    assert bulk.preemptions == 0
+    gate.release.set()
+    assert urgent.wait(TIMEOUT) == '/tmp/urgent'
+
+
+def test_callbacks_run_outside_the_lock(pool):
+    """结束回调中其他线程也能使用下载池"""
+    results = []
+
+    def callback(job):
+        thread = threading.Thread(target=lambda: results.append(pool.pending()))
+        thread.start()
+        thread.join(TIMEOUT)
+
+    job = pool.submit('k', 'http://a.com/x.mp4', lambda job: 'done')
+    job.add_done_callback(callback)
+    job.wait(TIMEOUT)
+    wait_until(lambda: results)
+    assert results == [0]
+
+
+# ---- SingleFlight ----
+
+def run_threads(count, target):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, target(i)))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_single_flight_runs_once_for_concurrent_calls():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(TIMEOUT)
+        return 'path'
+
+    threads, results = run_threads(4, lambda i: flight.do('url', fetch))
+    wait_until(lambda: flight.joined == 3)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert results == ['path'] * 4
+    assert len(calls) == 1
+    # 结束后同一个键重新执行
+    assert flight.do('url', lambda: 'again') == 'again'
+
+
+def test_single_flight_waiter_retries_after_leader_fails():
+    flight = SingleFlight()
+    flight.POLL_INTERVAL = 0.01
+    leader_started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        leader_started.set()
+        release.wait(TIMEOUT)
+        raise DownloadCancelled('下载已取消')
+
+    errors = []
+
+    def leader():
+        try:
+            flight.do('url', failing)
+        except DownloadCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    leader_started.wait(TIMEOUT)
+    waiter, results = run_threads(1, lambda i: flight.do('url', lambda: 'retried'))
+    wait_until(lambda: flight.joined == 1)
+    release.set()
+    thread.join(TIMEOUT)
+    waiter[0].join(TIMEOUT)
+    assert len(errors) == 1
+    assert results == ['retried']
+
+
+def test_single_flight_poll_stops_waiting():
+    flight = SingleFlight()
+    flight.POLL_INTERVAL = 0.01
+    release = threading.Event()
+    threads, _ = run_threads(1, lambda i: flight.do('url', lambda: release.wait(TIMEOUT)))
+    wait_until(lambda: 'url' in flight._flights)
+
+    polls = []
+
+    def poll():
+        polls.append(1)
+        if len(polls) == 3:
+            raise DownloadCancelled('下载已取消')
+
+    with pytest.raises(DownloadCancelled):
+        flight.do('url', lambda: 'unused', poll=poll)
+    assert len(polls) == 3
+    release.set()
+    threads[0].join(TIMEOUT)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试下载排期：展演顺序、上场时间、就绪时间估计
+"""
+
+from types import SimpleNamespace
+
+from download_schedule import SAFETY_MARGIN, ShowSchedule, estimate_ready, parse_clock, show_order_key
+
+
+def test_show_order_key_compares_numbers_numerically():
+    numbers = ['A10', 'A2', '10', '9', 'B1', 'A2-1']
+    assert sorted(numbers, key=show_order_key) == ['9', '10', 'A2', 'A2-1', 'A10', 'B1']
+
+
+def test_parse_clock():
+    assert parse_clock('19:30') is not None
+    assert parse_clock(' 9：05 ') is not None
+    assert parse_clock('24:00') is None
+    assert parse_clock('七点') is None
+    assert parse_clock('19:30') - parse_clock('19:00') == 30 * 60
+
+
+def test_deadline_follows_show_order():
+    schedule = ShowSchedule(start=1000, slot_minutes=5)
+    schedule.set_numbers(['A10', 'A2', 'A1'])
+    assert schedule.deadline('A1') == 1000
+    assert schedule.deadline('A10') == 1000 + 2 * 5 * 60
+    assert schedule.deadline('X') is None
+    assert ShowSchedule().deadline('A1') is None
+
+
+def test_estimate_ready_accumulates_remaining_bytes():
+    jobs = [SimpleNamespace(total_bytes=100, bytes_done=40, key='a'),
+            SimpleNamespace(total_bytes=0, bytes_done=0, key='b'),
+            SimpleNamespace(total_bytes=300, bytes_done=0, key='c')]
+    deadlines = {'a': None, 'b': 0, 'c': 10 ** 6}
+    estimates = estimate_ready(jobs, throughput=10, now=0,
+                               deadline_of=lambda job: deadlines[job.key])
+    # 大小未知的按已知大小的平均值（200）估计
+    assert [estimate.ready_at for estimate in estimates] == [6, 26, 56]
+    assert [estimate.at_risk for estimate in estimates] == [False, True, False]
+    assert estimates[2].deadline - estimates[2].ready_at > SAFETY_MARGIN
+    assert estimate_ready(jobs, throughput=0) == []
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试可续传的文件下载和分段下载（conftest中的本地文件服务支持Range/If-Range）
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+import file_download
+from conftest import CONTENT
+from file_download import (IncompleteDownload, RemoteFileChanged, download_to_file,
+                           part_paths)
+from http_pool import HTTPConnectionPool
+from media_sniff import MediaSniffer, NotMediaError
+
+
+@pytest.fixture
+def pool():
+    pool = HTTPConnectionPool(timeout=5)
+    yield pool
+    pool.close()
+
+
+def interrupted_download(pool, url, server, dest, cut_after):
+    """下载到一半连接断开，留下.part文件"""
+    server.cut_after = cut_after
+    with pytest.raises(IncompleteDownload):
+        download_to_file(pool, url, dest, max_segments=1)
+    part_path, meta_path = part_paths(dest)
+    assert os.path.getsize(part_path) >= cut_after
+    with open(meta_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_plain_download(pool, url, server, tmp_path):
+    dest = str(tmp_path / 'video.mp4')
+    digest = hashlib.sha256()
+    validators = {}
+    calls = []
+    assert download_to_file(pool, url, dest, progress=lambda *args: calls.append(args),
+                            digest=digest, validators=validators) == dest
+    assert open(dest, 'rb').read() == CONTENT
+    assert digest.hexdigest() == hashlib.sha256(CONTENT).hexdigest()
+    assert validators['etag'] == '"v1"'
+    assert calls[-1] == (len(CONTENT), len(CONTENT))
+    assert not any(os.path.exists(path) for path in part_paths(dest))
+
+
+def test_resume_sends_range_and_if_range(pool, url, server, tmp_path):
+    dest = str(tmp_path / 'video.mp4')
+    meta = interrupted_download(pool, url, server, dest, 100 * 1024)
+    assert meta['bytes'] == 100 * 1024 and meta['etag'] == '"v1"'
+
+    server.requests.clear()
+    server.bytes_sent = 0
+    digest = hashlib.sha256()
+    download_to_file(pool, url, dest, digest=digest, max_segments=1)
+    assert server.requests[0]['Range'] == f'bytes={100 * 1024}-'
+    assert server.requests[0]['If-Range'] == '"v1"'
+    assert server.bytes_sent == len(CONTENT) - 100 * 1024
+    assert open(dest, 'rb').read() == CONTENT
+    # 续传时补算已有部分，摘要仍是整个文件的
+    assert digest.hexdigest() == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_changed_file_restarts_from_beginning(pool, url, server, tmp_path):
+    dest = str(tmp_path / 'video.mp4')
+    interrupted_download(pool, url, server, dest, 100 * 1024)
+
+    changed = os.urandom(200 * 1024)
+    server.set_content(changed, '"v2"')
+    server.requests.clear()
+    download_to_file(pool, url, dest, max_segments=1)
+    assert server.requests[0]['If-Range'] == '"v1"'
+    assert len(server.requests) == 1
+    assert open(dest, 'rb').read() == changed
+
+
+def test_range_not_satisfiable_restarts(pool, url, server, tmp_path):
+    """服务器上的文件变短、续传的范围无效（416）时删除.part从头下载"""
+    dest = str(tmp_path / 'video.mp4')
+    interrupted_download(pool, url, server, dest, 100 * 1024)
+
+    shorter = CONTENT[:10 * 1024]
+    server.set_content(shorter, '"v1"')
+    server.requests.clear()
+    download_to_file(pool, url, dest, max_segments=1)
+    assert server.requests[0]['Range'] == f'bytes={100 * 1024}-'
+    assert 'Range' not in server.requests[1]
+    assert open(dest, 'rb').read() == shorter
+
+
+def test_part_without_validator_is_not_resumed(pool, url, server, tmp_path):
+    dest = str(tmp_path / 'video.mp4')
+    part_path, meta_path = part_paths(dest)
+    with open(part_path, 'wb') as f:
+        f.write(b'x' * 1000)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'bytes': 1000}, f)
+    download_to_file(pool, url, dest, max_segments=1)
+    assert 'Range' not in server.requests[0]
+    assert open(dest, 'rb').read() == CONTENT
+
+
+def test_truncated_range_with_unknown_total_keeps_part(pool, url, server, tmp_path):
+    """Content-Range不给总长度时按响应体长度判断，不完整的不能成为目标文件"""
+    dest = str(tmp_path / 'video.mp4')
+    interrupted_download(pool, url, server, dest, 100 * 1024)
+
+    server.unknown_total = True
+    interrupted_download(pool, url, server, dest, 50 * 1024)
+    assert not os.path.exists(dest)
+
+    download_to_file(pool, url, dest, max_segments=1)
+    assert open(dest, 'rb').read() == CONTENT
+
+
+def test_truncated_chunked_body_keeps_part(pool, url, server, tmp_path):
+    dest = str(tmp_path / 'video.mp4')
+    server.framing = 'chunked'
+    server.cut_after = 100 * 1024
+    with pytest.raises(IncompleteDownload):
+        download_to_file(pool, url, dest, max_segments=1)
+    assert not os.path.exists(dest)
+    assert os.path.exists(part_paths(dest)[0])
+
+    download_to_file(pool, url, dest, max_segments=1)
+    assert open(dest, 'rb').read() == CONTENT
+
+
+def test_body_ended_by_close(pool, url, server, tmp_path):
+    """没有长度的响应以服务器正常关闭连接为结束"""
+    dest = str(tmp_path / 'video.mp4')
+    server.framing = 'close'
+    download_to_file(pool, url, dest, max_segments=1)
+    assert open(dest, 'rb').read() == CONTENT
+
+
+def test_sniff_rejects_page_and_keeps_media(pool, url, server, tmp_path):
+    dest = str(tmp_path / 'video.mp4')
+    server.set_content(b'<!DOCTYPE html>' + b' ' * len(CONTENT), '"page"')
+    with pytest.raises(NotMediaError):
+        download_to_file(pool, url, dest, sniff=MediaSniffer(), max_segments=1)
+    assert not any(os.path.exists(path) for path in part_paths(dest) + (dest,))
+
+    media = b'\x00\x00\x00\x20ftypisom' + CONTENT
+    server.set_content(media, '"media"')
+    kinds = []
+    download_to_file(pool, url, dest, sniff=lambda head: kinds.append(MediaSniffer()(head)),
+                     max_segments=1)
+    assert kinds == ['.mp4']
+    # 先读出的开头部分也写入文件
+    assert open(dest, 'rb').read() == media
+
+
+# ---- 读缓冲区 ----
+
+class SlowResponse:
+    """每次读取都要等待的响应"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def readinto(self, buffer):
+        time.sleep(self.delay)
+        buffer[:] = b'x' * len(buffer)
+        return len(buffer)
+
+
+def test_chunk_buffer_grows_on_fast_connection(pool, url, server):
+    server.set_content(CONTENT * 8, '"big"')
+    buffer = file_download._ChunkBuffer()
+    assert buffer.size == file_download.MIN_CHUNK_SIZE
+    received = bytearray()
+    with pool.open(url) as response:
+        while True:
+            data = buffer.read_from(response)
+            if not data:
+                break
+            received += data
+    assert received == CONTENT * 8
+    assert buffer.size > file_download.MIN_CHUNK_SIZE
+
+
+def test_chunk_buffer_shrinks_on_slow_connection(monkeypatch):
+    monkeypatch.setattr(file_download, 'CHUNK_TARGET_TIME', 0.001)
+    buffer = file_download._ChunkBuffer()
+    buffer.size = file_download.MAX_CHUNK_SIZE
+    sizes = [len(buffer.read_from(SlowResponse(0.01))) for _ in range(3)]
+    largest = file_download.MAX_CHUNK_SIZE
+    assert sizes == [largest, largest // 2, largest // 4]
+    assert buffer.size == largest // 8
+    # limit只限制本次读取的大小
+    assert len(buffer.read_from(SlowResponse(0), limit=100)) == 100
+
+
+# ---- 分段下载 ----
+
+PIECE = 32 * 1024
+PIECE_COUNT = (len(CONTENT) + PIECE - 1) // PIECE
+
+
+@pytest.fixture
+def small_pieces(monkeypatch):
+    monkeypatch.setattr(file_download, 'SEGMENT_MIN_SIZE', 64 * 1024)
+    monkeypatch.setattr(file_download, 'PIECE_SIZE', PIECE)
+
+
+def piece_range(index):
+    start = index * PIECE
+    return f'bytes={start}-{min(start + PIECE, len(CONTENT)) - 1}'
+
+
+def requested_ranges(server):
+    return sorted(request['Range'] for request in server.requests if 'Range' in request)
+
+
+def test_segmented_download(pool, url, server, tmp_path, small_pieces):
+    dest = str(tmp_path / 'video.mp4')
+    digest = hashlib.sha256()
+    calls = []
+    download_to_file(pool, url, dest, digest=digest,
+                     progress=lambda *args: calls.append(args))
+    assert open(dest, 'rb').read() == CONTENT
+    assert digest.hexdigest() == hashlib.sha256(CONTENT).hexdigest()
+
+    # 第一个响应用作第0段，其余各段各请求一次
+    assert 'Range' not in server.requests[0]
+    assert requested_ranges(server) == sorted(piece_range(i) for i in range(1, PIECE_COUNT))
+    assert all(request['If-Range'] == '"v1"' for request in server.requests[1:])
+    # 已下载字节数不重复计算
+    assert calls[-1] == (len(CONTENT), len(CONTENT))
+    assert all(done <= total for done, total in calls)
+    assert [done for done, _ in calls] == sorted(done for done, _ in calls)
+    assert not any(os.path.exists(path) for path in part_paths(dest))
+
+
+def test_segmented_download_without_pwrite(pool, url, server, tmp_path, monkeypatch):
+    """没有os.pwrite（Windows）时用seek+write，摘要仍按文件内容计算
+
+    段比文件缓冲区小、下载持续多个检查周期，摘要在下载过程中就读回已完成的段
+    """
+    monkeypatch.delattr(os, 'pwrite')
+    monkeypatch.setattr(file_download, 'SEGMENT_MIN_SIZE', 64 * 1024)
+    monkeypatch.setattr(file_download, 'PIECE_SIZE', 4 * 1024)
+    server.delay = 0.005
+    dest = str(tmp_path / 'video.mp4')
+    digest = hashlib.sha256()
+    download_to_file(pool, url, dest, digest=digest)
+    assert open(dest, 'rb').read() == CONTENT
+    assert digest.hexdigest() == hashlib.sha256(CONTENT).hexdigest()
+
+
+def write_partial_segments(url, dest, done, etag='"v1"'):
+    """模拟中断的分段下载：文件已预分配，done中的段已写入"""
+    part_path, meta_path = part_paths(dest)
+    with open(part_path, 'wb') as f:
+        f.truncate(len(CONTENT))
+        for index in done:
+            f.seek(index * PIECE)
+            f.write(CONTENT[index * PIECE:(index + 1) * PIECE])
+    meta = {'url': url, 'name': os.path.basename(dest), 'etag': etag, 'last_modified': None,
+            'total': len(CONTENT), 'piece_size': PIECE, 'pieces': sorted(done),
+            'bytes': sum(len(CONTENT[i * PIECE:(i + 1) * PIECE]) for i in done)}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def test_segmented_resume_fetches_only_missing_pieces(pool, url, server, tmp_path,
+                                                      small_pieces):
+    dest = str(tmp_path / 'video.mp4')
+    done = {0, 2, 5, PIECE_COUNT - 1}
+    meta = write_partial_segments(url, dest, done)
+    digest = hashlib.sha256()
+    calls = []
+    download_to_file(pool, url, dest, digest=digest,
+                     progress=lambda *args: calls.append(args))
+
+    missing = [i for i in range(PIECE_COUNT) if i not in done]
+    assert requested_ranges(server) == sorted(piece_range(i) for i in missing)
+    assert calls[0][0] >= meta['bytes']
+    assert calls[-1] == (len(CONTENT), len(CONTENT))
+    assert open(dest, 'rb').read() == CONTENT
+    assert digest.hexdigest() == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_segmented_resume_after_remote_change(pool, url, server, tmp_path, small_pieces):
+    """续传时服务器上的文件已变化：放弃已下载的段，下次从头下载"""
+    dest = str(tmp_path / 'video.mp4')
+    write_partial_segments(url, dest, {0, 1})
+    changed = os.urandom(len(CONTENT))
+    server.set_content(changed, '"v2"')
+    with pytest.raises(RemoteFileChanged):
+        download_to_file(pool, url, dest)
+    assert not any(os.path.exists(path) for path in part_paths(dest))
+
+    download_to_file(pool, url, dest)
+    assert open(dest, 'rb').read() == changed
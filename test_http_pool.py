@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试HTTP连接池：keep-alive复用、失效空闲连接的重试、重定向、超时、
+按站点限制并发的for_each_per_host，以及证书无法校验时的询问
+（本地http.server，HTTPS用openssl生成的自签名证书）
+"""
+
+import http.server
+import shutil
+import ssl
+import subprocess
+import threading
+import time
+import urllib.error
+from collections import Counter
+
+import pytest
+
+from http_pool import MAX_REDIRECTS, HTTPConnectionPool, for_each_per_host
+from ui_events import UIEventQueue
+
+BODY = b'x' * 1000
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """/file返回BODY；/close返回BODY后直接断开（不发送Connection: close）；
+    /slow等server.delay秒再返回；/redirect/<状态码>?to=<地址>重定向；/loop重定向到自身"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.command, self.path))
+        path, _, query = self.path.partition('?')
+        if path == '/loop':
+            path, query = '/redirect/302', 'to=/loop'
+        if path.startswith('/redirect/'):
+            self.send_response(int(path.rsplit('/', 1)[1]))
+            if query.startswith('to='):
+                self.send_header('Location', query[3:])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if path == '/slow':
+            time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+        if path == '/close':
+            self.close_connection = True
+
+    do_POST = do_GET
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.requests = []
+        self.delay = 0
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def start_server(server):
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr('urllib.request.getproxies', lambda: {})
+    server = start_server(_Server())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def base(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+@pytest.fixture
+def pool():
+    pool = HTTPConnectionPool(timeout=5)
+    yield pool
+    pool.close()
+
+
+def fetch(pool, url, **kwargs):
+    with pool.open(url, **kwargs) as response:
+        return response.read()
+
+
+def test_keep_alive_reuses_connection(pool, base):
+    for _ in range(3):
+        assert fetch(pool, f'{base}/file') == BODY
+    stats = pool.stats()
+    assert stats.requests == 3
+    assert stats.new_connections == 1 and stats.reused == 2
+
+
+def test_unread_response_is_not_reused(pool, base):
+    response = pool.open(f'{base}/file')
+    response.read(10)
+    response.close()
+    assert fetch(pool, f'{base}/file') == BODY
+    assert pool.stats().new_connections == 2
+
+
+def test_stale_idle_connection_is_retried(pool, base):
+    """服务器已关闭的空闲连接：换新连接重试一次"""
+    assert fetch(pool, f'{base}/close') == BODY
+    time.sleep(0.1)
+    assert fetch(pool, f'{base}/file') == BODY
+    stats = pool.stats()
+    assert stats.reused == 1 and stats.new_connections == 2
+
+
+@pytest.mark.parametrize('code', [301, 302, 307, 308])
+def test_redirect_with_relative_location(pool, base, server, code):
+    assert fetch(pool, f'{base}/redirect/{code}?to=/file') == BODY
+    assert server.requests == [('GET', f'/redirect/{code}?to=/file'), ('GET', '/file')]
+
+
+def test_see_other_switches_to_get(pool, base, server):
+    assert fetch(pool, f'{base}/redirect/303?to={base}/file', method='POST') == BODY
+    assert [method for method, _ in server.requests] == ['POST', 'GET']
+
+
+def test_redirect_not_followed(pool, base):
+    with pool.open(f'{base}/redirect/302?to=/file', follow_redirects=False) as response:
+        assert response.status == 302
+        assert response.headers['Location'] == '/file'
+
+
+def test_redirect_without_location(pool, base):
+    with pytest.raises(urllib.error.HTTPError) as info:
+        pool.open(f'{base}/redirect/302')
+    assert info.value.code == 302
+
+
+def test_too_many_redirects(pool, base, server):
+    with pytest.raises(urllib.error.HTTPError) as info:
+        pool.open(f'{base}/loop')
+    assert info.value.code == 310
+    assert len(server.requests) == MAX_REDIRECTS + 1
+
+
+def test_timeout_covers_waiting_for_headers(pool, base, server):
+    assert fetch(pool, f'{base}/file') == BODY
+    server.delay = 1
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.open(f'{base}/slow', timeout=0.2)
+    assert time.monotonic() - start < 0.9
+
+
+def test_request_timeout_is_not_kept_on_idle_connection(pool, base):
+    assert fetch(pool, f'{base}/file', timeout=0.5) == BODY
+    (_, conn), = next(iter(pool._idle.values()))
+    assert conn.timeout == 5 and conn.sock.gettimeout() == 5
+
+
+def test_for_each_per_host_does_not_wait_behind_a_full_host():
+    """排在前面的站点已满时，空闲线程先处理其他站点"""
+    b_done = threading.Event()
+    finished = []
+    lock = threading.Lock()
+    running = Counter()
+    peak = Counter()
+
+    def func(url):
+        host = url.split('/')[2]
+        with lock:
+            running[host] += 1
+            peak[host] = max(peak[host], running[host])
+        if host == 'b.com':
+            b_done.set()
+        else:
+            b_done.wait(2)
+        with lock:
+            running[host] -= 1
+            finished.append(url)
+
+    urls = [f'http://a.com/{i}' for i in range(3)] + ['http://b.com/0']
+    for_each_per_host(urls, lambda url: url, func, workers=3, per_host=1)
+    assert sorted(finished) == sorted(urls)
+    assert finished[0] == 'http://b.com/0'
+    assert peak == {'a.com': 1, 'b.com': 1}
+
+
+def test_for_each_per_host_stops():
+    stop = threading.Event()
+    done = []
+
+    def func(item):
+        done.append(item)
+        stop.set()
+
+    for_each_per_host(range(10), lambda item: f'http://a.com/{item}', func,
+                      workers=4, per_host=1, stop_event=stop)
+    assert done == [0]
+
+
+# ---- 证书无法校验的站点 ----
+
+@pytest.fixture(scope='module')
+def certificate(tmp_path_factory):
+    if not shutil.which('openssl'):
+        pytest.skip('需要openssl生成自签名证书')
+    directory = tmp_path_factory.mktemp('cert')
+    cert, key = directory / 'cert.pem', directory / 'key.pem'
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', str(key), '-out', str(cert)],
+                   check=True, capture_output=True)
+    return str(cert), str(key)
+
+
+@pytest.fixture
+def https_base(certificate, monkeypatch):
+    monkeypatch.setattr('urllib.request.getproxies', lambda: {})
+    server = _Server()
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    start_server(server)
+    yield f'https://localhost:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_untrusted_certificate_asks_once(pool, https_base):
+    asked = []
+    pool.confirm_insecure = lambda host, reason: asked.append(host) or True
+    assert fetch(pool, f'{https_base}/file') == BODY
+    assert fetch(pool, f'{https_base}/file') == BODY
+    assert asked == ['localhost']
+
+
+def test_refused_certificate_fails(pool, https_base):
+    asked = []
+    pool.confirm_insecure = lambda host, reason: asked.append(host) and False
+    for _ in range(2):
+        with pytest.raises(ssl.SSLCertVerificationError):
+            pool.open(f'{https_base}/file')
+    assert asked == ['localhost']
+
+
+def test_no_confirm_callback_keeps_verification(pool, https_base):
+    with pytest.raises(ssl.SSLCertVerificationError):
+        pool.open(f'{https_base}/file')
+
+
+def test_confirm_through_ui_events(pool, https_base):
+    """与界面中一样：工作线程下载，询问交给主线程回答"""
+    events = UIEventQueue()
+    main_thread = threading.current_thread()
+    asked, results = [], []
+
+    def askyesno(host, reason):
+        asked.append((threading.current_thread() is main_thread, host))
+        return True
+
+    pool.confirm_insecure = lambda host, reason: events.ask(askyesno, host, reason)
+    worker = threading.Thread(target=lambda: results.append(fetch(pool, f'{https_base}/file')))
+    worker.start()
+    while worker.is_alive():
+        update = events.drain()
+        if update is not None:
+            for func, args in update.calls:
+                func(*args)
+        worker.join(0.01)
+    assert asked == [(True, 'localhost')]
+    assert results == [BODY]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试链接检查：HEAD请求的分类、不支持HEAD时改用Range GET、有效期内沿用结果、
+过期后的条件请求、按站点限制并发（conftest中的本地文件服务）
+"""
+
+import pytest
+
+from conftest import CONTENT
+from http_pool import HTTPConnectionPool
+from link_probe import BROKEN, MEDIA, PAGE, REDIRECTED, LinkProber, probe_link
+from media_catalog import MediaCatalog
+
+
+@pytest.fixture
+def pool():
+    pool = HTTPConnectionPool(timeout=5)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return MediaCatalog(str(tmp_path / 'media.db'))
+
+
+def test_media_link_uses_head(pool, url, server):
+    result = probe_link(pool, url)
+    assert result.kind == MEDIA and result.downloadable
+    assert result.size == len(CONTENT)
+    assert result.content_type == 'video/mp4'
+    assert result.etag == '"v1"'
+    assert server.paths == [('HEAD', '/video.mp4')]
+
+
+@pytest.mark.parametrize('status', [403, 405, 501])
+def test_head_not_supported_falls_back_to_range_get(pool, url, server, status):
+    server.head_status = status
+    result = probe_link(pool, url)
+    assert result.kind == MEDIA
+    assert result.status == 206
+    assert result.size == len(CONTENT)
+    assert server.paths == [('HEAD', '/video.mp4'), ('GET', '/video.mp4')]
+    assert server.requests[1]['Range'] == 'bytes=0-0'
+    assert server.bytes_sent == 1
+
+
+def test_redirected_page_and_broken_links(pool, server):
+    base = server.base_url
+    server.redirects['/old.mp4'] = f'{base}/video.mp4'
+    result = probe_link(pool, f'{base}/old.mp4')
+    assert result.kind == REDIRECTED and result.final_url == f'{base}/video.mp4'
+
+    server.missing.add('/gone.mp4')
+    result = probe_link(pool, f'{base}/gone.mp4')
+    assert result.kind == BROKEN and result.status == 404
+
+    server.content_type = 'text/html; charset=utf-8'
+    assert probe_link(pool, f'{base}/video.mp4').kind == PAGE
+
+    server.content_type = 'video/mp4'
+    server.set_content(b'x' * 100, '"small"')
+    assert probe_link(pool, f'{base}/video.mp4').kind == BROKEN
+
+
+def test_unreachable_host_is_broken(pool):
+    result = probe_link(pool, 'http://127.0.0.1:1/video.mp4', timeout=1)
+    assert result.kind == BROKEN and result.error
+
+
+def test_fresh_results_are_reused(pool, catalog, server):
+    urls = [f'{server.base_url}/{i}.mp4' for i in range(3)]
+    first = LinkProber(pool, catalog).run(urls + [urls[0], ''])
+    assert first.cached == 0 and len(first.results) == 3
+    assert len(server.paths) == 3
+
+    second = LinkProber(pool, catalog).run(urls)
+    assert second.cached == 3 and second.counts[MEDIA] == 3
+    assert len(server.paths) == 3
+
+
+def test_expired_result_sends_conditional_request(pool, catalog, url, server):
+    LinkProber(pool, catalog).run([url])
+    before = LinkProber(pool, catalog).cached_results()[url]
+
+    summary = LinkProber(pool, catalog, ttl=0).run([url])
+    assert summary.cached == 0
+    assert server.requests[-1]['If-None-Match'] == '"v1"'
+    result, = summary.results
+    # 304：沿用原结果，只更新检查时间
+    assert result.kind == MEDIA and result.size == len(CONTENT)
+    assert result.probed_at >= before.probed_at
+
+    server.set_content(CONTENT[:2048], '"v2"')
+    result, = LinkProber(pool, catalog, ttl=0).run([url]).results
+    assert result.size == 2048 and result.etag == '"v2"'
+
+
+def test_cancelled_run_stops_early(pool, catalog, server):
+    urls = [f'{server.base_url}/{i}.mp4' for i in range(20)]
+    prober = LinkProber(pool, catalog, workers=1, per_host=1)
+    summary = prober.run(urls, on_result=lambda result: prober.cancel())
+    assert summary.cancelled
+    assert len(summary.results) == 1
+
+
+def test_full_host_does_not_block_other_hosts(pool, catalog, server):
+    """同一站点已满时，空闲的线程先检查其他站点的链接"""
+    server.delay = 0.3
+    busy = server.base_url
+    other = busy.replace('127.0.0.1', 'localhost')
+    order = []
+    prober = LinkProber(pool, catalog, workers=2, per_host=1)
+    prober.run([f'{busy}/1.mp4', f'{busy}/2.mp4', f'{other}/3.mp4'],
+               on_result=lambda result: order.append(result.url.rsplit('/', 1)[1]))
+    assert order.index('3.mp4') < order.index('2.mp4')
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试播放器的作品列表数据模型（需要PyQt5，未安装时跳过）
+"""
+
+import pytest
+
+# main.py在缺少PyQt5的任何部分时直接退出
+pytest.importorskip("PyQt5.QtMultimediaWidgets")
+
+from PyQt5.QtCore import QSortFilterProxyModel, Qt
+
+import main
+from catalog_store import CatalogStore
+
+ROWS = [
+    {'作品名称': '春江花月夜', '身份证名字': '张三', '资料链接': 'http://example.com/1.mp4'},
+    {'作品名称': '茉莉花', '身份证名字': '李四', '指导老师': '王老师'},
+]
+
+
+@pytest.fixture
+def model():
+    rows = CatalogStore(main.CATALOG_FIELDS)
+    rows.extend(ROWS)
+    model = main.CatalogTableModel()
+    model.set_rows(rows)
+    return model
+
+
+def test_rows_and_columns(model):
+    assert model.rowCount() == 2
+    assert model.columnCount() == len(main.CatalogTableModel.COLUMNS)
+    assert model.data(model.index(0, 0)) == '春江花月夜'
+    assert model.data(model.index(1, 3)) == '王老师'
+    assert model.data(model.index(0, 5), Qt.ToolTipRole) == 'http://example.com/1.mp4'
+    # 缺少的列显示为空
+    assert model.data(model.index(1, 5)) == ''
+    assert model.row_data(1)['作品名称'] == '茉莉花'
+    assert model.row_data(2) is None
+
+
+def test_headers(model):
+    assert model.headerData(1, Qt.Horizontal) == '参赛者'
+    assert model.headerData(0, Qt.Vertical) == 1
+
+
+def test_sorted_view_maps_back_to_source_rows(model):
+    proxy = QSortFilterProxyModel()
+    proxy.setSourceModel(model)
+    proxy.sort(0, Qt.DescendingOrder)
+    source_rows = [proxy.mapToSource(proxy.index(row, 0)).row() for row in range(2)]
+    assert source_rows == [1, 0]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试高级版播放器的媒体管理（使用缓存前的重新验证）
+"""
+
+import hashlib
+import tempfile
+from unittest import mock
+
+import pytest
+
+tk = pytest.importorskip("tkinter")
+
+import csv_player_advanced
+from cache_revalidation import CHANGED, FRESH
+
+URL = "http://example.com/video.mp4"
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """缓存目录放在临时目录中，并预先缓存URL的旧版本"""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    manager = csv_player_advanced.MediaManager()
+    staged = tmp_path / "old.mp4"
+    data = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 4096
+    staged.write_bytes(data)
+    manager.old_path = manager.store.add(URL, str(staged), hashlib.sha256(data).hexdigest(), "旧版本")
+    yield manager
+    manager.evictor.stop()
+
+
+def test_changed_file_is_downloaded_again(manager):
+    """重新验证发现文件已更新时必须重新下载，而不是返回旧的缓存文件"""
+    manager.revalidate_on_use = True
+    manager.revalidator = mock.Mock(check=mock.Mock(return_value=CHANGED))
+    with mock.patch.object(manager, "_fetch_to_store", return_value="/new/path.mp4") as fetch:
+        path = manager.try_download_video(URL, "作品")
+    fetch.assert_called_once()
+    assert path == "/new/path.mp4"
+
+
+def test_fresh_file_uses_cache(manager):
+    manager.revalidate_on_use = True
+    manager.revalidator = mock.Mock(check=mock.Mock(return_value=FRESH))
+    with mock.patch.object(manager, "_fetch_to_store") as fetch:
+        path = manager.try_download_video(URL, "作品")
+    fetch.assert_not_called()
+    assert path == manager.old_path
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按文件开头的字节判断媒体类型
+"""
+
+import os
+
+import pytest
+
+from file_download import RejectedResponse
+from media_sniff import PAGE, TEXT, MediaSniffer, NotMediaError, sniff, sniff_file
+
+TS_HEAD = b''.join(b'\x47' + os.urandom(187) for _ in range(3))
+
+
+@pytest.mark.parametrize('head, expected', [
+    (b'\x00\x00\x00\x20ftypisom\x00\x00\x02\x00', '.mp4'),
+    (b'\x00\x00\x00\x1cftypmp42', '.mp4'),
+    (b'\x00\x00\x00\x14ftypqt  \x00\x00\x00\x00', '.mov'),
+    (b'\x00\x00\x00\x08wide\x00\x00\x00\x00mdat', '.mov'),
+    (b'\x00\x00\x00\x20ftypM4A \x00\x00\x00\x00', '.m4a'),
+    (b'\x00\x00\x00\x18ftyp3gp4\x00\x00\x00\x00', '.3gp'),
+    (b'\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82\x84webm', '.webm'),
+    (b'\x1a\x45\xdf\xa3\xa3\x42\x86\x81\x01\x42\x82\x88matroska', '.mkv'),
+    (b'FLV\x01\x05\x00\x00\x00\x09', '.flv'),
+    (b'RIFF\x24\x08\x00\x00WAVEfmt ', '.wav'),
+    (b'RIFF\x24\x08\x00\x00AVI LIST', '.avi'),
+    (b'RIFF\x24\x08\x00\x00WEBPVP8 ', None),
+    (b'ID3\x04\x00\x00\x00\x00\x00\x00', '.mp3'),
+    (b'\xff\xfb\x90\x64\x00', '.mp3'),
+    (b'\xff\xf1\x50\x80\x02\x1f\xfc', '.aac'),
+    (b'OggS\x00\x02\x00\x00', '.ogg'),
+    (b'fLaC\x00\x00\x00\x22', '.flac'),
+    (b'\x30\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c', '.wmv'),
+    (b'\x00\x00\x01\xba\x44\x00\x04\x00', '.mpg'),
+    (b'.RMF\x00\x00\x00\x12', '.rm'),
+    (TS_HEAD, '.ts'),
+])
+def test_media_signatures(head, expected):
+    assert sniff(head) == expected
+
+
+@pytest.mark.parametrize('head', [
+    b'<!DOCTYPE html><html><head>',
+    b'\xef\xbb\xbf\r\n  <html lang="zh">',
+    b'<?xml version="1.0"?><Error><Code>AccessDenied</Code></Error>',
+    b'<!-- comment -->\n<div>',
+    b'\n\n<script>location.href="/login"</script>',
+    '<p>提示</p><html>'.encode('utf-8'),
+])
+def test_pages(head):
+    assert sniff(head) == PAGE
+
+
+@pytest.mark.parametrize('head', [
+    b'{"code": 403, "message": "Forbidden"}',
+    'File not found：文件不存在'.encode('utf-8'),
+    # 截断在多字节字符中间
+    '链接已失效'.encode('utf-8')[:-1],
+])
+def test_text(head):
+    assert sniff(head) == TEXT
+
+
+@pytest.mark.parametrize('head', [
+    b'',
+    b'\x00\x01\x02\x03binary',
+    b'\x89PNG\r\n\x1a\n',
+    b'\xff\xe0\x00\x10JFIF',        # 帧同步字但layer为0
+    b'\x47' + b'\x00' * 100,        # TS同步字节但只有一个包
+    '文本'.encode('gbk') + b'\xff',
+])
+def test_unknown(head):
+    assert sniff(head) is None
+
+
+def test_sniff_file(tmp_path):
+    video = tmp_path / 'video'
+    video.write_bytes(b'\x00\x00\x00\x20ftypisom' + b'\x00' * 100)
+    page = tmp_path / 'page'
+    page.write_bytes(b'<html></html>')
+    assert sniff_file(str(video)) == '.mp4'
+    assert sniff_file(str(page)) is None
+    assert sniff_file(str(tmp_path / 'missing')) is None
+
+
+def test_media_sniffer_rejects_pages_and_counts():
+    sniffer = MediaSniffer()
+    assert sniffer(b'FLV\x01\x05') == '.flv'
+    assert sniffer(b'\x00\x01\x02') is None
+    with pytest.raises(NotMediaError, match='网页'):
+        sniffer(b'<html>' + b' ' * 994)
+    with pytest.raises(RejectedResponse, match='文本'):
+        sniffer(b'error')
+    sniffer.add_wasted(2048)
+
+    stats = sniffer.take_stats()
+    assert (stats.checked, stats.rejected, stats.wasted_bytes) == (4, 3, 1000 + 5 + 2048)
+    assert '拒绝 3 个' in stats.summary()
+    stats = sniffer.take_stats()
+    assert (stats.checked, stats.rejected, stats.wasted_bytes) == (0, 0, 0)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试内容寻址的媒体存储
+"""
+
+import hashlib
+import json
+import os
+
+import pytest
+
+from cache_eviction import CacheEvictor
+from media_store import MediaStore
+
+MP4 = b'\x00\x00\x00\x20ftypisom' + b'\x00' * 1000
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MediaStore(str(tmp_path / 'cache'))
+
+
+def stage(store, url, data=MP4):
+    path = store.staging_path(url, '.tmp')
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path, hashlib.sha256(data).hexdigest()
+
+
+def test_same_content_is_stored_once(store):
+    staged, digest = stage(store, 'http://a.com/1')
+    first = store.add('http://a.com/1', staged, digest, '春江花月夜')
+    staged, _ = stage(store, 'http://b.com/2?utm_source=wx')
+    second = store.add('http://b.com/2?utm_source=wx', staged, digest, '春江花月夜（重复提交）')
+
+    assert first == second == store.object_path(digest, '.mp4')
+    assert not os.path.exists(staged)
+    assert open(first, 'rb').read() == MP4
+    assert store.stats() == (2, 1, len(MP4))
+    assert sorted(store.names(digest)) == ['春江花月夜', '春江花月夜（重复提交）']
+    # 链接按规范化后的形式查找
+    assert store.lookup('http://B.com/2') == first
+    assert store.digest_of('http://a.com/1') == digest
+
+
+def test_missing_object_is_replaced(store):
+    staged, digest = stage(store, 'http://a.com/1')
+    path = store.add('http://a.com/1', staged, digest)
+    os.remove(path)
+    assert store.lookup('http://a.com/1') is None
+
+    staged, _ = stage(store, 'http://a.com/2')
+    assert store.add('http://a.com/2', staged, digest) == path
+    assert os.path.exists(path)
+
+
+def test_forget_keeps_shared_file(store):
+    staged, digest = stage(store, 'http://a.com/1')
+    path = store.add('http://a.com/1', staged, digest)
+    staged, _ = stage(store, 'http://a.com/2')
+    store.add('http://a.com/2', staged, digest)
+
+    store.forget('http://a.com/1')
+    assert store.lookup('http://a.com/1') is None
+    assert store.lookup('http://a.com/2') == path
+
+
+def test_pinned_object_is_not_removed(store):
+    staged, digest = stage(store, 'http://a.com/1')
+    path = store.add('http://a.com/1', staged, digest)
+    store.pin('http://a.com/1')
+    assert store.remove_object(digest) == 0
+    assert os.path.exists(path)
+
+    store.unpin('http://a.com/1')
+    assert store.remove_object(digest) == len(MP4)
+    assert not os.path.exists(path)
+    assert store.lookup('http://a.com/1') is None
+    assert store.stats() == (0, 0, 0)
+
+
+def import_legacy(store, tmp_path, paths):
+    history = tmp_path / 'download_history.json'
+    history.write_text(json.dumps(paths), encoding='utf-8')
+    store.import_history(str(history))
+
+
+def test_legacy_files_count_and_can_be_evicted(store, tmp_path):
+    legacy = tmp_path / 'old.mp4'
+    legacy.write_bytes(b'x' * 3000)
+    import_legacy(store, tmp_path, {'http://a.com/old': str(legacy),
+                                    'http://a.com/old?spm=1': str(legacy),
+                                    'http://a.com/gone': str(tmp_path / 'gone.mp4')})
+    assert (tmp_path / 'download_history.json.migrated').exists()
+    staged, digest = stage(store, 'http://a.com/new')
+    path = store.add('http://a.com/new', staged, digest)
+
+    # 写法不同的同一链接合并为一条记录
+    assert store.stats() == (2, 2, 3000 + len(MP4))
+    assert store.total_size() == 3000 + len(MP4)
+    entry = next(entry for entry in store.entries() if entry['digest'] is None)
+    assert entry['path'] == str(legacy) and entry['size'] == 3000
+    assert entry['urls'] == ['http://a.com/old']
+
+    store.lookup('http://a.com/new')  # 新文件最近用过，旧版文件先被淘汰
+    evictor = CacheEvictor(store, budget=2 * len(MP4))
+    assert evictor.evict() == 3000
+    assert not legacy.exists()
+    assert all(entry['digest'] is not None for entry in store.entries())
+    assert store.lookup('http://a.com/new') == path
+    assert store.total_size() == len(MP4)
+
+
+def test_pinned_legacy_file_is_kept(store, tmp_path):
+    legacy = tmp_path / 'old.mp4'
+    legacy.write_bytes(b'x' * 3000)
+    import_legacy(store, tmp_path, {'http://a.com/old': str(legacy)})
+    store.pin('http://a.com/old')
+    assert store.remove_legacy(str(legacy)) == 0
+    assert legacy.exists()
+    store.unpin('http://a.com/old')
+    assert store.remove_legacy(str(legacy)) == 3000
+    assert not legacy.exists()
+    assert store.stats() == (0, 0, 0)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试预取：下载池忙时只取开头、空闲后取完、选择改变时取消、正式下载时计为命中
+（conftest中的本地文件服务，预取用可续传的download_to_file）
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+import prefetch
+from conftest import CONTENT
+from file_download import download_to_file, part_paths
+from http_pool import HTTPConnectionPool
+from prefetch import Prefetcher
+
+HEAD_BYTES = 64 * 1024
+
+
+@pytest.fixture
+def pool():
+    pool = HTTPConnectionPool(timeout=5)
+    yield pool
+    pool.close()
+
+
+class Cache:
+    """按名称保存在临时目录中的媒体缓存；idle为下载池是否空闲"""
+
+    def __init__(self, pool, directory):
+        self.pool = pool
+        self.directory = directory
+        self.idle = False
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def fetch(self, url, name, progress):
+        return download_to_file(self.pool, url, self.path(name), progress=progress,
+                                max_segments=1)
+
+    def cached(self, url):
+        return os.path.exists(self.path(url.rsplit('/', 1)[1]))
+
+
+@pytest.fixture
+def cache(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch, 'SETTLE_DELAY', 0)
+    return Cache(pool, str(tmp_path))
+
+
+@pytest.fixture
+def prefetcher(cache):
+    prefetcher = Prefetcher(cache.fetch, cache.cached, lambda: cache.idle,
+                            head_bytes=HEAD_BYTES)
+    prefetcher.start()
+    yield prefetcher
+    prefetcher.stop()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, '等待超时'
+        time.sleep(0.01)
+
+
+def candidates(server, *names):
+    return [(f'{server.base_url}/{name}', name) for name in names]
+
+
+def test_busy_pool_prefetches_head_then_resumes(prefetcher, cache, server):
+    prefetcher.update(candidates(server, 'a.mp4'))
+    wait_until(lambda: prefetcher.stats().prefetched == 1)
+    with open(part_paths(cache.path('a.mp4'))[1], encoding='utf-8') as f:
+        fetched = json.load(f)['bytes']
+    assert HEAD_BYTES <= fetched < len(CONTENT)
+    assert not cache.cached(f'{server.base_url}/a.mp4')
+
+    # 正式下载：用到了预取的开头，从.part文件续传
+    url = f'{server.base_url}/a.mp4'
+    assert prefetcher.claim(url)
+    download_to_file(cache.pool, url, cache.path('a.mp4'), max_segments=1)
+    prefetcher.release(url)
+    assert server.requests[-1]['Range'] == f'bytes={fetched}-'
+    assert open(cache.path('a.mp4'), 'rb').read() == CONTENT
+    stats = prefetcher.stats()
+    assert stats.hits == 1 and stats.hit_rate == 1.0
+
+
+def test_idle_pool_completes_prefetched_head(prefetcher, cache, server):
+    prefetcher.update(candidates(server, 'a.mp4'))
+    wait_until(lambda: prefetcher.stats().prefetched == 1)
+    cache.idle = True
+    prefetcher.wakeup()
+    wait_until(lambda: cache.cached(f'{server.base_url}/a.mp4'))
+    assert open(cache.path('a.mp4'), 'rb').read() == CONTENT
+    assert prefetcher.stats().prefetched == 1
+
+
+def test_plan_in_order_skipping_cached(prefetcher, cache, server):
+    cache.idle = True
+    with open(cache.path('b.mp4'), 'wb') as f:
+        f.write(CONTENT)
+    # 写法不同的同一链接只预取一次
+    plan = candidates(server, 'a.mp4', 'b.mp4', 'c.mp4', 'd.mp4')
+    plan.insert(1, (f'{server.base_url}/a.mp4#t=1', 'a.mp4'))
+    prefetcher.update(plan)
+    wait_until(lambda: prefetcher.stats().prefetched == 2)
+    assert [path for _, path in server.paths] == ['/a.mp4', '/c.mp4']
+    assert not cache.cached(f'{server.base_url}/d.mp4')
+
+
+def test_selection_change_cancels_prefetch(prefetcher, cache, server):
+    server.delay = 0.3
+    prefetcher.update(candidates(server, 'a.mp4'))
+    wait_until(lambda: server.paths)
+    server.delay = 0
+    prefetcher.update(candidates(server, 'b.mp4'))
+    wait_until(lambda: prefetcher.stats().prefetched == 1)
+    stats = prefetcher.stats()
+    assert stats.cancelled == 1
+    assert [path for _, path in server.paths] == ['/a.mp4', '/b.mp4']
+    assert not prefetcher.claim(f'{server.base_url}/a.mp4')
+
+
+def test_failed_link_is_not_retried(prefetcher, cache, server):
+    server.missing.add('/gone.mp4')
+    logs = []
+    prefetcher.log = logs.append
+    prefetcher.update(candidates(server, 'gone.mp4'))
+    wait_until(lambda: logs)
+    prefetcher.wakeup()
+    time.sleep(0.1)
+    assert server.paths == [('GET', '/gone.mp4')]
+    assert logs[0].startswith('预取失败 gone.mp4')
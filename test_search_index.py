@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试n-gram搜索索引：查询结果与逐行子串扫描一致；后台搜索线程的防抖和取消
+"""
+
+import random
+import threading
+import time
+
+import pytest
+
+from search_index import NGramIndex, SearchCancelled, SearchWorker
+
+FIELDS = ['作品名称', '身份证名字']
+ALPHABET = '春江花月夜山水清音abcAB12 '
+
+
+def random_rows(count, seed=1):
+    rng = random.Random(seed)
+    word = lambda: ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12)))
+    return [{'作品名称': word(), '身份证名字': word()} for _ in range(count)]
+
+
+def scan(rows, query):
+    """参照结果：逐行在每个字段中查找子串（不区分大小写）"""
+    query = query.lower()
+    return [i for i, row in enumerate(rows)
+            if any(query in (row[field] or '').lower() for field in FIELDS)]
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return random_rows(500)
+
+
+@pytest.fixture(scope='module')
+def index(rows):
+    index = NGramIndex()
+    index.build(rows, FIELDS)
+    return index
+
+
+def test_matches_substring_scan(rows, index):
+    rng = random.Random(2)
+    for _ in range(300):
+        field = rows[rng.randrange(len(rows))][rng.choice(FIELDS)]
+        if not field:
+            continue
+        start = rng.randrange(len(field))
+        query = field[start:start + rng.randint(1, 6)]
+        assert index.search(query) == scan(rows, query), query
+
+
+def test_queries_not_in_any_row(rows, index):
+    for query in ('夜夜夜夜夜夜夜', 'zz', '春江花月夜山水清音'):
+        assert index.search(query) == scan(rows, query)
+
+
+def test_case_insensitive_and_empty_query(rows, index):
+    assert index.search('AB') == index.search('ab') == scan(rows, 'ab')
+    assert index.search('') is None
+
+
+def test_grams_do_not_span_fields():
+    index = NGramIndex()
+    index.build([{'作品名称': '春江', '身份证名字': '花月'}], FIELDS)
+    assert index.search('江花') == []
+    assert index.search('春江') == [0]
+
+
+def test_incremental_add_matches_build(rows):
+    built = NGramIndex()
+    built.build(rows, FIELDS)
+    added = NGramIndex()
+    for start in range(0, len(rows), 64):
+        added.add(rows[start:start + 64], FIELDS)
+    for query in ('春', '花月', '山水清', 'ab1 ', '江花月夜'):
+        assert added.search(query) == built.search(query)
+
+
+def test_cancelled_search_raises(index):
+    with pytest.raises(SearchCancelled):
+        index.search('春', cancelled=lambda: True)
+
+
+class FakeIndex:
+    """记录查询；slow为True时一直运行到被取消"""
+
+    def __init__(self, slow=False):
+        self.slow = slow
+        self.queries = []
+        self.started = threading.Event()
+
+    def search(self, query, cancelled=None):
+        self.queries.append(query)
+        self.started.set()
+        while self.slow and query == 'slow':
+            if cancelled():
+                raise SearchCancelled()
+            time.sleep(0.005)
+        return [query]
+
+
+@pytest.fixture
+def results():
+    return []
+
+
+def start_worker(index, results, debounce=0.05):
+    worker = SearchWorker(index, lambda generation, row_ids: results.append((generation, row_ids)),
+                          debounce=debounce)
+    worker.start()
+    return worker
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, '等待超时'
+        time.sleep(0.005)
+
+
+def test_worker_debounces_typing(results):
+    index = FakeIndex()
+    worker = start_worker(index, results)
+    for query in ('春', '春江', '春江花'):
+        worker.submit(query)
+    wait_until(lambda: results)
+    time.sleep(0.1)
+    worker.stop()
+    assert index.queries == ['春江花']
+    assert results == [(3, ['春江花'])]
+
+
+def test_worker_cancels_running_search(results):
+    index = FakeIndex(slow=True)
+    worker = start_worker(index, results)
+    worker.submit('slow')
+    assert index.started.wait(5)
+    worker.submit('fast')
+    wait_until(lambda: results)
+    worker.stop()
+    assert index.queries == ['slow', 'fast']
+    assert results == [(2, ['fast'])]
+
+
+def test_worker_cancel_drops_pending_query(results):
+    index = FakeIndex()
+    worker = start_worker(index, results, debounce=0.1)
+    worker.submit('春')
+    worker.cancel()
+    time.sleep(0.3)
+    worker.stop()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert index.queries == [] and results == []
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试界面事件队列：回调的执行顺序、刷新的合并、进度和日志的合并，
+以及工作线程通过ask在主线程中取得回答
+"""
+
+import threading
+
+import pytest
+
+from ui_events import UIEventQueue
+
+
+def run_calls(update):
+    for func, args in update.calls:
+        func(*args)
+
+
+def test_drain_without_events():
+    assert UIEventQueue().drain() is None
+
+
+def test_calls_keep_submission_order():
+    events = UIEventQueue()
+    order = []
+    events.call(order.append, 'A')
+    events.call(order.append, 'B')
+    events.call(order.append, 'A')
+    run_calls(events.drain())
+    assert order == ['A', 'B', 'A']
+    assert events.drain() is None
+
+
+def test_refresh_runs_once_at_last_position():
+    events = UIEventQueue()
+    order = []
+    events.refresh(order.append, 'row 1')
+    events.call(order.append, 'B')
+    events.refresh(order.append, 'row 2')
+    events.refresh(order.append, 'row 1')
+    run_calls(events.drain())
+    assert order == ['B', 'row 2', 'row 1']
+
+
+def test_refresh_with_unhashable_args_is_not_merged():
+    events = UIEventQueue()
+    order = []
+    events.refresh(order.extend, ['x'])
+    events.refresh(order.extend, ['x'])
+    run_calls(events.drain())
+    assert order == ['x', 'x']
+
+
+def test_latest_values_and_merged_logs():
+    events = UIEventQueue()
+    for value in (10, 20, 30):
+        events.progress(value)
+        events.item_progress('001', value)
+    events.item_progress('002', 5)
+    events.status('下载中')
+    events.status('完成')
+    events.log('第一行')
+    events.log('第二行')
+
+    update = events.drain()
+    assert update.progress == 30
+    assert update.status == '完成'
+    assert update.item_progress == {'001': 30, '002': 5}
+    lines = update.log_text.splitlines()
+    assert [line.split('] ', 1)[1] for line in lines] == ['第一行', '第二行']
+
+
+def drain_until(events, thread):
+    """模拟主线程的帧循环，直到工作线程结束"""
+    while thread.is_alive():
+        update = events.drain()
+        if update is not None:
+            run_calls(update)
+        thread.join(0.01)
+
+
+def test_ask_returns_answer_from_main_thread():
+    events = UIEventQueue()
+    result = []
+    main_thread = threading.current_thread()
+
+    def question(host):
+        assert threading.current_thread() is main_thread
+        return f'允许 {host}'
+
+    worker = threading.Thread(target=lambda: result.append(events.ask(question, 'a.com')))
+    worker.start()
+    drain_until(events, worker)
+    assert result == ['允许 a.com']
+
+
+def test_ask_raises_error_in_worker():
+    events = UIEventQueue()
+    errors = []
+
+    def question():
+        raise ValueError('对话框出错')
+
+    def ask():
+        with pytest.raises(ValueError) as info:
+            events.ask(question)
+        errors.append(str(info.value))
+
+    worker = threading.Thread(target=ask)
+    worker.start()
+    drain_until(events, worker)
+    assert errors == ['对话框出错']
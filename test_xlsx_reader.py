@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试xlsx流式读取（测试文件用zipfile现场生成）
+"""
+
+import zipfile
+
+import pytest
+
+from xlsx_reader import XLSXStream
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+WORKBOOK = f'''<?xml version="1.0" encoding="UTF-8"?>
+<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">
+<sheets><sheet name="报名表" sheetId="1" r:id="rId3"/></sheets></workbook>'''
+
+WORKBOOK_RELS = f'''<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="{PACKAGE_REL_NS}">
+<Relationship Id="rId3" Type="{REL_NS}/worksheet" Target="worksheets/data.xml"/>
+</Relationships>'''
+
+SHARED_STRINGS = f'''<?xml version="1.0" encoding="UTF-8"?>
+<sst xmlns="{MAIN_NS}">
+<si><t>作品名称</t></si>
+<si><t>展演号码</t></si>
+<si><t>资料链接</t></si>
+<si><r><t>春江</t></r><r><t>花月夜</t></r><rPh><t>チュン</t></rPh></si>
+</sst>'''
+
+SHEET = f'''<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="{MAIN_NS}"><sheetData>
+<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c></row>
+<row r="2"><c r="A2" t="s"><v>3</v></c><c r="B2"><v>12.0</v></c>
+  <c r="C2" t="inlineStr"><is><t>http://example.com/1.mp4</t></is></c></row>
+<row r="3"></row>
+<row r="4"><c r="A4" t="inlineStr"><is><t>茉莉花</t></is></c><c r="C4" t="b"><v>1</v></c></row>
+<row r="5"><c r="B5"><v>3.5</v></c></row>
+<row r="6"><c r="A6" t="str"><v>公式结果</v></c><c r="E6" t="inlineStr"><is><t>多出</t></is></c></row>
+</sheetData></worksheet>'''
+
+
+@pytest.fixture
+def xlsx_path(tmp_path):
+    path = tmp_path / 'works.xlsx'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('xl/workbook.xml', WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        archive.writestr('xl/sharedStrings.xml', SHARED_STRINGS)
+        archive.writestr('xl/worksheets/data.xml', SHEET)
+    return str(path)
+
+
+def test_reads_first_sheet_rows(xlsx_path):
+    stream = XLSXStream(xlsx_path)
+    rows = list(stream)
+    assert stream.columns == ['作品名称', '展演号码', '资料链接']
+    assert rows == [
+        {'作品名称': '春江花月夜', '展演号码': '12', '资料链接': 'http://example.com/1.mp4'},
+        {'作品名称': '茉莉花', '展演号码': '', '资料链接': 'TRUE'},
+        {'作品名称': '', '展演号码': '3.5', '资料链接': ''},
+        {'作品名称': '公式结果', '展演号码': '', '资料链接': '', None: ['', '多出']},
+    ]
+    assert stream.bytes_read == stream.total_bytes
+
+
+def test_not_a_workbook(tmp_path):
+    path = tmp_path / 'broken.xlsx'
+    path.write_bytes(b'not a zip file')
+    with pytest.raises(Exception, match='无法读取Excel文件'):
+        XLSXStream(str(path))
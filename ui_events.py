@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+界面事件队列
+工作线程不直接调用Tk（包括root.after），只把日志、进度、状态和需要在主线程
+执行的回调放进线程安全的队列。主线程按固定帧率（最多约30次/秒）取出并合并：
+整体进度和状态只保留最新值，每个项目的进度只保留最新值，同一帧的多条日志
+合成一次插入。下载很快时也不会塞满Tk的事件队列。
+回调按提交顺序执行；只有用refresh提交的回调（重新读取当前状态的刷新，重复
+执行结果相同）会合并，同一帧中相同的刷新只在最后一次提交的位置执行一次。
+"""
+
+import queue
+import time
+
+
+# 界面刷新间隔（毫秒），约30帧/秒
+FRAME_INTERVAL = 33
+
+# 事件类型
+LOG = 'log'
+PROGRESS = 'progress'
+STATUS = 'status'
+ITEM_PROGRESS = 'item_progress'
+CALL = 'call'
+REFRESH = 'refresh'
+
+
+class UIUpdate:
+    """一帧内合并后的界面更新"""
+
+    def __init__(self):
+        self.logs = []              # 带时间戳的日志行
+        self.progress = None        # 整体进度（最新值）
+        self.status = None          # 状态文字（最新值）
+        self.item_progress = {}     # 项目 -> 进度（最新值）
+        self.calls = []             # [(func, args)]，按提交顺序，重复的刷新只执行一次
+
+    @property
+    def log_text(self):
+        return ''.join(self.logs)
+
+
+class UIEventQueue:
+    """线程安全的界面事件队列（任意线程提交，主线程drain）"""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def log(self, message):
+        timestamp = time.strftime('%H:%M:%S')
+        self._queue.put((LOG, None, f"[{timestamp}] {message}\n"))
+
+    def progress(self, value):
+        self._queue.put((PROGRESS, None, value))
+
+    def status(self, message):
+        self._queue.put((STATUS, None, message))
+
+    def item_progress(self, key, value):
+        self._queue.put((ITEM_PROGRESS, key, value))
+
+    def call(self, func, *args):
+        """在主线程中执行func(*args)"""
+        self._queue.put((CALL, func, args))
+
+    def refresh(self, func, *args):
+        """在主线程中执行func(*args)；func只刷新界面，同一帧内相同的刷新合并为一次"""
+        self._queue.put((REFRESH, func, args))
+
+    def ask(self, func, *args):
+        """在主线程中执行func(*args)并等待返回值（只能在工作线程中调用）"""
+        answer = queue.Queue(maxsize=1)
+
+        def run():
+            try:
+                answer.put((True, func(*args)))
+            except Exception as e:
+                answer.put((False, e))
+
+        self.call(run)
+        ok, value = answer.get()
+        if not ok:
+            raise value
+        return value
+
+    def drain(self):
+        """取出目前的全部事件并合并；没有事件时返回None"""
+        update = None
+        refreshes = {}      # (func, args) -> 在calls中的位置
+        while True:
+            try:
+                kind, key, value = self._queue.get_nowait()
+            except queue.Empty:
+                if update is not None:
+                    update.calls = [call for call in update.calls if call is not None]
+                return update
+
+            if update is None:
+                update = UIUpdate()
+            if kind == LOG:
+                update.logs.append(value)
+            elif kind == PROGRESS:
+                update.progress = value
+            elif kind == STATUS:
+                update.status = value
+            elif kind == ITEM_PROGRESS:
+                update.item_progress[key] = value
+            elif kind == REFRESH:
+                # 保留最后一次：刷新在它之前提交的全部回调之后执行
+                try:
+                    previous = refreshes.get((key, value))
+                    if previous is not None:
+                        update.calls[previous] = None
+                    refreshes[(key, value)] = len(update.calls)
+                except TypeError:
+                    pass  # 参数不可哈希，不合并
+                update.calls.append((key, value))
+            else:
+                update.calls.append((key, value))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+链接规范化
+报名表中同一个资料链接常以不同的写法出现（集体项目的多行、重复提交、从
+不同渠道复制的分享链接）。规范化后的链接用作媒体缓存和下载任务的键：
+协议和主机名转为小写，去掉默认端口和#片段，查询参数去掉跟踪参数后按名称
+排序。实际请求时仍使用原来的链接。
+"""
+
+import urllib.parse
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# 只用于统计来源、不影响内容的查询参数
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'yclid', 'msclkid', 'mc_cid', 'mc_eid', 'spm', 'spm_id_from',
+    'from_spmid', 'vd_source', 'share_source', 'share_medium', 'share_plat',
+    'share_session_id', 'share_tag', 'share_from', 'sharesource', 'timestamp_share',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url):
+    """规范化的链接（用作键），不是http(s)链接时原样返回（去掉首尾空白）"""
+    url = (url or '').strip()
+    try:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname  # 已是小写
+    if ':' in host:
+        host = f'[{host}]'  # IPv6地址
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f'{host}:{port}'
+    if parts.username is not None:
+        userinfo = parts.username + (f':{parts.password}' if parts.password is not None else '')
+        host = f'{userinfo}@{host}'
+
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    query = sorted((name, value) for name, value in query if not _is_tracking(name))
+    return urllib.parse.urlunsplit((scheme, host, parts.path or '/',
+                                    urllib.parse.urlencode(query), ''))
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel(.xlsx)流式读取
+只使用标准库：zipfile解压，ElementTree.iterparse逐行解析工作表，
+每处理完一行就清除已解析的元素，内存占用与表格行数无关。
+接口与CSVStream相同（columns、bytes_read、total_bytes、逐行产出字典），
+可直接用于流式导入。
+"""
+
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+from catalog_store import TextColumn
+
+
+# 关系文件中的命名空间
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+DEFAULT_SHEET = 'xl/worksheets/sheet1.xml'
+
+# 每次解压、送入解析器的字节数
+READ_SIZE = 64 * 1024
+
+
+def _local(tag):
+    """去掉命名空间的标签名（兼容Transitional与Strict两种格式）"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _namespace(tag):
+    """标签的命名空间前缀（含花括号）"""
+    return tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+
+
+def _column_index(letters):
+    """列字母（如"AB"）转为从0开始的列号"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _number_text(value):
+    """数值单元格转为文本：整数去掉多余的小数部分（电话、号码列常被存为数值）"""
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    if number.is_integer() and abs(number) < 1e15:
+        return str(int(number))
+    return value
+
+
+class XLSXStream:
+    """流式xlsx读取器（读取第一个工作表）
+
+    第一行非空行作为表头；空白单元格读为空字符串，完全空白的行跳过。
+    日期等按样式显示的数值保留为Excel中存储的数值。
+    """
+
+    csv_format = None
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.columns = None
+        self._bytes_read = None
+
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                self.sheet_name = self._first_sheet(archive)
+                self.total_bytes = archive.getinfo(self.sheet_name).file_size
+        except (zipfile.BadZipFile, KeyError) as e:
+            raise Exception(f"无法读取Excel文件: {e}")
+
+    @property
+    def bytes_read(self):
+        if self._bytes_read is None:
+            return self.total_bytes
+        return self._bytes_read
+
+    @staticmethod
+    def _first_sheet(archive):
+        """按workbook.xml和关系文件找到第一个工作表的路径"""
+        names = set(archive.namelist())
+        try:
+            workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+            rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        except KeyError:
+            if DEFAULT_SHEET in names:
+                return DEFAULT_SHEET
+            raise
+
+        targets = {rel.get('Id'): rel.get('Target')
+                   for rel in rels.iter(f'{PACKAGE_REL_NS}Relationship')}
+        for sheet in workbook.iter():
+            if _local(sheet.tag) != 'sheet':
+                continue
+            target = targets.get(sheet.get(f'{REL_NS}id'))
+            if not target:
+                continue
+            if target.startswith('/'):
+                path = target.lstrip('/')
+            else:
+                path = posixpath.normpath(posixpath.join('xl', target))
+            if path in names:
+                return path
+            break
+
+        if DEFAULT_SHEET in names:
+            return DEFAULT_SHEET
+        raise KeyError("找不到工作表")
+
+    @staticmethod
+    def _read_shared_strings(archive):
+        """读取共享字符串表（紧凑存放，不为每个字符串保留元素对象）"""
+        strings = TextColumn()
+        try:
+            f = archive.open('xl/sharedStrings.xml')
+        except KeyError:
+            return strings
+
+        with f:
+            root = None
+            parts = []
+            phonetic = 0
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                tag = _local(elem.tag)
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    elif tag == 'rPh':
+                        phonetic += 1  # 注音文字不属于单元格内容
+                    continue
+                if tag == 't' and not phonetic:
+                    parts.append(elem.text or '')
+                elif tag == 'rPh':
+                    phonetic -= 1
+                elif tag == 'si':
+                    strings.append(''.join(parts))
+                    parts = []
+                    root.clear()
+        return strings
+
+    def _iter_events(self, f):
+        """分块送入解析器，逐个产出(事件, 元素)"""
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        self._bytes_read = 0
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                parser.close()
+                yield from parser.read_events()
+                return
+            self._bytes_read += len(chunk)
+            parser.feed(chunk)
+            yield from parser.read_events()
+
+    def _iter_cells(self, archive):
+        """逐行产出单元格文本列表"""
+        shared = self._read_shared_strings(archive)
+        column_indexes = {}
+
+        with archive.open(self.sheet_name) as f:
+            events = self._iter_events(f)
+
+            # 命名空间由根元素确定，之后直接比较完整的标签名
+            _, root = next(events)
+            ns = _namespace(root.tag)
+            sheet_data_tag, row_tag, cell_tag = f'{ns}sheetData', f'{ns}row', f'{ns}c'
+            value_tag, text_tag = f'{ns}v', f'{ns}t'
+            sheet_data = root
+
+            for event, elem in events:
+                tag = elem.tag
+                if event == 'start':
+                    if tag == sheet_data_tag:
+                        sheet_data = elem
+                    continue
+                if tag != row_tag:
+                    continue
+
+                values = []
+                for cell in elem.iter(cell_tag):
+                    ref = cell.get('r')
+                    if ref:
+                        letters = ref.rstrip('0123456789')
+                        index = column_indexes.get(letters)
+                        if index is None:
+                            index = column_indexes[letters] = _column_index(letters)
+                        if index > len(values):
+                            values.extend([''] * (index - len(values)))
+
+                    cell_type = cell.get('t')
+                    if cell_type == 'inlineStr':
+                        values.append(''.join(t.text or '' for t in cell.iter(text_tag)))
+                        continue
+                    value = cell.findtext(value_tag)
+                    if value is None:
+                        values.append('')
+                    elif cell_type == 's':
+                        values.append(shared[int(value)])
+                    elif cell_type is None or cell_type == 'n':
+                        values.append(_number_text(value))
+                    elif cell_type == 'b':
+                        values.append('TRUE' if value == '1' else 'FALSE')
+                    else:
+                        values.append(value)  # str（公式结果）、e（错误值）等
+
+                # 已处理的行不再保留
+                sheet_data.clear()
+                yield values
+
+    def __iter__(self):
+        with zipfile.ZipFile(self.file_path) as archive:
+            columns = None
+            for values in self._iter_cells(archive):
+                if not any(values):
+                    continue
+                if columns is None:
+                    while values and not values[-1]:
+                        values.pop()
+                    columns = self.columns = values
+                    continue
+
+                # 与DictReader一致：缺少的列补空，多出的列放在键None下
+                row = dict(zip(columns, values))
+                if len(values) < len(columns):
+                    for key in columns[len(values):]:
+                        row[key] = ''
+                elif len(values) > len(columns) and any(values[len(columns):]):
+                    row[None] = values[len(columns):]
+                yield row
@@ -9,52 +9,88 @@
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import urllib.request
 import urllib.parse
 import os
 import threading
 import time
-import json
+import hashlib
 import subprocess
 import sys
-import csv
 import re
 from pathlib import Path
-import ssl
 import socket
+import queue
+import shutil
 
-# 禁用SSL验证（处理某些下载链接的SSL问题）
-ssl._create_default_https_context = ssl._create_unverified_context
+from catalog_snapshot import file_fingerprint, load_snapshot, save_snapshot_in_background
+from catalog_store import CatalogStore, MappedCatalog
+from csv_loader import CSVStream, CSVImportWorker, MappedCSV, open_stream
+from download_pool import (BULK, DONE, FAILED, FINISHED_STATES, INTERACTIVE, RUNNING,
+                           DownloadCancelled, DownloadPool)
+from download_schedule import (DEFAULT_SLOT_MINUTES, ShowSchedule, estimate_ready, parse_clock,
+                               show_order_key)
+from file_download import download_to_file
+from http_pool import shared_pool
+from link_probe import LinkProber, format_size
+from media_sniff import MediaSniffer, NotMediaError
+from media_store import MediaStore, media_extension
+from ui_events import FRAME_INTERVAL, UIEventQueue
+from url_canon import canonical_url
+from xlsx_reader import XLSXStream
+
+# 流式导入：轮询间隔（毫秒）和每次最多插入列表的行数
+IMPORT_POLL_INTERVAL = 50
+IMPORT_ROWS_PER_TICK = 2000
+
+# 目录快照的类别名
+SNAPSHOT_PROFILE = 'langrun'
+
+# 下载并发数（总数和每个站点），以及下载进度的刷新间隔（毫秒）
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_PER_HOST = 2
+DOWNLOAD_POLL_INTERVAL = 200
+
+# 估计就绪时间的间隔（秒），以及日志中最多列出的有风险的展演号码数
+ESTIMATE_INTERVAL = 2.0
+AT_RISK_LOG_LIMIT = 10
+# 日志中最多列出的网页/失效链接数
+PROBE_LOG_LIMIT = 10
 
 class SimpleExcelReader:
     """简化的Excel读取器（纯Python实现）"""
     
     @staticmethod
     def read_csv(file_path):
-        """读取CSV文件"""
+        """读取CSV文件（自动识别编码和分隔符）"""
+        stream = CSVStream(file_path)
         try:
-            data = []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                data = list(reader)
-                columns = reader.fieldnames
-            return data, columns
-        except UnicodeDecodeError:
-            # 尝试其他编码
-            try:
-                with open(file_path, 'r', encoding='gbk') as f:
-                    reader = csv.DictReader(f)
-                    data = list(reader)
-                    columns = reader.fieldnames
-                return data, columns
-            except:
-                raise Exception("无法读取文件，请确保文件编码为UTF-8或GBK")
+            data = CatalogStore.from_stream(stream)
+        except Exception:
+            raise Exception("无法读取文件，请确保文件编码为UTF-8或GBK")
+        return data, stream.columns
     
     @staticmethod
     def read_excel_simple(file_path):
-        """简单的Excel读取（转换为CSV后读取）"""
-        # 提示用户将Excel转换为CSV
-        raise Exception("请将Excel文件另存为CSV格式后重新导入，或安装pandas库支持Excel文件")
+        """读取Excel文件（.xlsx，逐行解析第一个工作表）"""
+        stream = SimpleExcelReader.open_excel_stream(file_path)
+        return CatalogStore.from_stream(stream), stream.columns
+    
+    @staticmethod
+    def open_excel_stream(file_path):
+        """打开Excel流式读取器（旧版.xls为二进制格式，不支持）"""
+        if file_path.lower().endswith('.xls'):
+            raise Exception("不支持旧版.xls文件，请在Excel中另存为.xlsx或CSV格式后重新导入")
+        return XLSXStream(file_path)
+    
+    @staticmethod
+    def open_stream(file_path):
+        """打开流式读取器（逐行读取，用于后台导入；大文件使用内存映射）"""
+        if file_path.lower().endswith('.csv'):
+            return open_stream(file_path)
+        elif file_path.lower().endswith(('.xlsx', '.xls')):
+            return SimpleExcelReader.open_excel_stream(file_path)
+        else:
+            raise Exception("不支持的文件格式，请使用CSV或Excel文件")
     
     @staticmethod
     def read_file(file_path):
@@ -66,6 +102,37 @@ class SimpleExcelReader:
         else:
             raise Exception("不支持的文件格式，请使用CSV或Excel文件")
 
+class MediaLookup:
+    """展演号码到媒体信息的查找表
+
+    只记录展演号码对应的行号，媒体信息在查找时才从目录中读取，
+    不为每一行再保存一份数据（内存映射模式下目录本身也不保存行内容）
+    """
+    
+    def __init__(self, rows=(), describe=None):
+        self._rows = rows
+        self._describe = describe
+        self._numbers = {}
+        
+    def add(self, performance_number, row_id):
+        self._numbers[performance_number] = row_id
+        
+    def __contains__(self, performance_number):
+        return performance_number in self._numbers
+        
+    def __len__(self):
+        return len(self._numbers)
+        
+    def __getitem__(self, performance_number):
+        return self._describe(self._rows[self._numbers[performance_number]])
+        
+    def items(self):
+        for performance_number, row_id in list(self._numbers.items()):
+            yield performance_number, self._describe(self._rows[row_id])
+            
+    def numbers(self):
+        return list(self._numbers)
+
 class MediaDownloader:
     """媒体文件下载器（纯Python实现）"""
     
@@ -73,29 +140,15 @@ class MediaDownloader:
         self.progress_callback = progress_callback
         self.log_callback = log_callback
         self.download_dir = "downloaded_media"
-        self.downloaded_files = {}
-        self.load_download_history()
+        self.http = shared_pool()  # keep-alive连接池（证书无法校验的站点单独处理）
+        self.http.log = self.log
+        # 按内容摘要保存文件，多行引用同一视频时只保存一份；下载历史保存在
+        # SQLite数据库中，旧版的download_history.json在第一次启动时导入
+        self.store = MediaStore(self.download_dir, log=self.log)
+        self.store.import_history(os.path.join(self.download_dir, "download_history.json"))
+        # 检查每个下载的开头几KB，网页或文本立即中止（统计浪费的字节数）
+        self.sniffer = MediaSniffer()
         
-    def load_download_history(self):
-        """加载下载历史"""
-        history_file = os.path.join(self.download_dir, "download_history.json")
-        if os.path.exists(history_file):
-            try:
-                with open(history_file, 'r', encoding='utf-8') as f:
-                    self.downloaded_files = json.load(f)
-            except Exception as e:
-                self.log(f"加载下载历史失败: {e}")
-                
-    def save_download_history(self):
-        """保存下载历史"""
-        os.makedirs(self.download_dir, exist_ok=True)
-        history_file = os.path.join(self.download_dir, "download_history.json")
-        try:
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.downloaded_files, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            self.log(f"保存下载历史失败: {e}")
-            
     def log(self, message):
         """记录日志"""
         print(f"[{time.strftime('%H:%M:%S')}] {message}")
@@ -113,7 +166,7 @@ class MediaDownloader:
                 safe_name = re.sub(r'[<>:"/\\|?*]', '_', original_name)
                 # 尝试从URL或Content-Type推断扩展名
                 if not '.' in safe_name:
-                    safe_name += '.mp4'  # 默认扩展名
+                    safe_name += '.mp4'  # 默认扩展名（入库时按文件开头的字节改为实际格式）
                 filename = safe_name
             else:
                 filename = f"media_{int(time.time())}.mp4"
@@ -122,52 +175,46 @@ class MediaDownloader:
         filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
         return filename
         
-    def download_file(self, url, display_name, performance_number):
-        """下载单个文件（使用urllib）"""
+    def download_file(self, url, display_name, performance_number, progress=None):
+        """下载单个文件（经连接池复用连接）
+
+        progress(已下载字节数, 总字节数)为本次下载的进度回调，未指定时使用progress_callback
+        """
         try:
-            # 检查是否已下载
-            if url in self.downloaded_files:
-                local_path = self.downloaded_files[url]
-                if os.path.exists(local_path):
-                    self.log(f"文件已存在，跳过下载: {display_name}")
-                    return local_path
-                    
-            filename = self.get_safe_filename(url, display_name)
-            local_path = os.path.join(self.download_dir, filename)
-            
-            # 确保目录存在
-            os.makedirs(self.download_dir, exist_ok=True)
+            # 检查是否已下载（同一链接可能来自其他行）
+            local_path = self.store.lookup(url)
+            if local_path is not None:
+                self.log(f"文件已存在，跳过下载: {display_name}")
+                return local_path
+                
+            ext = media_extension(self.get_safe_filename(url, display_name))
+            staging_path = self.store.staging_path(url, ext)
             
             self.log(f"开始下载: {display_name}")
             
-            # 创建请求
-            req = urllib.request.Request(url)
-            req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-            
-            # 下载文件
-            with urllib.request.urlopen(req, timeout=30) as response:
-                total_size = int(response.headers.get('Content-Length', 0))
-                downloaded = 0
-                
-                with open(local_path, 'wb') as f:
-                    while True:
-                        chunk = response.read(8192)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        if self.progress_callback and total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            self.progress_callback(progress)
-                            
-            # 记录下载成功
-            self.downloaded_files[url] = local_path
-            self.save_download_history()
-            
+            # 下载文件（中断后再次下载时从.part文件续传），边下载边计算SHA-256
+            def report(downloaded, total_size):
+                if progress:
+                    progress(downloaded, total_size)
+                elif self.progress_callback and total_size > 0:
+                    self.progress_callback((downloaded / total_size) * 100)
+                    
+            digest = hashlib.sha256()
+            validators = {}
+            download_to_file(self.http, url, staging_path, progress=report, log=self.log,
+                             digest=digest, validators=validators, sniff=self.sniffer)
+            # 入库并记录下载历史
+            local_path = self.store.add(url, staging_path, digest.hexdigest(), display_name,
+                                        validators['etag'], validators['last_modified'])
+
             self.log(f"下载完成: {display_name}")
             return local_path
             
+        except DownloadCancelled:
+            raise  # 取消或暂停，由下载池处理
+        except NotMediaError as e:
+            self.log(f"文件开头是{e}内容，不是媒体文件，已停止下载: {display_name}")
+            return None
         except Exception as e:
             self.log(f"下载失败 {display_name}: {e}")
             return None
@@ -233,7 +280,22 @@ class LangrunPlayerApp:
         # 数据存储
         self.data = []
         self.columns = []
-        self.media_data = {}
+        self.media_data = MediaLookup()
+        self.media_columns = []
+        self.tree_items = {}    # 展演号码 -> 列表中的行
+        self.item_numbers = {}  # 列表中的行 -> 展演号码
+        
+        # 工作线程送往界面的日志、进度和状态（主线程按帧合并处理）
+        self.ui_events = UIEventQueue()
+        
+        # 流式导入状态
+        self.import_worker = None
+        self.import_pending = []
+        self.import_started = 0
+        self.first_batch_time = None
+        self.import_file_path = None
+        self.import_fingerprint = None
+        self.import_source = None
         
         # 初始化组件
         self.downloader = MediaDownloader(
@@ -241,9 +303,35 @@ class LangrunPlayerApp:
             log_callback=self.add_log
         )
         self.player = SimpleMediaPlayer(log_callback=self.add_log)
+        # 证书无法校验的站点先询问用户，同意后才对该站点不校验证书
+        self.downloader.http.confirm_insecure = self._confirm_insecure
+        
+        # 链接检查：导入后并发检查每个链接的类型和大小，结果保存在目录数据库中
+        self.prober = LinkProber(self.downloader.http, self.downloader.store.catalog)
+        self.probe_results = self.prober.cached_results()  # 链接 -> ProbeResult
+        self.probing = False
+        self.probe_again = False
+        
+        # 下载任务池（所有下载都经过它，限制总并发数和每个站点的并发数）
+        self.download_pool = DownloadPool(
+            DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST,
+            on_status=self._on_download_status,
+            on_idle=self._on_downloads_idle
+        )
+        self.download_polling = False
+        
+        # 演出排期：批量下载按展演号码排队，估计就绪时间并标出可能赶不上上场的作品
+        self.schedule = ShowSchedule()
+        self.job_numbers = {}       # 规范化的下载链接 -> [展演号码]（多行可能引用同一链接）
+        self.at_risk = set()        # 可能赶不上上场时间的展演号码
+        self.last_estimate = 0.0
+        self.ready_text = ''
+        # 点播放时尚未下载的作品：下载完成后自动播放（规范化的链接 -> 作品信息）
+        self.play_when_ready = {}
         
         # 创建界面
         self.create_ui()
+        self.root.after(FRAME_INTERVAL, self._drain_ui_events)
         
     def create_ui(self):
         """创建用户界面"""
@@ -267,17 +355,48 @@ class LangrunPlayerApp:
         control_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 10))
         
         # 文件导入
-        ttk.Button(control_frame, text="导入CSV文件", 
-                  command=self.import_file).grid(row=0, column=0, sticky=tk.W+tk.E, pady=2)
+        import_frame = ttk.Frame(control_frame)
+        import_frame.grid(row=0, column=0, sticky=tk.W+tk.E, pady=2)
+        import_frame.columnconfigure(0, weight=1)
+        
+        ttk.Button(import_frame, text="导入CSV/Excel文件", 
+                  command=self.import_file).grid(row=0, column=0, sticky=tk.W+tk.E)
+        self.cancel_import_btn = ttk.Button(import_frame, text="取消", width=6,
+                                            command=self.cancel_import, state=tk.DISABLED)
+        self.cancel_import_btn.grid(row=0, column=1, padx=(2, 0))
         
         # 提示信息
-        tip_label = ttk.Label(control_frame, text="提示：Excel文件请另存为CSV格式", 
+        tip_label = ttk.Label(control_frame, text="提示：支持CSV和Excel(.xlsx)文件", 
                              font=('Microsoft YaHei', 8), foreground='gray')
         tip_label.grid(row=1, column=0, sticky=tk.W, pady=2)
         
         # 下载控制
-        ttk.Button(control_frame, text="开始下载", 
-                  command=self.start_download).grid(row=2, column=0, sticky=tk.W+tk.E, pady=2)
+        download_frame = ttk.Frame(control_frame)
+        download_frame.grid(row=2, column=0, sticky=tk.W+tk.E, pady=2)
+        download_frame.columnconfigure(0, weight=1)
+        
+        ttk.Button(download_frame, text="开始下载", 
+                  command=self.start_download).grid(row=0, column=0, sticky=tk.W+tk.E)
+        ttk.Button(download_frame, text="停止", width=6,
+                  command=self.stop_download).grid(row=0, column=1, padx=(2, 0))
+        
+        ttk.Label(download_frame, text="并发数:").grid(row=1, column=0, sticky=tk.E, pady=(2, 0))
+        self.workers_var = tk.IntVar(value=DOWNLOAD_WORKERS)
+        ttk.Spinbox(download_frame, from_=1, to=16, width=4, textvariable=self.workers_var,
+                    command=self.update_download_workers).grid(row=1, column=1, padx=(2, 0), pady=(2, 0))
+        
+        # 演出排期（用于估计作品能否在上场前下载好）
+        ttk.Label(download_frame, text="开演时间:").grid(row=2, column=0, sticky=tk.E, pady=(2, 0))
+        self.show_start_var = tk.StringVar()
+        show_start_entry = ttk.Entry(download_frame, textvariable=self.show_start_var, width=6)
+        show_start_entry.grid(row=2, column=1, padx=(2, 0), pady=(2, 0))
+        show_start_entry.bind('<Return>', self.update_show_schedule)
+        show_start_entry.bind('<FocusOut>', self.update_show_schedule)
+        
+        ttk.Label(download_frame, text="节目时长(分):").grid(row=3, column=0, sticky=tk.E, pady=(2, 0))
+        self.slot_minutes_var = tk.IntVar(value=DEFAULT_SLOT_MINUTES)
+        ttk.Spinbox(download_frame, from_=1, to=60, width=4, textvariable=self.slot_minutes_var,
+                    command=self.update_show_schedule).grid(row=3, column=1, padx=(2, 0), pady=(2, 0))
         
         # 进度条
         self.progress_var = tk.DoubleVar()
@@ -319,6 +438,11 @@ class LangrunPlayerApp:
                   command=self.open_download_dir).grid(row=0, column=0, sticky=tk.W+tk.E, pady=2)
         ttk.Button(tools_frame, text="清空下载历史", 
                   command=self.clear_download_history).grid(row=1, column=0, sticky=tk.W+tk.E, pady=2)
+        ttk.Button(tools_frame, text="检查链接", 
+                  command=self.start_probe).grid(row=2, column=0, sticky=tk.W+tk.E, pady=2)
+        self.probe_after_import_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(tools_frame, text="导入后自动检查链接",
+                        variable=self.probe_after_import_var).grid(row=3, column=0, sticky=tk.W, pady=2)
         
         # 中间数据列表
         list_frame = ttk.LabelFrame(main_frame, text="作品列表", padding="10")
@@ -327,7 +451,7 @@ class LangrunPlayerApp:
         list_frame.rowconfigure(0, weight=1)
         
         # 创建Treeview
-        columns = ('展演号码', '姓名', '作品名称', '状态', '文件路径')
+        columns = ('展演号码', '姓名', '作品名称', '状态', '类型', '大小', '文件路径')
         self.tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
         
         # 设置列标题和宽度
@@ -339,7 +463,7 @@ class LangrunPlayerApp:
                 self.tree.column(col, width=100)
             elif col == '作品名称':
                 self.tree.column(col, width=200)
-            elif col == '状态':
+            elif col in ('状态', '类型', '大小'):
                 self.tree.column(col, width=80)
             else:
                 self.tree.column(col, width=300)
@@ -351,6 +475,9 @@ class LangrunPlayerApp:
         self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         
+        # 可能赶不上上场时间的作品
+        self.tree.tag_configure('at_risk', foreground='#D70015')
+        
         # 双击播放
         self.tree.bind('<Double-1>', self.play_selected)
         
@@ -397,8 +524,8 @@ class LangrunPlayerApp:
         item = self.tree.item(selection[0])
         values = item['values']
         
-        if len(values) >= 5 and values[4]:
-            file_path = values[4]
+        if len(values) >= 7 and values[6]:
+            file_path = values[6]
             if os.path.exists(file_path):
                 # 打开文件所在目录
                 if sys.platform.startswith('win'):
@@ -418,32 +545,200 @@ class LangrunPlayerApp:
         if not selection:
             return
             
-        item = self.tree.item(selection[0])
-        values = item['values']
-        performance_number = values[0]
+        # 列表中显示的号码会被Treeview转换成数字（丢掉前导零），要用记录的原值
+        performance_number = self.item_numbers.get(selection[0])
         
         if performance_number in self.media_data:
             data = self.media_data[performance_number]
             if data['url']:
                 # 从下载历史中移除
-                if data['url'] in self.downloader.downloaded_files:
-                    del self.downloader.downloaded_files[data['url']]
-                    self.downloader.save_download_history()
+                self.downloader.store.forget(data['url'])
                 
-                # 重新下载
-                threading.Thread(target=self._redownload_single, args=(data,), daemon=True).start()
+                # 重新下载（与批量下载共用下载池）
+                job = self._submit_download(data)
+                if job.status == RUNNING:
+                    self.add_log(f"正在下载中: {data['work_name']}")
+                self.start_download_polling()
                 
-    def _redownload_single(self, data):
-        """重新下载单个文件"""
-        local_path = self.downloader.download_file(
-            data['url'], 
-            data['work_name'], 
-            data.get('performance_number', '')
+    def _submit_download(self, data, priority=BULK):
+        """把一个作品提交到下载池（同一链接未下载完时返回已有的任务）
+
+        写法不同的同一链接（见url_canon）合并为一个任务，引用它的各行一起更新；
+        批量下载按展演号码排队；priority为INTERACTIVE时优先下载
+        """
+        performance_number = data.get('performance_number', '')
+        key = canonical_url(data['url'])
+        numbers = self.job_numbers.setdefault(key, [])
+        if performance_number not in numbers:
+            numbers.append(performance_number)
+        return self.download_pool.submit(
+            key, data['url'],
+            lambda job: self._download_task(job, data),
+            priority=priority,
+            order=show_order_key(performance_number)
         )
         
+    def play_now(self, data):
+        """播放作品；尚未下载时优先下载（必要时暂停批量下载），下载完成后自动播放"""
+        if data['local_path'] and os.path.exists(data['local_path']):
+            self.player.play_file(data['local_path'])
+            self.add_log(f"播放作品: {data['work_name']} ({data['name']})")
+            return
+        if not data['url']:
+            messagebox.showinfo("提示", f"没有媒体链接: {data['work_name']}")
+            return
+            
+        self.play_when_ready[canonical_url(data['url'])] = data
+        self._submit_download(data, INTERACTIVE)
+        self.add_log(f"优先下载，完成后播放: {data['work_name']}")
+        self.start_download_polling()
+        
+    def _play_when_ready(self, data):
+        """优先下载的作品下载完成后播放（主线程）"""
+        local_path = self.downloader.store.path_of(data['url'])
         if local_path:
-            data['local_path'] = local_path
-            self.root.after(0, self.update_file_list)
+            self.player.play_file(local_path)
+            self.add_log(f"播放作品: {data['work_name']} ({data['name']})")
+        
+    def _download_task(self, job, data):
+        """下载任务（在下载池的工作线程中执行），引用同一链接的各行一起显示进度"""
+        performance_number = data.get('performance_number', '')
+        numbers = self.job_numbers.get(job.key) or [performance_number]
+        
+        def report(downloaded, total_size):
+            job.report(downloaded, total_size)
+            if total_size:
+                for number in list(numbers):
+                    self.ui_events.item_progress(number, downloaded * 100 / total_size)
+                
+        try:
+            local_path = self.downloader.download_file(
+                data['url'], 
+                data['work_name'], 
+                performance_number,
+                progress=report
+            )
+        finally:
+            # 只更新引用这个链接的行
+            for number in list(numbers):
+                self.ui_events.refresh(self.refresh_file_row, number)
+        if not local_path:
+            raise Exception(f"下载失败: {data['work_name']}")
+        return local_path
+        
+    def _on_download_status(self, job):
+        """下载任务状态变化（工作线程中调用）"""
+        if job.status == FAILED and job.error:
+            self.add_log(str(job.error))
+        if job.status in FINISHED_STATES:
+            data = self.play_when_ready.pop(job.key, None)
+            if data is not None and job.status == DONE:
+                self.ui_events.call(self._play_when_ready, data)
+            
+    def _confirm_insecure(self, host, reason):
+        """某个站点的证书无法校验时询问是否仍然连接（工作线程中调用，等待回答）"""
+        return self.ui_events.ask(
+            messagebox.askyesno, "证书无法校验",
+            f"{host} 的证书无法校验（{reason}）。\n\n"
+            f"不校验证书时，连接可能被冒充或篡改。仍然从这个站点下载吗？\n"
+            f"（只对本次运行有效）")
+            
+    def _on_downloads_idle(self, stats):
+        """一批下载全部结束（工作线程中调用）"""
+        self.add_log(f"下载结束：{stats.summary()}，耗时 {stats.elapsed:.1f} 秒")
+        self.add_log(self.downloader.http.stats().summary())
+        self.add_log(self.downloader.sniffer.take_stats().summary())
+        self.update_status(f"下载完成 ({stats.done} 个文件)")
+        self.update_progress(100)
+        
+    def start_download_polling(self):
+        """开始定时刷新下载进度"""
+        if not self.download_polling:
+            self.download_polling = True
+            self.root.after(DOWNLOAD_POLL_INTERVAL, self._poll_download_progress)
+            
+    def _poll_download_progress(self):
+        """刷新整体下载进度（主线程）"""
+        stats = self.download_pool.stats()
+        if not stats.total:
+            self.download_polling = False
+            self.ready_text = ''
+            self._mark_at_risk(set())
+            return
+            
+        self.progress_var.set(stats.progress)
+        status = (f"正在下载 {stats.running} 个，排队 {stats.queued} 个，已完成 {stats.done}/{stats.total}，"
+                  f"{stats.throughput / 1024 / 1024:.2f} MB/s")
+        now = time.time()
+        if now - self.last_estimate >= ESTIMATE_INTERVAL:
+            self.last_estimate = now
+            self.ready_text = self._update_estimates(stats.throughput, now)
+        if self.ready_text:
+            status += f"，{self.ready_text}"
+        self.status_label.config(text=status)
+        self.root.after(DOWNLOAD_POLL_INTERVAL, self._poll_download_progress)
+        
+    def _update_estimates(self, throughput, now):
+        """按当前吞吐量估计各作品的就绪时间，标出可能赶不上上场的作品；返回状态文字"""
+        def deadline_of(job):
+            # 多行引用同一链接时以最早上场的为准
+            deadlines = [self.schedule.deadline(number)
+                         for number in self.job_numbers.get(job.key, ())]
+            return min((d for d in deadlines if d is not None), default=None)
+            
+        estimates = estimate_ready(self.download_pool.scheduled(), throughput, deadline_of, now)
+        if not estimates:
+            return ''
+        at_risk = {number for estimate in estimates if estimate.at_risk
+                   for number in self.job_numbers.get(estimate.job.key, ())}
+        at_risk.discard('')
+        
+        new = sorted(at_risk - self.at_risk, key=show_order_key)
+        if new:
+            listed = '、'.join(new[:AT_RISK_LOG_LIMIT]) + ('等' if len(new) > AT_RISK_LOG_LIMIT else '')
+            self.add_log(f"{len(new)} 个作品可能赶不上上场时间: {listed}")
+        self._mark_at_risk(at_risk)
+        
+        text = f"预计 {time.strftime('%H:%M', time.localtime(estimates[-1].ready_at))} 全部就绪"
+        if at_risk:
+            text += f"，{len(at_risk)} 个可能赶不上"
+        return text
+        
+    def _mark_at_risk(self, numbers):
+        """在列表中标出可能赶不上上场时间的作品"""
+        for number in self.at_risk ^ numbers:
+            item = self.tree_items.get(number)
+            if item is not None and self.tree.exists(item):
+                self.tree.item(item, tags=('at_risk',) if number in numbers else ())
+        self.at_risk = set(numbers)
+        
+    def update_show_schedule(self, event=None):
+        """应用开演时间和节目时长"""
+        text = self.show_start_var.get().strip()
+        start = parse_clock(text)
+        if text and start is None:
+            self.add_log(f"开演时间格式应为 时:分，例如 18:30（当前为 {text}）")
+        try:
+            self.schedule.slot_minutes = max(1, self.slot_minutes_var.get())
+        except (tk.TclError, ValueError):
+            pass
+        self.schedule.start = start
+        self.schedule.set_numbers(self.media_data.numbers())
+        self.last_estimate = 0.0
+        
+    def stop_download(self):
+        """取消全部排队中和下载中的任务"""
+        stats = self.download_pool.stats()
+        if stats.queued or stats.running:
+            self.download_pool.cancel_all()
+            self.add_log("已取消下载")
+            
+    def update_download_workers(self):
+        """调整下载并发数"""
+        try:
+            self.download_pool.set_limits(max_workers=self.workers_var.get())
+        except (tk.TclError, ValueError):
+            pass
             
     def open_download_dir(self):
         """打开下载目录"""
@@ -462,18 +757,73 @@ class LangrunPlayerApp:
         """清空下载历史"""
         result = messagebox.askyesno("确认", "确定要清空下载历史吗？这不会删除已下载的文件。")
         if result:
-            self.downloader.downloaded_files = {}
-            self.downloader.save_download_history()
+            self.downloader.store.forget_all()
             self.update_file_list()
             self.add_log("下载历史已清空")
+            
+    def start_probe(self):
+        """检查全部链接（后台线程）：类型、大小和重定向后的地址"""
+        if not self.media_data:
+            messagebox.showwarning("警告", "请先导入CSV文件")
+            return
+        if self.probing:
+            # 上一次检查（可能已取消）结束后再检查一次
+            self.probe_again = True
+            return
+        self.probing = True
+        threading.Thread(target=self._probe_thread, daemon=True).start()
         
-    def add_log(self, message):
-        """添加日志信息"""
-        timestamp = time.strftime('%H:%M:%S')
-        log_message = f"[{timestamp}] {message}\n"
+    def _probe_after_import(self):
+        """导入完成后自动检查链接"""
+        if self.probe_after_import_var.get() and self.media_data:
+            self.start_probe()
+            
+    def _probe_thread(self):
+        """并发检查链接，逐行更新类型和大小列"""
+        try:
+            numbers = {}  # 链接 -> [展演号码]
+            for performance_number, data in self.media_data.items():
+                if data['url']:
+                    numbers.setdefault(data['url'], []).append(performance_number)
+            total = len(numbers)
+            checked = iter(range(1, total + 1))
+            self.update_status(f"正在检查链接 (0/{total})")
+            
+            def on_result(result):
+                self.probe_results[result.url] = result
+                for performance_number in numbers.get(result.url, ()):
+                    self.ui_events.refresh(self.refresh_file_row, performance_number)
+                done = next(checked)
+                self.update_progress(done * 100 / total)
+                self.update_status(f"正在检查链接 ({done}/{total})")
+                
+            summary = self.prober.run(numbers, on_result)
+            if summary.cancelled:
+                self.add_log(f"链接检查已取消：{summary.summary()}")
+                return
+            self.add_log(summary.summary())
+            
+            unusable = [f"{number}（{result.kind}）" for result in summary.results
+                        if not result.downloadable for number in numbers[result.url]]
+            if unusable:
+                more = f" 等 {len(unusable)} 个" if len(unusable) > PROBE_LOG_LIMIT else ""
+                self.add_log(f"无法直接下载的作品: {', '.join(unusable[:PROBE_LOG_LIMIT])}{more}")
+            self.add_log(f"可下载文件共约 {format_size(summary.download_bytes)}"
+                         + (f"（另有 {summary.unknown_sizes} 个大小未知）" if summary.unknown_sizes else ""))
+            self.update_status("链接检查完成")
+            
+        except Exception as e:
+            self.add_log(f"检查链接出错: {e}")
+            self.update_status("链接检查失败")
+        finally:
+            self.probing = False
+            if self.probe_again:
+                self.probe_again = False
+                self.ui_events.call(self.start_probe)
         
-        # 在主线程中更新GUI
-        self.root.after(0, lambda: self._update_log_text(log_message))
+    def add_log(self, message):
+        """添加日志信息（任意线程，下一帧显示）"""
+        self.ui_events.log(message)
         
     def _update_log_text(self, message):
         """更新日志文本（在主线程中执行）"""
@@ -481,118 +831,322 @@ class LangrunPlayerApp:
         self.log_text.see(tk.END)
         
     def update_progress(self, value):
-        """更新进度条"""
-        self.root.after(0, lambda: self.progress_var.set(value))
+        """更新进度条（任意线程，下一帧显示）"""
+        self.ui_events.progress(value)
         
     def update_status(self, message):
-        """更新状态"""
-        self.root.after(0, lambda: self.status_label.config(text=message))
+        """更新状态（任意线程，下一帧显示）"""
+        self.ui_events.status(message)
+        
+    def _drain_ui_events(self):
+        """按固定帧率处理界面事件（主线程）：合并进度，日志一次插入"""
+        update = self.ui_events.drain()
+        if update is not None:
+            if update.logs:
+                self._update_log_text(update.log_text)
+            if update.progress is not None:
+                self.progress_var.set(update.progress)
+            if update.status is not None:
+                self.status_label.config(text=update.status)
+            for performance_number, value in update.item_progress.items():
+                self._set_row_status(performance_number, f"下载中 {value:.0f}%")
+            for func, args in update.calls:
+                func(*args)
+        self.root.after(FRAME_INTERVAL, self._drain_ui_events)
         
     def import_file(self):
-        """导入CSV文件"""
+        """导入CSV或Excel文件（后台线程流式读取，分批显示）"""
         file_path = filedialog.askopenfilename(
-            title="选择CSV文件",
+            title="选择CSV或Excel文件",
             filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx *.xls")]
         )
         
         if not file_path:
             return
             
+        self.cancel_import()
+        self.prober.cancel()
+        self.import_started = time.perf_counter()
+        
+        # 文件未变化时直接映射上次保存的目录快照
+        snapshot = load_snapshot(file_path, SNAPSHOT_PROFILE)
+        if snapshot is not None:
+            self._show_snapshot(file_path, snapshot)
+            return
+            
         try:
             self.add_log(f"正在读取文件: {os.path.basename(file_path)}")
             
-            # 使用简化的文件读取器
-            self.data, self.columns = SimpleExcelReader.read_file(file_path)
+            # 使用简化的文件读取器（先打开一次，格式错误可立即提示）
+            fingerprint = file_fingerprint(file_path)
+            stream = SimpleExcelReader.open_stream(file_path)
+        except Exception as e:
+            error_msg = f"读取文件失败: {e}"
+            self.add_log(error_msg)
+            messagebox.showerror("错误", error_msg)
+            return
+            
+        # 清空旧数据
+        self.data = []
+        self.columns = []
+        self.media_data = MediaLookup()
+        self.update_file_list()
+        
+        self.import_file_path = file_path
+        self.import_fingerprint = fingerprint
+        self.import_source = stream if isinstance(stream, MappedCSV) else None
+        self.first_batch_time = None
+        self.import_pending = []
+        self.import_worker = CSVImportWorker(lambda: stream, queue.Queue())
+        self.import_worker.start()
+        
+        self.cancel_import_btn.config(state=tk.NORMAL)
+        self.update_status("正在导入...")
+        self.root.after(IMPORT_POLL_INTERVAL, lambda: self._poll_import_events(self.import_worker))
+        
+    def cancel_import(self):
+        """取消正在进行的导入"""
+        if self.import_worker is not None:
+            self.import_worker.cancel()
             
-            # 检查必要的列
-            required_columns = ['展演号码', '姓名', '作品名称']
-            missing_columns = [col for col in required_columns if col not in self.columns]
+    def _poll_import_events(self, worker):
+        """处理导入线程送来的数据（每次只插入有限的行数）"""
+        if worker is not self.import_worker:
+            return  # 导入已结束或已被新的导入取代
             
-            if missing_columns:
-                messagebox.showerror("错误", f"文件缺少必要的列: {', '.join(missing_columns)}")
+        while len(self.import_pending) < IMPORT_ROWS_PER_TICK:
+            try:
+                event = worker.events.get_nowait()
+            except queue.Empty:
+                break
+                
+            if isinstance(event, Exception):
+                self._finish_import()
+                error_msg = f"读取文件失败: {event}"
+                self.add_log(error_msg)
+                messagebox.showerror("错误", error_msg)
                 return
                 
-            # 查找媒体文件列
-            media_columns = []
-            for col in self.columns:
-                if any(keyword in col.lower() for keyword in ['链接', 'url', 'link', '地址']):
-                    media_columns.append(col)
-                    
-            if not media_columns:
-                messagebox.showwarning("警告", "未找到媒体文件链接列，请确保文件中包含文件链接")
+            if not self.columns:
+                if not self._check_columns(event.columns):
+                    return
+                if self.import_source is not None:
+                    self.data = MappedCatalog(self.import_source)
+                else:
+                    self.data = CatalogStore.for_columns(self.columns)
+                self.media_data = MediaLookup(self.data, self._media_info)
                 
-            # 更新列表
-            self.update_file_list()
+            self.import_pending.extend(event.items)
+            self.update_progress(event.progress)
+            if event.done:
+                self.import_pending.append(event)
+                break
+                
+        # 插入一部分新行，剩余的留到下次
+        chunk = self.import_pending[:IMPORT_ROWS_PER_TICK]
+        del self.import_pending[:IMPORT_ROWS_PER_TICK]
+        for row in chunk:
+            if isinstance(row, dict):
+                self.data.append(row)
+                self._add_file_row(len(self.data) - 1, row)
+            else:
+                self._on_import_done(row)
+                return
+                
+        if self.first_batch_time is None and self.data:
+            self.first_batch_time = time.perf_counter() - self.import_started
+        if self.data:
+            self.update_status(f"正在导入... 已加载 {len(self.data)} 条记录")
             
-            self.add_log(f"成功读取 {len(self.data)} 条记录")
-            self.update_status(f"已加载 {len(self.data)} 条记录")
+        self.root.after(IMPORT_POLL_INTERVAL, lambda: self._poll_import_events(worker))
+        
+    def _check_columns(self, columns):
+        """收到第一批数据时检查列"""
+        self.columns = columns or []
+        
+        # 检查必要的列
+        required_columns = ['展演号码', '姓名', '作品名称']
+        missing_columns = [col for col in required_columns if col not in self.columns]
+        
+        if missing_columns:
+            if self.import_worker is not None:
+                self.import_worker.cancel()
+            self._finish_import()
+            self.columns = []
+            messagebox.showerror("错误", f"文件缺少必要的列: {', '.join(missing_columns)}")
+            return False
             
-        except Exception as e:
-            error_msg = f"读取文件失败: {e}"
-            self.add_log(error_msg)
-            messagebox.showerror("错误", error_msg)
+        # 查找媒体文件列（只在导入时查找一次）
+        self.media_columns = [
+            col for col in self.columns
+            if any(keyword in col.lower() for keyword in ['链接', 'url', 'link', '地址'])
+        ]
+                
+        if not self.media_columns:
+            messagebox.showwarning("警告", "未找到媒体文件链接列，请确保文件中包含文件链接")
+            
+        return True
+        
+    def _finish_import(self):
+        """导入结束（完成、取消或失败）"""
+        self.import_worker = None
+        self.import_pending = []
+        self.cancel_import_btn.config(state=tk.DISABLED)
+        
+    def _on_import_done(self, batch):
+        """全部数据已插入"""
+        self._finish_import()
+        elapsed = time.perf_counter() - self.import_started
+        
+        if batch.cancelled:
+            self.add_log(f"导入已取消，已读取 {len(self.data)} 条记录")
+            self.update_status(f"导入已取消 ({len(self.data)} 条记录)")
+            return
+            
+        first_ms = (self.first_batch_time or elapsed) * 1000
+        self.update_progress(100)
+        self.add_log(f"成功读取 {len(self.data)} 条记录（首屏 {first_ms:.0f} ms，总耗时 {elapsed:.1f} s）")
+        self.update_status(f"已加载 {len(self.data)} 条记录")
+        
+        # 保存快照，下次导入同一文件时直接载入（内存映射模式本身不复制数据，不保存）
+        if isinstance(self.data, CatalogStore):
+            save_snapshot_in_background(
+                self.import_file_path, SNAPSHOT_PROFILE, self.data,
+                columns=self.columns, row_count=batch.row_count, csv_format=batch.csv_format,
+                fingerprint=self.import_fingerprint, log=self.add_log)
+        self._probe_after_import()
+        
+    def _show_snapshot(self, file_path, snapshot):
+        """显示从快照载入的数据"""
+        self._finish_import()
+        self.data = []
+        self.columns = []
+        self.media_data = MediaLookup()
+        self.update_file_list()
+        
+        if not self._check_columns(snapshot.columns):
+            return
+        self.data = snapshot.store
+        self.media_data = MediaLookup(self.data, self._media_info)
+        
+        elapsed = time.perf_counter() - self.import_started
+        self.update_progress(100)
+        self.add_log(f"成功读取 {len(self.data)} 条记录（来自缓存快照，耗时 {elapsed * 1000:.0f} ms）")
+        self._insert_snapshot_rows(self.data, 0)
+        
+    def _insert_snapshot_rows(self, rows, start):
+        """分批把快照中的行插入列表"""
+        if rows is not self.data:
+            return  # 已导入了其他文件
+            
+        end = min(start + IMPORT_ROWS_PER_TICK, len(rows))
+        for row_id in range(start, end):
+            self._add_file_row(row_id, rows[row_id])
+            
+        if end < len(rows):
+            self.update_status(f"正在显示... 已加载 {end} 条记录")
+            self.root.after(1, lambda: self._insert_snapshot_rows(rows, end))
+        else:
+            self.update_status(f"已加载 {len(rows)} 条记录")
+            self._probe_after_import()
             
     def update_file_list(self):
         """更新文件列表"""
         # 清空现有数据
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.delete(*self.tree.get_children())
+        self.tree_items = {}
+        self.item_numbers = {}
+        self.at_risk = set()
             
+        self.media_data = MediaLookup(self.data, self._media_info)
         if not self.data:
             return
             
         # 添加数据到列表
-        for row in self.data:
-            performance_number = str(row.get('展演号码', ''))
-            name = str(row.get('姓名', ''))
-            work_name = str(row.get('作品名称', ''))
-            
-            # 查找媒体链接
-            media_url = ""
-            for col in self.columns:
-                if any(keyword in col.lower() for keyword in ['链接', 'url', 'link', '地址']):
-                    url_value = str(row.get(col, ''))
-                    if url_value and url_value != 'nan' and url_value.startswith('http'):
-                        media_url = url_value
-                        break
-                        
-            # 检查下载状态
-            status = "未下载"
-            file_path = ""
-            if media_url in self.downloader.downloaded_files:
-                local_path = self.downloader.downloaded_files[media_url]
-                if os.path.exists(local_path):
-                    status = "已下载"
-                    file_path = local_path
-                    
-            # 存储媒体数据
-            self.media_data[performance_number] = {
-                'name': name,
-                'work_name': work_name,
-                'url': media_url,
-                'local_path': file_path,
-                'performance_number': performance_number
-            }
-            
-            # 添加到树视图
-            self.tree.insert('', tk.END, values=(
-                performance_number, name, work_name, status, file_path
-            ))
+        for row_id, row in enumerate(self.data):
+            self._add_file_row(row_id, row)
             
+    def _media_info(self, row):
+        """从一行数据中取出媒体信息（链接和下载状态）"""
+        performance_number = str(row.get('展演号码') or '')
+        
+        # 查找媒体链接
+        media_url = ""
+        for col in self.media_columns:
+            url_value = str(row.get(col) or '')
+            if url_value and url_value != 'nan' and url_value.startswith('http'):
+                media_url = url_value
+                break
+                    
+        # 检查下载状态
+        file_path = (self.downloader.store.path_of(media_url) if media_url else None) or ""
+                
+        return {
+            'name': str(row.get('姓名') or ''),
+            'work_name': str(row.get('作品名称') or ''),
+            'url': media_url,
+            'local_path': file_path,
+            'performance_number': performance_number
+        }
+        
+    def _row_values(self, data):
+        """文件列表中一行显示的内容"""
+        status = "已下载" if data['local_path'] else "未下载"
+        probe = self.probe_results.get(data['url'])
+        kind = probe.kind if probe else ''
+        size = format_size(probe.size) if probe and probe.size else ''
+        return (data['performance_number'], data['name'], data['work_name'], status,
+                kind, size, data['local_path'])
+        
+    def _add_file_row(self, row_id, row):
+        """添加一行到文件列表"""
+        data = self._media_info(row)
+        
+        # 记录展演号码对应的行
+        self.media_data.add(data['performance_number'], row_id)
+        
+        # 添加到树视图，并记录展演号码对应的列表项
+        item = self.tree.insert('', tk.END, values=self._row_values(data))
+        self.tree_items[data['performance_number']] = item
+        self.item_numbers[item] = data['performance_number']
+        
+    def refresh_file_row(self, performance_number):
+        """重新检查一行的下载状态并只更新这一行（不重建整个列表）"""
+        item = self.tree_items.get(performance_number)
+        if item is None or performance_number not in self.media_data:
+            return
+        if self.tree.exists(item):
+            self.tree.item(item, values=self._row_values(self.media_data[performance_number]))
+        
+    def _set_row_status(self, performance_number, status):
+        """只修改一行的状态列"""
+        item = self.tree_items.get(performance_number)
+        if item is not None and self.tree.exists(item):
+            self.tree.set(item, '状态', status)
+        
     def start_download(self):
         """开始下载"""
         if not self.data:
             messagebox.showwarning("警告", "请先导入CSV文件")
             return
             
-        # 在新线程中执行下载
+        if self.import_worker is not None:
+            messagebox.showwarning("警告", "文件正在导入，请等待导入完成")
+            return
+            
+        self.update_download_workers()
+        self.update_show_schedule()
+        
+        # 在新线程中检查下载状态并提交到下载池
         threading.Thread(target=self._download_thread, daemon=True).start()
         
     def _download_thread(self):
-        """下载线程"""
+        """把需要下载的作品全部提交到下载池"""
         try:
             self.update_status("正在下载...")
-            download_count = 0
+            pending = []
+            needed = 0
+            sized = set()  # 多行引用同一链接时只下载一次
             
             for performance_number, data in self.media_data.items():
                 if not data['url']:
@@ -603,28 +1157,56 @@ class LangrunPlayerApp:
                     self.add_log(f"跳过已下载文件: {data['work_name']}")
                     continue
                     
-                # 下载文件
-                local_path = self.downloader.download_file(
-                    data['url'], 
-                    data['work_name'], 
-                    performance_number
-                )
-                
-                if local_path:
-                    data['local_path'] = local_path
-                    download_count += 1
-                    
-                    # 更新列表显示
-                    self.root.after(0, self.update_file_list)
+                # 检查过的网页和失效链接不下载（仍可单独播放或重新下载）
+                probe = self.probe_results.get(data['url'])
+                if probe is not None and probe.fresh(self.prober.ttl):
+                    if not probe.downloadable:
+                        self.add_log(f"跳过{probe.kind}链接: {data['work_name']}")
+                        continue
+                    key = canonical_url(data['url'])
+                    if key not in sized:
+                        sized.add(key)
+                        needed += probe.size or 0
                     
-            self.add_log(f"下载完成，共下载 {download_count} 个文件")
-            self.update_status(f"下载完成 ({download_count} 个文件)")
+                pending.append(data)
+                
+            # 已知大小的文件放不下时先确认
+            download_dir = self.downloader.download_dir
+            os.makedirs(download_dir, exist_ok=True)
+            free = shutil.disk_usage(download_dir).free
+            if needed > free:
+                self.ui_events.call(self._confirm_download, pending, needed, free)
+            else:
+                self._submit_all(pending)
             
         except Exception as e:
             error_msg = f"下载过程出错: {e}"
             self.add_log(error_msg)
             self.update_status("下载失败")
             
+    def _confirm_download(self, pending, needed, free):
+        """磁盘空间不足时询问是否仍然下载（主线程）"""
+        message = (f"需要下载约 {format_size(needed)}，下载目录所在磁盘只剩 {format_size(free)}。\n"
+                   f"仍然开始下载吗？（按展演顺序下载，空间用完后的作品会下载失败）")
+        if messagebox.askyesno("磁盘空间不足", message):
+            self._submit_all(pending)
+        else:
+            self.add_log(f"磁盘空间不足（需要 {format_size(needed)}，剩余 {format_size(free)}），已取消下载")
+            self.update_status("磁盘空间不足")
+            
+    def _submit_all(self, pending):
+        """把作品全部提交到下载池"""
+        for data in pending:
+            self._submit_download(data)
+            
+        pool = self.download_pool
+        self.add_log(f"已加入下载队列 {len(pending)} 个文件"
+                     f"（并发 {pool.max_workers} 个，每个站点 {pool.per_host} 个）")
+        if pending:
+            self.ui_events.refresh(self.start_download_polling)
+        else:
+            self.update_status("没有需要下载的文件")
+            
     def search_and_play(self, event=None):
         """搜索并播放"""
         search_number = self.search_var.get().strip()
@@ -633,12 +1215,7 @@ class LangrunPlayerApp:
             return
             
         if search_number in self.media_data:
-            data = self.media_data[search_number]
-            if data['local_path'] and os.path.exists(data['local_path']):
-                self.player.play_file(data['local_path'])
-                self.add_log(f"播放作品: {data['work_name']} ({data['name']})")
-            else:
-                messagebox.showinfo("提示", f"文件未下载: {data['work_name']}")
+            self.play_now(self.media_data[search_number])
         else:
             messagebox.showinfo("提示", f"未找到展演号码: {search_number}")
             
@@ -651,13 +1228,15 @@ class LangrunPlayerApp:
         item = self.tree.item(selection[0])
         values = item['values']
         
-        if len(values) >= 5 and values[4]:  # 文件路径
-            file_path = values[4]
-            if os.path.exists(file_path):
-                self.player.play_file(file_path)
-                self.add_log(f"播放: {values[2]} ({values[1]})")
-            else:
-                messagebox.showinfo("提示", "文件不存在，请先下载")
+        if len(values) >= 7 and values[6] and os.path.exists(values[6]):  # 文件路径
+            self.player.play_file(values[6])
+            self.add_log(f"播放: {values[2]} ({values[1]})")
+            return
+            
+        # 尚未下载：优先下载，完成后播放
+        performance_number = self.item_numbers.get(selection[0])
+        if performance_number in self.media_data:
+            self.play_now(self.media_data[performance_number])
         else:
             messagebox.showinfo("提示", "文件未下载")
             
@@ -665,7 +1244,7 @@ class LangrunPlayerApp:
         """运行应用程序"""
         self.add_log("朗润播放器客户端 (独立版) 启动成功")
         self.add_log("提示: 独立版无需外部依赖，使用系统默认播放器")
-        self.add_log("Excel文件请先另存为CSV格式后导入")
+        self.add_log("支持导入CSV和Excel(.xlsx)文件")
         self.root.mainloop()
 
 if __name__ == "__main__":